@@ -1,10 +1,14 @@
 import asyncio
 import enum
+from collections import OrderedDict
 import functools
 import logging
-from typing import Any, Dict, NamedTuple, Optional, Sequence, TypeVar
+import time
+from typing import (Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence,
+                    Tuple, TypeVar, Union)
 
 import dbussy
+from dbussy import DBUS
 import ravel
 
 ProxyInterface = ravel.BusPeer.Object.ProxyInterface  # type alias
@@ -24,6 +28,9 @@ class PlayerInterfaces(NamedTuple):
     player: ProxyInterface
     tracklist: Optional[ProxyInterface] = None
     playlists: Optional[ProxyInterface] = None
+    # The unique name of the connection that owns `bus_name`.
+    # Changes when the player restarts.
+    unique_name: Optional[str] = None
 
 
 class PlaybackStatus(str, enum.Enum):
@@ -33,20 +40,153 @@ class PlaybackStatus(str, enum.Enum):
     # Not a valid status, but we use this as a fallback
     UNKNOWN = "Unknown"
 
+    @classmethod
+    def parse(cls, value: Any) -> 'PlaybackStatus':
+        try:
+            return cls(value)
+        except ValueError:
+            return cls.UNKNOWN
+
+
+class PlayerSnapshot(NamedTuple):
+    """The state of a player's `org.mpris.MediaPlayer2.Player` interface at one point in time."""
+    player: PlayerInterfaces
+    playback_status: PlaybackStatus
+    metadata: Dict[str, Any]  # unwrapped
+    # Not supported by all players (e.g. Firefox).
+    # Should be an int, but some players (smplayer) return a float.
+    position: Optional[Union[int, float]] = None
+    rate: float = 1.0
+
+
+class PlaybackClock:
+
+    """Extrapolates the playback position of a player.
+
+    MPRIS players don't announce changes to their position
+    (except for seeks),
+    so we remember a reference position
+    and advance it locally according to the playback rate.
+    """
+
+    def __init__(self, position: Optional[Union[int, float]], rate: float = 1.0,
+                 playing: bool = False, *, clock: Callable[[], float] = time.monotonic,
+                 ) -> None:
+        self.clock = clock
+        self.rate = rate
+        self.playing = playing
+        # time of the last full synchronization with the player
+        self.synced_at = clock()
+        self._ref_position = position
+        self._ref_time = self.synced_at
+
+    @property
+    def position(self) -> Optional[Union[int, float]]:
+        if self._ref_position is None or not self.playing:
+            return self._ref_position
+        elapsed = self.clock() - self._ref_time
+        return self._ref_position + int(elapsed * self.rate * 1e6)
+
+    @property
+    def age(self) -> float:
+        return self.clock() - self.synced_at
+
+    def seek(self, position: Union[int, float]) -> None:
+        self._ref_position = position
+        self._ref_time = self.clock()
+
+    def set_rate(self, rate: float) -> None:
+        self._rebase()
+        self.rate = rate
+
+    def set_playing(self, playing: bool) -> None:
+        self._rebase()
+        self.playing = playing
+
+    def _rebase(self) -> None:
+        self._ref_position = self.position
+        self._ref_time = self.clock()
+
+
+class CircuitState(str, enum.Enum):
+    CLOSED = "closed"  # healthy
+    OPEN = "open"  # failing; skipped until the cooldown elapsed
+    HALF_OPEN = "half-open"  # cooldown elapsed; may be probed
+
+
+class PlayerHealth:
+
+    """Circuit breaker for the calls to a player.
+
+    Opens after `threshold` consecutive failures.
+    Once the cooldown elapsed, a probe may be made;
+    when it fails, the circuit stays open for twice as long (up to `max_cooldown`).
+    The owner discards the breaker when a call succeeds.
+    """
+
+    def __init__(self, threshold: int, cooldown: float, max_cooldown: float, *,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.threshold = threshold
+        self.initial_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.clock = clock
+        self.failures = 0
+        self.cooldown = 0.0
+        self._open_until = 0.0
+
+    @property
+    def state(self) -> CircuitState:
+        if self.failures < self.threshold:
+            return CircuitState.CLOSED
+        if self.clock() < self._open_until:
+            return CircuitState.OPEN
+        return CircuitState.HALF_OPEN
+
+    def record_failure(self) -> bool:
+        """Count a failure and return whether the circuit (re-)opened."""
+        self.failures += 1
+        if self.failures < self.threshold:
+            return False
+        if self.cooldown:
+            self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+        else:
+            self.cooldown = self.initial_cooldown
+        self._open_until = self.clock() + self.cooldown
+        return True
+
+
+_missing = object()
 
+_T = TypeVar('_T')
 _K = TypeVar('_K')
 _V = TypeVar('_V', bound=Sequence)
 
 
+def _track_identity(metadata: Any) -> Tuple[Any, ...]:
+    if not isinstance(metadata, dict):
+        return ()
+    return tuple(metadata.get(key) for key in ('mpris:trackid', 'xesam:url', 'xesam:title'))
+
+
 def unwrap_metadata(metadata: Dict[_K, _V]) -> Dict[_K, _V]:
     return {k: v[1] for k, v in metadata.items()}
 
 
-async def _list_bus_names(bus):
+@functools.lru_cache(maxsize=32)
+def _make_proxy_factories(introspection_xml: str) -> Dict[str, Any]:
+    # Players of the same implementation usually share their introspection data,
+    # so we only parse it and create the proxy classes once.
+    introspection = dbussy.Introspection.parse(introspection_xml)
+    return {
+        name: ravel.def_proxy_interface(ravel.INTERFACE.CLIENT, name=name,
+                                        introspected=iface, is_async=True)
+        for name, iface in introspection.interfaces_by_name.items()
+    }
+
+
+async def _get_dbus_proxy(bus):
     dbus_obj = bus['org.freedesktop.DBus']['/org/freedesktop/DBus']
-    # Could cache this, but only saves 0.25ms (30%)
-    dbus_proxy = await dbus_obj.get_async_interface('org.freedesktop.DBus')
-    return (await dbus_proxy.ListNames())[0]
+    return await dbus_obj.get_async_interface('org.freedesktop.DBus')
 
 
 # https://specifications.freedesktop.org/mpris-spec/2.2/
@@ -57,63 +197,675 @@ class Mpris2Dbussy():
     IFACE_NAME = 'org.mpris.MediaPlayer2'
     SUB_IFACES = ('Player', 'TrackList', 'Playlists')
 
-    def __init__(self, bus, loop):
+    PLAYER_IFACE_NAME = f'{IFACE_NAME}.Player'
+    # Properties of the Player interface that are mirrored from PropertiesChanged signals
+    WATCHED_PROPERTIES = frozenset(('PlaybackStatus', 'Metadata', 'Rate'))
+    DEFAULT_MAX_CONCURRENCY = 32
+    DEFAULT_CALL_TIMEOUT = 2
+    DEFAULT_RESPONSE_BUDGET = 0.5
+    # Errors that mean the player is gone rather than unhealthy
+    VANISHED_ERRORS = (DBUS.ERROR_SERVICE_UNKNOWN, DBUS.ERROR_NAME_HAS_NO_OWNER)
+
+    def __init__(self, bus, loop, *, cache_size: int = 512,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 max_state_age: float = 30,
+                 call_timeout: Optional[float] = DEFAULT_CALL_TIMEOUT,
+                 response_budget: Optional[float] = DEFAULT_RESPONSE_BUDGET,
+                 failure_threshold: int = 3,
+                 cooldown: float = 5,
+                 max_cooldown: float = 300,
+                 clock: Callable[[], float] = time.monotonic):
         if bus.loop is None:
             raise ValueError("Expected asynchronous bus")
         self.bus = bus
         self.loop = loop
+        self.cache_size = cache_size
+        self._call_limit = asyncio.Semaphore(max_concurrency)
+        # Interfaces of known players, keyed by (unique name, player name)
+        # and ordered by last use.
+        # Entries are dropped when the player name changes its owner.
+        self._player_cache: 'OrderedDict[Tuple[str, str], PlayerInterfaces]' = OrderedDict()
+        self.listening = False
+        # Maps player names (the bus name suffix) to the unique name of their owner.
+        # Populated once and then kept up to date through NameOwnerChanged signals.
+        self._player_owners: Optional[Dict[str, str]] = None
+        # New owners (empty if vanished) of player names that changed
+        # while the snapshot was taken, applied once it is complete
+        self._snapshot_changes: Optional[Dict[str, str]] = None
+        self._registry_lock = asyncio.Lock()
+        # Maps unique bus names (of the player's connection) to their mirrored properties
+        self._player_states: Dict[str, Dict[str, Any]] = {}
+        # Maps unique bus names to the playback clocks of players
+        # whose mirrored state is complete and can be used for snapshots.
+        # Clocks older than `max_state_age` are resynchronized.
+        self._clocks: Dict[str, PlaybackClock] = {}
+        # Maps unique bus names to the mirrored metadata and its unwrapped form,
+        # so that snapshots of unchanged players share the same metadata object.
+        self._unwrapped_metadata: Dict[str, Tuple[Any, Dict[str, Any]]] = {}
+        self.max_state_age = max_state_age
+        # Time source of the playback clocks and circuit breakers
+        self.clock = clock
+        self._signal_count = 0
+        self._changed = asyncio.Event()
+        # Called with the method name, the duration in seconds
+        # and the name of the error (if any) after every call to a player
+        self.call_observer: Optional[Callable[[str, float, Optional[str]], None]] = None
+        # Calls to players that aren't answered within `call_timeout` seconds
+        # fail with `org.freedesktop.DBus.Error.NoReply`.
+        # Players failing `failure_threshold` times in a row are skipped
+        # for `cooldown` seconds (doubling up to `max_cooldown`)
+        # until a probe in the background succeeds.
+        self.call_timeout = call_timeout
+        self._health_args = (failure_threshold, cooldown, max_cooldown)
+        # Maps player names to their health, if they failed since their last success
+        self._health: Dict[str, PlayerHealth] = {}
+        self._probes: Dict[str, asyncio.Future] = {}
+        # `gather_players` waits up to `response_budget` seconds for all players
+        # and leaves the calls to the others running in the background.
+        # Maps player names to these calls until they finished.
+        self.response_budget = response_budget
+        self._late: Dict[str, asyncio.Future] = {}
 
     @classmethod
-    async def create(cls, bus=None, loop=None):
+    async def create(cls, bus=None, loop=None, **kwargs):
         if not bus:
             bus = await ravel.session_bus_async(loop)
 
-        return cls(bus, loop)
+        return cls(bus, loop, **kwargs)
+
+    def start_listening(self) -> None:
+        """Subscribe to property changes of all players on the bus.
+
+        Use `wait_for_change` to be notified about them.
+        """
+        if self.listening:
+            return
+        self.bus.listen_propchanged(self.PATH_NAME, False, self.PLAYER_IFACE_NAME,
+                                    self._on_properties_changed)
+        self.bus.listen_signal(self.PATH_NAME, False, self.PLAYER_IFACE_NAME, 'Seeked',
+                               self._on_seeked)
+        self.listening = True
+
+    def stop_listening(self) -> None:
+        if not self.listening:
+            return
+        self.bus.unlisten_propchanged(self.PATH_NAME, False, self.PLAYER_IFACE_NAME,
+                                      self._on_properties_changed)
+        self.bus.unlisten_signal(self.PATH_NAME, False, self.PLAYER_IFACE_NAME, 'Seeked',
+                                 self._on_seeked)
+        self._player_states.clear()
+        self._clocks.clear()
+        self._unwrapped_metadata.clear()
+        self.listening = False
+
+    def get_player_state(self, unique_name: str) -> Dict[str, Any]:
+        """Return the mirrored properties of the player owning `unique_name`.
+
+        Only contains properties that have been announced via signals
+        or fetched by `get_snapshot` so far.
+        """
+        return self._player_states.get(unique_name, {})
+
+    async def wait_for_change(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the mirrored state of any player changed.
+
+        Returns False if the timeout was hit before that.
+        """
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self._changed.clear()
+        return True
+
+    @ravel.signal(name='PropertiesChanged', in_signature='sa{sv}as',
+                  arg_keys=('interface', 'changed', 'invalidated'),
+                  message_keyword='message')
+    def _on_properties_changed(self, interface, changed, invalidated, message) -> None:
+        if interface != self.PLAYER_IFACE_NAME:
+            return
+        self._signal_count += 1
+        state = self._player_states.setdefault(message.sender, {})
+        clock = self._clocks.get(message.sender)
+        updated = False
+        for key, (_signature, value) in changed.items():
+            if key not in self.WATCHED_PROPERTIES:
+                continue
+            old_value = state.get(key, _missing)
+            if old_value == value:
+                continue
+            state[key] = value
+            updated = True
+            if not clock:
+                continue
+            elif key == 'PlaybackStatus':
+                clock.set_playing(value == PlaybackStatus.PLAYING)
+            elif key == 'Rate':
+                clock.set_rate(value)
+            elif key == 'Metadata' and _track_identity(old_value) != _track_identity(value):
+                # The position of the new track is unknown
+                del self._clocks[message.sender]
+                clock = None
+        for key in invalidated:
+            if key in self.WATCHED_PROPERTIES:
+                state.pop(key, None)
+                self._clocks.pop(message.sender, None)
+                updated = True
+
+        if updated:
+            logger.debug(f"Properties of {message.sender!r} changed: {sorted(changed)}")
+            self._changed.set()
+
+    @ravel.signal(name='Seeked', in_signature='x', arg_keys=('position',),
+                  message_keyword='message')
+    def _on_seeked(self, position, message) -> None:
+        logger.debug(f"Player {message.sender!r} seeked to {position}")
+        self._signal_count += 1
+        clock = self._clocks.get(message.sender)
+        if clock:
+            clock.seek(position)
+        self._changed.set()
+
+    async def get_player_owners(self) -> Dict[str, str]:
+        """Return a mapping of player names to the unique name of their owner.
+
+        The first call takes a snapshot of the bus;
+        afterwards, the registry is updated from NameOwnerChanged signals.
+        """
+        if self._player_owners is None:
+            async with self._registry_lock:
+                if self._player_owners is None:
+                    await self._watch_player_names()
+        return self._player_owners  # type: ignore
 
     async def get_player_names(self):
-        bus_names = await _list_bus_names(self.bus)
-        bus_names = [n for n in bus_names
+        return list(await self.get_player_owners())
+
+    async def _watch_player_names(self) -> None:
+        # Subscribe first so that we don't miss changes while taking the snapshot.
+        # Updates from signals take precedence over the snapshot,
+        # including players that vanished after we asked for their owner.
+        # The registry is only published once the snapshot is complete,
+        # so that a failed attempt is retried on the next call.
+        self._snapshot_changes = changes = {}
+        try:
+            await self.bus.connection.bus_add_match_action_async(
+                self._name_owner_rule, self._on_name_owner_changed, None,
+            )
+        except BaseException:
+            self._snapshot_changes = None
+            raise
+
+        try:
+            owners = await self._take_owner_snapshot()
+        except BaseException:
+            self.bus.connection.bus_remove_match_action(
+                self._name_owner_rule, self._on_name_owner_changed, None,
+            )
+            raise
+        finally:
+            self._snapshot_changes = None
+        for name, owner in changes.items():
+            if owner:
+                owners[name] = owner
+            else:
+                owners.pop(name, None)
+        self._player_owners = owners
+        logger.debug(f"Found players on the bus: {owners}")
+
+    async def _take_owner_snapshot(self) -> Dict[str, str]:
+        dbus_proxy = await _get_dbus_proxy(self.bus)
+        bus_names = [n for n in (await self._timed('ListNames', dbus_proxy.ListNames()))[0]
                      if n.startswith(self.BUS_BASE_NAME + '.')]
+        results = await asyncio.gather(
+            *(self._timed('GetNameOwner', dbus_proxy.GetNameOwner(bus_name))
+              for bus_name in bus_names),
+            return_exceptions=True,
+        )
         strip_len = len(self.BUS_BASE_NAME) + 1
-        return [n[strip_len:] for n in bus_names]
+        owners = {}
+        for bus_name, result in zip(bus_names, results):
+            if isinstance(result, dbussy.DBusError):
+                # lost the name before we could ask
+                continue
+            elif isinstance(result, Exception):
+                raise result
+            owners[bus_name[strip_len:]] = result[0]
+        return owners
+
+    @property
+    def _name_owner_rule(self) -> Dict[str, str]:
+        return {
+            'type': 'signal',
+            'sender': 'org.freedesktop.DBus',
+            'interface': 'org.freedesktop.DBus',
+            'member': 'NameOwnerChanged',
+            'arg0namespace': self.BUS_BASE_NAME,
+        }
+
+    def _on_name_owner_changed(self, _connection, message, _user_data) -> None:
+        bus_name, old_owner, new_owner = message.expect_objects('sss')
+        name = bus_name[len(self.BUS_BASE_NAME) + 1:]
+        if not name:
+            return
+        if self._snapshot_changes is not None:
+            self._snapshot_changes[name] = new_owner
+        elif self._player_owners is None:
+            return
+
+        # A new instance of the player gets a fresh start
+        self._health.pop(name, None)
+        self._late.pop(name, None)
+        if old_owner:
+            self._player_states.pop(old_owner, None)
+            self._clocks.pop(old_owner, None)
+            self._unwrapped_metadata.pop(old_owner, None)
+            self._player_cache.pop((old_owner, name), None)
+        if new_owner:
+            if old_owner:
+                logger.debug(f"Player {name!r} changed owner from {old_owner!r} to {new_owner!r}")
+            else:
+                logger.debug(f"Player {name!r} appeared as {new_owner!r}")
+        else:
+            logger.debug(f"Player {name!r} vanished")
+        if self._player_owners is not None:
+            if new_owner:
+                self._player_owners[name] = new_owner
+            else:
+                self._player_owners.pop(name, None)
+        self._changed.set()
 
-    @functools.lru_cache()
     def get_player_object(self, bus_name: str) -> Any:
         return self.bus[f"{self.BUS_BASE_NAME}.{bus_name}"][self.PATH_NAME]
 
     async def get_player_ifaces(self, bus_name: str) -> PlayerInterfaces:
+        unique_name = (await self.get_player_owners()).get(bus_name)
+        if not unique_name:
+            return await self._checked(bus_name, self._introspect_player(bus_name, None))
+
+        cache_key = (unique_name, bus_name)
+        cached = self._player_cache.get(cache_key)
+        if cached:
+            self._player_cache.move_to_end(cache_key)
+            return cached
+
+        player = await self._checked(bus_name, self._introspect_player(bus_name, unique_name))
+        # Don't cache if the player changed its owner in the meantime
+        if self._player_owners and self._player_owners.get(bus_name) == unique_name:
+            self._player_cache[cache_key] = player
+            while len(self._player_cache) > self.cache_size:
+                self._player_cache.popitem(last=False)
+        return player
+
+    async def _introspect_player(self, bus_name: str, unique_name: Optional[str],
+                                 ) -> PlayerInterfaces:
         # dbussy.DBusError: org.freedesktop.DBus.Error.ServiceUnknown
         #   -- The name org.mpris.MediaPlayer2.mpd was not provided by any .service files
         # dbussy.DBusError: org.freedesktop.DBus.Error.UnknownInterface
         #   -- peer … object … does not understand interface …
-        obj = self.get_player_object(bus_name)
+        full_bus_name = f"{self.BUS_BASE_NAME}.{bus_name}"
+        message = dbussy.Message.new_method_call(
+            destination=full_bus_name,
+            path=self.PATH_NAME,
+            iface=DBUS.INTERFACE_INTROSPECTABLE,
+            method='Introspect',
+        )
+        proxy_factories = _make_proxy_factories((await self._call(message, 's'))[0])
+
         iface_names = [self.IFACE_NAME,
                        *(f"{self.IFACE_NAME}.{sub}" for sub in self.SUB_IFACES)]
-        coros = (obj.get_async_interface(if_name) for if_name in iface_names)
-        results = await asyncio.gather(*coros, return_exceptions=True)
         args = []
-        for i, result in enumerate(results):
-            if isinstance(result, Exception):
-                if i < 2:  # required
-                    raise result
-                else:  # optional
-                    result = None
-            args.append(result)
+        for i, if_name in enumerate(iface_names):
+            proxy_factory = proxy_factories.get(if_name)
+            if proxy_factory:
+                proxy = proxy_factory(connection=self.bus.connection,
+                                      dest=full_bus_name)[self.PATH_NAME]
+            elif i < 2:  # required
+                raise dbussy.DBusError(
+                    DBUS.ERROR_UNKNOWN_INTERFACE,
+                    f"peer {full_bus_name!r} object {self.PATH_NAME!r}"
+                    f" does not understand interface {if_name!r}",
+                )
+            else:  # optional
+                proxy = None
+            args.append(proxy)
+
+        if not hasattr(type(args[0]), 'Identity'):
+            raise Mpris2Error(f"Player {bus_name!r} doesn't advertise properties")
+        name = await self._get_property(bus_name, self.IFACE_NAME, 'Identity')
+        return PlayerInterfaces(bus_name, name, *args, unique_name=unique_name)
+
+    async def gather(self, *aws: Awaitable[_T], return_exceptions: bool = False) -> List[_T]:
+        """Like `asyncio.gather`, but only awaits up to `max_concurrency` awaitables at once.
+
+        Use this to query many players without flooding the bus.
+        """
+        return await asyncio.gather(*map(self._limited, aws),
+                                    return_exceptions=return_exceptions)  # type: ignore
+
+    async def _limited(self, aw: Awaitable[_T]) -> _T:
+        async with self._call_limit:
+            return await aw
+
+    async def gather_players(self, calls: Dict[str, Awaitable[_T]], timeout: Optional[float],
+                             ) -> Dict[str, Union[_T, BaseException]]:
+        """Await calls to several players (keyed by player name) like `gather`.
 
+        Returns the results (or exceptions) of the calls that finished within `timeout` seconds,
+        so that a slow player doesn't hold back the others.
+        The time a call waits for one of the `max_concurrency` slots doesn't count.
+        The remaining calls continue in the background,
+        where their failures still count towards the player's health.
+        Until they finished, the players are left out of `get_players`.
+        """
+        loop = asyncio.get_event_loop()
+        started: Dict[str, float] = {}
+        progress = asyncio.Event()
+
+        async def limited(name: str, aw: Awaitable[_T]) -> _T:
+            async with self._call_limit:
+                started[name] = loop.time()
+                progress.set()
+                return await aw
+
+        tasks = {name: asyncio.ensure_future(limited(name, aw)) for name, aw in calls.items()}
+        if not tasks:
+            return {}
         try:
-            name = await args[0].Identity  # player.root.Identity
-        except AttributeError:
-            raise Mpris2Error(f"Player {bus_name!r} doesn't advertise properties") from None
-        return PlayerInterfaces(bus_name, name, *args)
-
-    async def get_players(self):
-        result_list = []
-        for bus_name in await self.get_player_names():
+            await self._wait_for_budget(tasks, started, progress, timeout)
+        except asyncio.CancelledError:
+            for task in tasks.values():
+                task.cancel()
+            raise
+
+        results: Dict[str, Union[_T, BaseException]] = {}
+        for name, task in tasks.items():
+            if not task.done():
+                logger.debug(f"Player {name!r} didn't answer within {timeout:g} seconds")
+                self._late[name] = task
+                task.add_done_callback(functools.partial(self._on_late_done, name))
+            elif not task.cancelled():
+                results[name] = task.exception() or task.result()
+        return results
+
+    @staticmethod
+    async def _wait_for_budget(tasks: Dict[str, asyncio.Future], started: Dict[str, float],
+                               progress: asyncio.Event, timeout: Optional[float]) -> None:
+        # Wait until every task finished or exceeded `timeout` since it started
+        loop = asyncio.get_event_loop()
+        while True:
+            pending = {name: task for name, task in tasks.items() if not task.done()}
+            if not pending:
+                return
+            if timeout is None:
+                await asyncio.wait(list(pending.values()))
+                return
+            now = loop.time()
+            remaining = [started[name] + timeout - now for name in pending if name in started]
+            if len(remaining) == len(pending) and max(remaining) <= 0:
+                return
+            # Also wake up when a queued call starts, so that its budget is respected
+            progress.clear()
+            waiter = asyncio.ensure_future(progress.wait())
             try:
-                result_list.append(await self.get_player_ifaces(bus_name))
-            except Mpris2Error as e:
-                logger.error(e.args[0])
-            except dbussy.DBusError as e:
-                logger.error(f"Unable to fetch interfaces for player {bus_name!r} - {e!s}")
+                await asyncio.wait([waiter, *pending.values()],
+                                   timeout=min((r for r in remaining if r > 0), default=None),
+                                   return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+
+    def _on_late_done(self, name: str, task: asyncio.Future) -> None:
+        if self._late.get(name) is task:
+            del self._late[name]
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is None:
+            if task.result() is not None:  # `get_players` reports failures as None
+                logger.debug(f"Player {name!r} answered late")
+                # Let the next tick pick it up
+                self._changed.set()
+        elif not isinstance(error, (dbussy.DBusError, Mpris2Error)):
+            logger.error(f"Unexpected error from late call to player {name!r}", exc_info=error)
+
+    async def get_players(self) -> List[PlayerInterfaces]:
+        """Return the interfaces of all players that answer in time.
+
+        Leaves out unhealthy players
+        and players that didn't answer within `response_budget` seconds (until they did).
+        """
+        bus_names = [bus_name for bus_name in await self.get_player_owners()
+                     if bus_name not in self._late and self._is_healthy(bus_name)]
+        results = await self.gather_players(
+            {bus_name: self._try_get_player_ifaces(bus_name) for bus_name in bus_names},
+            self.response_budget,
+        )
+        return [player for player in results.values() if player]  # type: ignore
+
+    async def _try_get_player_ifaces(self, bus_name: str) -> Optional[PlayerInterfaces]:
+        try:
+            return await self.get_player_ifaces(bus_name)
+        except Mpris2Error as e:
+            logger.log(self._failure_level(bus_name), e.args[0])
+        except dbussy.DBusError as e:
+            level = self._failure_level(bus_name)
+            if e.name == DBUS.ERROR_NO_REPLY:
+                level = min(level, logging.WARNING)
+            logger.log(level, f"Unable to fetch interfaces for player {bus_name!r} - {e!s}")
+        return None
+
+    def _failure_level(self, bus_name: str) -> int:
+        # Only report the first of consecutive failures of a player loudly
+        health = self._health.get(bus_name)
+        return logging.DEBUG if health and health.failures > 1 else logging.ERROR
+
+    async def get_snapshot(self, player: PlayerInterfaces) -> PlayerSnapshot:
+        """Fetch all properties of the player that we need in a single call.
+
+        When listening to signals,
+        the snapshot is built from the mirrored state without any call
+        if the player has been synchronized recently.
+        """
+        unique_name = player.unique_name
+        if self.listening and unique_name:
+            clock = self._clocks.get(unique_name)
+            if clock and clock.age < self.max_state_age:
+                state = self._player_states[unique_name]
+                return PlayerSnapshot(
+                    player=player,
+                    playback_status=PlaybackStatus.parse(state.get('PlaybackStatus')),
+                    metadata=self._get_unwrapped_metadata(unique_name,
+                                                          state.get('Metadata', {})),
+                    position=clock.position,
+                    rate=clock.rate,
+                )
+
+        signal_count = self._signal_count
+        props = await self._checked(player.bus_name, self._fetch_properties(player))
+
+        snapshot = PlayerSnapshot(
+            player=player,
+            playback_status=PlaybackStatus.parse(props.get('PlaybackStatus')),
+            metadata=unwrap_metadata(props.get('Metadata', {})),
+            position=props.get('Position'),
+            rate=props.get('Rate', 1.0),
+        )
+        # Only seed the mirror if no signal arrived in the meantime,
+        # since it could be newer than our result.
+        if self.listening and unique_name and signal_count == self._signal_count:
+            state = self._player_states.setdefault(unique_name, {})
+            state.update((key, props[key]) for key in self.WATCHED_PROPERTIES if key in props)
+            self._clocks[unique_name] = PlaybackClock(
+                snapshot.position,
+                rate=snapshot.rate,
+                playing=snapshot.playback_status == PlaybackStatus.PLAYING,
+                clock=self.clock,
+            )
+        return snapshot
+
+    def _get_unwrapped_metadata(self, unique_name: str, metadata: Dict[str, Any]
+                                ) -> Dict[str, Any]:
+        # The mirrored metadata is replaced (not modified) when it changes
+        cached = self._unwrapped_metadata.get(unique_name)
+        if cached and cached[0] is metadata:
+            return cached[1]
+        unwrapped = unwrap_metadata(metadata)
+        self._unwrapped_metadata[unique_name] = (metadata, unwrapped)
+        return unwrapped
+
+    async def _fetch_properties(self, player: PlayerInterfaces) -> Dict[str, Any]:
+        try:
+            return unwrap_metadata(await self._get_all_properties(player))
+        except dbussy.DBusError as e:
+            if e.name in self.VANISHED_ERRORS or e.name == DBUS.ERROR_NO_REPLY:
+                # Asking for each property would only take longer
+                raise
+            # Some implementations fail GetAll entirely if one property fails
+            logger.debug(f"Failed to get all properties of {player.bus_name!r}", exc_info=e)
+            return await self._get_properties_individually(player)
+
+    async def _get_all_properties(self, player: PlayerInterfaces) -> Dict[str, Any]:
+        message = dbussy.Message.new_method_call(
+            destination=f"{self.BUS_BASE_NAME}.{player.bus_name}",
+            path=self.PATH_NAME,
+            iface=DBUS.INTERFACE_PROPERTIES,
+            method='GetAll',
+        )
+        message.append_objects('s', self.PLAYER_IFACE_NAME)
+        return (await self._call(message, 'a{sv}'))[0]
+
+    async def _get_properties_individually(self, player: PlayerInterfaces) -> Dict[str, Any]:
+        def get(key: str) -> Awaitable[Any]:
+            return self._get_property(player.bus_name, self.PLAYER_IFACE_NAME, key)
+
+        props: Dict[str, Any] = {}
+        props['PlaybackStatus'], props['Metadata'] = await asyncio.gather(
+            get('PlaybackStatus'), get('Metadata'))
+        for key in ('Position', 'Rate'):
+            if not hasattr(type(player.player), key):
+                logger.debug(f"Player {player.bus_name!r} doesn't advertise {key}")
                 continue
-        return result_list
+            try:
+                props[key] = await get(key)
+            except dbussy.DBusError as e:
+                logger.debug(f"Failed to retrieve {key} of {player.bus_name!r}", exc_info=e)
+        return props
+
+    async def _get_property(self, bus_name: str, iface: str, prop: str) -> Any:
+        message = dbussy.Message.new_method_call(
+            destination=f"{self.BUS_BASE_NAME}.{bus_name}",
+            path=self.PATH_NAME,
+            iface=DBUS.INTERFACE_PROPERTIES,
+            method='Get',
+        )
+        message.append_objects('ss', iface, prop)
+        return (await self._call(message, 'v'))[0][1]
+
+    async def _call(self, message: dbussy.Message, signature: str) -> List[Any]:
+        """Send a method call and return the arguments of its reply.
+
+        Fails with `org.freedesktop.DBus.Error.NoReply` after `call_timeout` seconds.
+        """
+        async def call() -> List[Any]:
+            # libdbus doesn't enforce its own timeouts with dbussy's event loop integration
+            # and keeps abandoned calls pending (which slows down all others),
+            # so we cancel them ourselves
+            pending = self.bus.connection.send_with_reply(message)
+            try:
+                reply = await asyncio.wait_for(pending.await_reply(), self.call_timeout)
+            except asyncio.TimeoutError:
+                raise dbussy.DBusError(
+                    DBUS.ERROR_NO_REPLY,
+                    f"No reply to {message.member} within {self.call_timeout:g} seconds",
+                ) from None
+            finally:
+                if not pending.completed:
+                    pending.cancel()
+            return reply.expect_return_objects(signature)
+        return await self._timed(message.member, call())
+
+    async def _timed(self, method: str, aw: Awaitable[_T]) -> _T:
+        """Await `aw` and report its duration to `call_observer`, if set."""
+        observer = self.call_observer
+        if observer is None:
+            return await aw
+        start = time.perf_counter()
+        error = None
+        try:
+            return await aw
+        except dbussy.DBusError as e:
+            error = e.name
+            raise
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            observer(method, time.perf_counter() - start, error)
+
+    @property
+    def player_health(self) -> Dict[str, CircuitState]:
+        """Return the circuit states of the players that failed recently."""
+        return {bus_name: health.state for bus_name, health in self._health.items()}
+
+    @property
+    def late_players(self) -> List[str]:
+        """Return the names of players whose calls didn't finish within the budget yet."""
+        return list(self._late)
+
+    def _is_healthy(self, bus_name: str) -> bool:
+        """Return whether the player may be called.
+
+        Starts a probe in the background once the cooldown of an unhealthy player elapsed.
+        """
+        health = self._health.get(bus_name)
+        if not health:
+            return True
+        state = health.state
+        if state == CircuitState.CLOSED:
+            return True
+        if state == CircuitState.HALF_OPEN and bus_name not in self._probes:
+            logger.debug(f"Probing unhealthy player {bus_name!r}")
+            self._probes[bus_name] = asyncio.ensure_future(self._probe(bus_name))
+        return False
+
+    async def _probe(self, bus_name: str) -> None:
+        try:
+            player = await self.get_player_ifaces(bus_name)
+            await self._checked(bus_name, self._fetch_properties(player), probe=True)
+        except (dbussy.DBusError, Mpris2Error):
+            pass  # already recorded
+        finally:
+            del self._probes[bus_name]
+        if bus_name not in self._health:
+            # Let the next tick pick it up
+            self._changed.set()
+
+    async def _checked(self, bus_name: str, aw: Awaitable[_T], *, probe: bool = False) -> _T:
+        """Await the calls to a player in `aw` and record their outcome in its health.
+
+        Only successful probes close an open circuit.
+        """
+        try:
+            result = await aw
+        except dbussy.DBusError as e:
+            if e.name not in self.VANISHED_ERRORS:
+                self._record_failure(bus_name, e.name)
+            raise
+        except Mpris2Error:
+            self._record_failure(bus_name, Mpris2Error.__name__)
+            raise
+        health = self._health.get(bus_name)
+        if health and (probe or health.state == CircuitState.CLOSED):
+            del self._health[bus_name]
+            logger.debug(f"Player {bus_name!r} recovered")
+        return result
+
+    def _record_failure(self, bus_name: str, error: str) -> None:
+        health = self._health.get(bus_name)
+        if not health:
+            health = self._health[bus_name] = PlayerHealth(*self._health_args, clock=self.clock)
+        opened = health.record_failure()
+        message = f"Call to player {bus_name!r} failed ({error}), {health.failures} in a row"
+        if opened:
+            message += f"; skipping it for {health.cooldown:g} seconds"
+        logger.debug(message)
@@ -11,7 +11,7 @@ from . import Mpris2Dbussy, unwrap_metadata
 
 
 async def async_main():
-    mpris = await Mpris2Dbussy.create()
+    mpris = await Mpris2Dbussy.create(response_budget=None)
     players = await mpris.get_players()
     print("Found players: " + ", ".join(p.name for p in players))
 
@@ -0,0 +1,6 @@
+"""Benchmarks for discordrp-mpris.
+
+Run the individual modules with `python -m benchmarks.<name>`.
+They start a private D-Bus session bus
+and don't need a running desktop session or Discord client.
+"""
@@ -0,0 +1,64 @@
+"""Measure per-player option lookups as done for every player in each tick.
+
+Compares dotted-path lookups with `Config.player_get`
+with the compiled `Config.player_options` tables.
+"""
+
+import argparse
+import timeit
+
+import pytoml
+
+from ampris2 import PlayerInterfaces
+from discordrp_mpris.config import Config, default_file
+
+USER_CONFIG = """
+[player.mpv]
+show_time = "remaining"
+
+[player.vlc]
+ignore = true
+"""
+
+
+def lookup_dotted(config: Config, players) -> None:
+    for player in players:
+        if (
+            not config.player_get(player, 'ignore', False)
+            and config.player_get(player, 'show_paused', True)
+        ):
+            config.player_get(player, 'show_stopped', False)
+            config.player_get(player, 'show_time', 'elapsed')
+
+
+def lookup_compiled(config: Config, players) -> None:
+    for player in players:
+        options = config.player_options(player)
+        if not options.ignore and options.show_paused:
+            options.show_stopped
+            options.show_time
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--players", type=int, default=10, help="number of players per tick")
+    parser.add_argument("--number", type=int, default=10000, help="ticks per measurement")
+    args = parser.parse_args()
+
+    with default_file.open() as f:
+        raw_config = pytoml.load(f)
+    raw_config.update(pytoml.loads(USER_CONFIG))
+    config = Config(raw_config)
+
+    names = ["mpv", "vlc"] + [f"player{i}" for i in range(args.players - 2)]
+    players = [PlayerInterfaces(f"org.mpris.MediaPlayer2.{name}", name, None, None)  # type: ignore
+               for name in names[:args.players]]
+
+    for name, func in (("dotted", lookup_dotted), ("compiled", lookup_compiled)):
+        seconds = min(timeit.repeat(lambda: func(config, players), number=args.number, repeat=3))
+        print(f"{name:<10} {seconds / args.number * 1e6:>8.2f} µs per tick"
+              f" ({args.players} players)")
+
+
+if __name__ == '__main__':
+    main()
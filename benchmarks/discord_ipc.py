@@ -0,0 +1,192 @@
+"""Soak the async Discord client against the fake IPC server.
+
+Measures request throughput (sequential and concurrent),
+with injected latency and fragmented frames,
+the time to reconnect after Discord restarts or drops the connection,
+and success rates while connections are dropped periodically.
+Also measures the pool fanning out to several clients
+and how quickly it restores a lost session.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from typing import Optional
+
+from discord_rpc.async_ import AsyncDiscordRpc, exceptions as async_exceptions
+from discord_rpc.pool import AsyncDiscordRpcPool
+from discord_rpc.testing import FakeDiscordServer, Faults
+from discordrp_mpris.__main__ import CLIENT_ID, DiscordMpris
+from discordrp_mpris.config import Config
+
+from .session import percentiles
+
+ACTIVITY = {'details': "Some Title\nby Some Artist", 'state': "Playing [3:45]"}
+
+
+async def measure_throughput(server: FakeDiscordServer, requests: int, concurrency: int,
+                             ) -> float:
+    async with AsyncDiscordRpc.for_platform(CLIENT_ID) as rpc:
+        await rpc.connect()
+        start = time.perf_counter()
+        for _ in range(0, requests, concurrency):
+            await asyncio.gather(*(rpc.set_activity(ACTIVITY) for _ in range(concurrency)))
+        return requests / (time.perf_counter() - start)
+
+
+async def measure_restart(directory: str, downtime: float, faults: Optional[Faults] = None,
+                          ) -> float:
+    """Return the time from the socket's creation to the completed handshake."""
+    server = FakeDiscordServer(directory, faults=faults)
+    rpc = AsyncDiscordRpc.for_platform(CLIENT_ID)
+    instance = DiscordMpris(None, rpc, Config._load_file(None))  # type: ignore
+    connecting = asyncio.ensure_future(instance.connect_discord())
+    await asyncio.sleep(downtime)
+    start = time.perf_counter()
+    await server.start()
+    await connecting
+    elapsed = time.perf_counter() - start
+    await rpc.close()
+    await server.close()
+    return elapsed
+
+
+async def measure_drop(server: FakeDiscordServer) -> float:
+    """Return the time from dropping the connection to being connected again."""
+    rpc = AsyncDiscordRpc.for_platform(CLIENT_ID)
+    instance = DiscordMpris(None, rpc, Config._load_file(None))  # type: ignore
+    await instance.connect_discord()
+    await server.wait_for_connection()
+    start = time.perf_counter()
+    server.disconnect_all()
+    while True:
+        try:
+            await rpc.set_activity(ACTIVITY)
+        except async_exceptions:
+            break
+    await instance.connect_discord()
+    elapsed = time.perf_counter() - start
+    await rpc.close()
+    return elapsed
+
+
+async def measure_pool(directory: str, clients: int, requests: int, latency: float) -> None:
+    servers = [FakeDiscordServer(directory, i, faults=Faults(latency=latency))
+               for i in range(clients)]
+    for server in servers:
+        await server.start()
+    async with AsyncDiscordRpcPool(CLIENT_ID) as pool:
+        await pool.connect()
+        start = time.perf_counter()
+        for _ in range(requests):
+            await pool.set_activity(ACTIVITY)
+        rate = requests / (time.perf_counter() - start)
+        print(f"  {clients} clients, {latency * 1e3:g} ms latency:"
+              f" {rate:>8.0f} requests/s")
+
+        # Drop one session; the others must keep working
+        # and the lost one must be restored with the last activity
+        lost = servers[0]
+        received = len(lost.activities)
+        start = time.perf_counter()
+        lost.disconnect_all()
+        while len(lost.activities) == received:
+            await pool.set_activity(ACTIVITY)
+        elapsed = time.perf_counter() - start
+        print(f"  restoring a lost session: {elapsed * 1e3:>8.1f} ms")
+    for server in servers:
+        await server.close()
+
+
+async def soak(server: FakeDiscordServer, duration: float, drop_interval: float) -> None:
+    rpc = AsyncDiscordRpc.for_platform(CLIENT_ID)
+    instance = DiscordMpris(None, rpc, Config._load_file(None))  # type: ignore
+    await instance.connect_discord()
+    succeeded = failed = reconnects = 0
+    latencies = []
+
+    async def drop_periodically() -> None:
+        while True:
+            await asyncio.sleep(drop_interval)
+            server.disconnect_all()
+
+    dropper = asyncio.ensure_future(drop_periodically())
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        start = time.perf_counter()
+        try:
+            await rpc.set_activity(ACTIVITY)
+        except async_exceptions:
+            failed += 1
+            await instance.connect_discord()
+            reconnects += 1
+        else:
+            succeeded += 1
+            latencies.append(time.perf_counter() - start)
+    dropper.cancel()
+    await rpc.close()
+
+    p50, p99 = (value * 1e3 for value in percentiles(latencies, (50, 99)))
+    print(f"{succeeded} requests succeeded, {failed} failed, {reconnects} reconnects;"
+          f" latency p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+
+
+async def run(args: argparse.Namespace, directory: str) -> None:
+    print("Throughput")
+    for name, faults in (
+        ("no faults", Faults()),
+        (f"{args.latency * 1e3:g} ms latency", Faults(latency=args.latency)),
+        ("fragmented frames (7 B)", Faults(fragment_size=7)),
+    ):
+        async with FakeDiscordServer(directory, faults=faults) as server:
+            for concurrency in (1, 16):
+                rate = await measure_throughput(server, args.requests, concurrency)
+                print(f"  {name:<24} concurrency {concurrency:>2}: {rate:>8.0f} requests/s")
+
+    print("Reconnecting")
+    elapsed = await measure_restart(directory, args.downtime)
+    print(f"  after Discord restarted:          {elapsed * 1e3:>8.1f} ms")
+    elapsed = await measure_restart(directory, args.downtime, Faults(handshake_errors=2))
+    print(f"  with 2 handshake errors:          {elapsed * 1e3:>8.1f} ms")
+    async with FakeDiscordServer(directory) as server:
+        elapsed = await measure_drop(server)
+    print(f"  after the connection was dropped: {elapsed * 1e3:>8.1f} ms")
+
+    print("Fanning out")
+    await measure_pool(directory, args.clients, args.requests // 4, args.latency)
+
+    if args.duration:
+        print(f"Soaking for {args.duration:g} s, dropping connections every"
+              f" {args.drop_interval:g} s")
+        async with FakeDiscordServer(directory, faults=Faults(latency=args.latency)) as server:
+            await soak(server, args.duration, args.drop_interval)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per measurement")
+    parser.add_argument("--latency", type=float, default=0.001,
+                        help="seconds the server takes to answer a request")
+    parser.add_argument("--downtime", type=float, default=0.5,
+                        help="seconds Discord is absent when restarting")
+    parser.add_argument("--clients", type=int, default=3,
+                        help="number of clients for the pool")
+    parser.add_argument("--duration", type=float, default=10, help="soak duration in seconds")
+    parser.add_argument("--drop-interval", type=float, default=1,
+                        help="seconds between dropped connections while soaking")
+    args = parser.parse_args()
+    # Don't clutter the results with the warnings about closing connections
+    logging.getLogger('discord_rpc').setLevel(logging.ERROR)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # The clients look for sockets in $XDG_RUNTIME_DIR first
+        os.environ['XDG_RUNTIME_DIR'] = directory
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run(args, directory))
+
+
+if __name__ == '__main__':
+    main()
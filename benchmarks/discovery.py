@@ -0,0 +1,63 @@
+"""Measure player discovery and status reads for an increasing number of players.
+
+Compares sequential queries (`max_concurrency = 1`)
+with the default concurrency limit.
+"""
+
+import argparse
+import asyncio
+import time
+
+from ampris2 import Mpris2Dbussy
+from discordrp_mpris.__main__ import DiscordMpris
+from discordrp_mpris.config import Config
+
+from .session import fake_players, private_session_bus
+
+PLAYER_COUNTS = (1, 10, 50, 100, 250, 500)
+
+
+async def measure(count: int, max_concurrency: int, rounds: int) -> (float, float):
+    # Wait for all players, however long it takes
+    mpris = await Mpris2Dbussy.create(max_concurrency=max_concurrency, response_budget=None)
+    instance = DiscordMpris(mpris, None, Config({}))  # type: ignore
+
+    start = time.perf_counter()
+    players = await mpris.get_players()
+    cold = time.perf_counter() - start
+    assert len(players) == count, f"expected {count} players, found {len(players)}"
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await instance.group_players(await mpris.get_players())
+    warm = (time.perf_counter() - start) / rounds
+    return cold, warm
+
+
+async def run(args: argparse.Namespace) -> None:
+    print(f"Player latency: {args.latency * 1e3:.1f} ms")
+    print(f"{'players':>7} | {'limit':>5} | {'discovery':>10} | {'tick':>10}")
+    for count in PLAYER_COUNTS:
+        if count > args.max_players:
+            break
+        with fake_players(count, extra_args=["--latency", str(args.latency)]):
+            for limit in (1, Mpris2Dbussy.DEFAULT_MAX_CONCURRENCY):
+                cold, warm = await measure(count, limit, args.rounds)
+                print(f"{count:>7} | {limit:>5} | {cold * 1e3:>7.1f} ms | {warm * 1e3:>7.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.002,
+                        help="seconds each fake player takes to answer a property request")
+    parser.add_argument("--rounds", type=int, default=5, help="warm rounds to average over")
+    parser.add_argument("--max-players", type=int, default=max(PLAYER_COUNTS))
+    args = parser.parse_args()
+
+    with private_session_bus():
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(run(args))
+
+
+if __name__ == '__main__':
+    main()
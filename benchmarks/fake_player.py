@@ -0,0 +1,223 @@
+"""Scriptable fake MPRIS2 players.
+
+Serves any number of players from a single process,
+each on its own bus connection
+so that they have distinct unique names.
+Prints "ready" once all players have acquired their bus names.
+
+Players can be configured to answer slowly, fail some or all requests,
+lack the Position property, carry large metadata,
+provide album art files,
+periodically change their track (announced via PropertiesChanged)
+or hang.
+
+Only `GetAll` calls can be failed,
+because ravel doesn't send error replies for failing `Get` calls.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import dbussy
+from dbussy import DBUS
+import ravel
+
+PATH_NAME = '/org/mpris/MediaPlayer2'
+PROP_CHANGE = dbussy.Introspection.PROP_CHANGE_NOTIFICATION
+PLAYER_IFACE_NAME = 'org.mpris.MediaPlayer2.Player'
+
+FAILURE_MODES = ('none', 'getall', 'no-position')
+ART_SIZE = 100 * 1024
+TRACKS_PER_ALBUM = 4
+
+
+class Behavior:
+
+    """How a fake player answers requests."""
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.latency = args.latency
+        self.fail = args.fail
+        self.error_rate = args.error_rate
+        self._current_call: Optional[Tuple[str, int]] = None
+        self._fail_call = False
+
+    def respond(self, prop: str, value: Any, message: dbussy.Message) -> Any:
+        if message.member == 'GetAll':
+            # Decide once per call, when the first property is requested
+            call = (message.sender, message.serial)
+            if call != self._current_call:
+                self._current_call = call
+                self._fail_call = self.fail == 'getall' or random.random() < self.error_rate
+            if self._fail_call:
+                # Must be raised synchronously; ravel doesn't handle errors from coroutines
+                raise ravel.ErrorReturn(DBUS.ERROR_FAILED, f"Failed to get {prop}")
+        if self.latency:
+            return self._delay(value)
+        return value
+
+    async def _delay(self, value: Any) -> Any:
+        await asyncio.sleep(self.latency)
+        return value
+
+
+@ravel.interface(ravel.INTERFACE.SERVER, name='org.mpris.MediaPlayer2')
+class FakeRoot:
+
+    def __init__(self, identity: str, behavior: Behavior) -> None:
+        self.identity = identity
+        self.behavior = behavior
+
+    @ravel.propgetter(name='Identity', type='s', change_notification=PROP_CHANGE.CONST,
+                      message_keyword='message')
+    def get_identity(self, message: dbussy.Message) -> str:
+        return self.behavior.respond('Identity', self.identity, message)
+
+
+@ravel.interface(ravel.INTERFACE.SERVER, name=PLAYER_IFACE_NAME)
+class FakePlayer:
+
+    def __init__(self, index: int, status: str, behavior: Behavior,
+                 metadata_size: int = 0, art_dir: Optional[str] = None) -> None:
+        self.index = index
+        self.status = status
+        self.behavior = behavior
+        self.metadata_size = metadata_size
+        self.art_dir = art_dir
+        self.rate = 1.0
+        self.track = 0
+        self.track_started = time.monotonic()
+        self.metadata = self._make_metadata()
+
+    def _make_metadata(self) -> Dict[str, Tuple[str, Any]]:
+        metadata = {
+            'mpris:trackid': ('o', f'/org/mpris/MediaPlayer2/Track/{self.index}_{self.track}'),
+            'mpris:length': ('x', 240 * 10**6),
+            'xesam:title': ('s', f"Track {self.index}" + (f".{self.track}" if self.track else "")),
+            'xesam:artist': ('as', ["Fake Artist"]),
+            'xesam:album': ('s', "Fake Album"),
+        }
+        if self.metadata_size:
+            # Like embedded lyrics or long comments some players provide
+            metadata['xesam:comment'] = ('as', ["x" * self.metadata_size])
+        if self.art_dir:
+            metadata['mpris:artUrl'] = ('s', self._write_art())
+        return metadata
+
+    def _write_art(self) -> str:
+        # Like players that extract the art of every track into a new file,
+        # with the same cover for all tracks of an album
+        album = self.track // TRACKS_PER_ALBUM
+        path = os.path.join(self.art_dir, f"cover-{self.index}-{self.track}.jpg")  # type: ignore
+        with open(path, 'wb') as f:
+            seed = hashlib.sha256(f"{self.index}-{album}".encode()).digest()
+            f.write(seed * (ART_SIZE // len(seed)))
+        return f"file://{path}"
+
+    def next_track(self, bus: ravel.Connection) -> None:
+        self.track += 1
+        self.track_started = time.monotonic()
+        self.metadata = self._make_metadata()
+        bus.prop_changed(PATH_NAME, PLAYER_IFACE_NAME, 'Metadata', 'a{sv}', self.metadata)
+
+    @ravel.propgetter(name='PlaybackStatus', type='s', change_notification=PROP_CHANGE.NEW_VALUE,
+                      message_keyword='message')
+    def get_playback_status(self, message: dbussy.Message) -> str:
+        return self.behavior.respond('PlaybackStatus', self.status, message)
+
+    @ravel.propgetter(name='Metadata', type='a{sv}', change_notification=PROP_CHANGE.NEW_VALUE,
+                      message_keyword='message')
+    def get_metadata(self, message: dbussy.Message) -> Dict[str, Tuple[str, Any]]:
+        return self.behavior.respond('Metadata', self.metadata, message)
+
+    @ravel.propgetter(name='Position', type='x', change_notification=PROP_CHANGE.NONE,
+                      message_keyword='message')
+    def get_position(self, message: dbussy.Message) -> int:
+        position = 0
+        if self.status == 'Playing':
+            # Advances in real time, like the position of an actual player
+            position = int((time.monotonic() - self.track_started) * 1e6)
+        return self.behavior.respond('Position', position, message)
+
+    @ravel.propgetter(name='Rate', type='d', change_notification=PROP_CHANGE.NEW_VALUE,
+                      message_keyword='message')
+    def get_rate(self, message: dbussy.Message) -> float:
+        return self.behavior.respond('Rate', self.rate, message)
+
+    @ravel.signal(name='Seeked', in_signature='x')
+    def seeked(self, position: int) -> None:
+        pass
+
+
+@ravel.interface(ravel.INTERFACE.SERVER, name=PLAYER_IFACE_NAME)
+class FakePlayerWithoutPosition(FakePlayer):
+
+    """Like players that don't provide the Position property (e.g. Firefox)."""
+
+    get_position = None
+
+
+async def serve(args: argparse.Namespace) -> None:
+    loop = asyncio.get_event_loop()
+    behavior = Behavior(args)
+    players = []
+    for i in range(args.count):
+        # Every player needs its own connection to get a distinct unique name
+        conn = await dbussy.Connection.bus_get_async(DBUS.BUS_SESSION, private=True, loop=loop)
+        bus = ravel.Connection(conn)
+        player_class = FakePlayerWithoutPosition if args.fail == 'no-position' else FakePlayer
+        player = player_class(i, args.status, behavior, args.metadata_size, args.art_dir)
+        bus.register(path=PATH_NAME, fallback=False,
+                     interface=FakeRoot(f"{args.prefix} {i}", behavior))
+        bus.register(path=PATH_NAME, fallback=False, interface=player)
+        await bus.request_name_async(f"org.mpris.MediaPlayer2.{args.prefix}{i}",
+                                     DBUS.NAME_FLAG_DO_NOT_QUEUE)
+        players.append((bus, player))
+
+    print("ready", flush=True)
+    if args.freeze:
+        # Block the event loop so that no call is ever answered, like a hung player.
+        # (A huge latency would do, but ravel busy-waits for delayed replies.)
+        while True:
+            time.sleep(3600)
+    if not args.churn:
+        await loop.create_future()  # run until terminated
+    # Change tracks in turn so that changes are spread over the interval
+    delay = args.churn / len(players)
+    while True:
+        for bus, player in players:
+            await asyncio.sleep(delay)
+            player.next_track(bus)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=1, help="number of players")
+    parser.add_argument("--prefix", default="fake", help="prefix for the bus names")
+    parser.add_argument("--status", default="Playing", help="PlaybackStatus of the players")
+    parser.add_argument("--latency", type=float, default=0,
+                        help="seconds to wait before answering a property request")
+    parser.add_argument("--metadata-size", type=int, default=0,
+                        help="size of an additional metadata field in bytes")
+    parser.add_argument("--fail", choices=FAILURE_MODES, default='none',
+                        help="let all GetAll calls fail or leave out the Position property")
+    parser.add_argument("--error-rate", type=float, default=0,
+                        help="probability of a GetAll call failing")
+    parser.add_argument("--churn", type=float, default=0,
+                        help="interval in seconds in which every player changes its track")
+    parser.add_argument("--art-dir", help="directory to write album art files to")
+    parser.add_argument("--freeze", action='store_true',
+                        help="stop answering any call once ready")
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(serve(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Measure encode and decode throughput of the Discord IPC frame codec.
+
+Decoding is measured with the data arriving in chunks of various sizes
+and compared with the previous approach
+of concatenating `bytes` objects until a frame is complete.
+"""
+
+import argparse
+import json
+import struct
+import timeit
+from typing import Callable, List
+
+from discord_rpc.protocol import FrameDecoder, encode_frame
+
+ACTIVITY = {
+    'cmd': 'SET_ACTIVITY',
+    'args': {
+        'pid': 12345,
+        'activity': {
+            'details': "Some Title\nby Some Artist",
+            'state': "Playing [3:45]",
+            'timestamps': {'start': 1600000000},
+            'assets': {'large_text': "mpv", 'large_image': "mpv",
+                       'small_image': "playing", 'small_text': "Playing"},
+        },
+    },
+    'nonce': "8d5bdfa5-a0b6-4a2c-8be6-0a3d5c0fb2d4",
+}
+LARGE = {'cmd': 'DISPATCH', 'evt': 'READY', 'data': {'blob': "x" * 2**20}, 'nonce': None}
+
+
+def legacy_decode(stream: bytes, chunk_size: int) -> List[dict]:
+    # The approach used before the shared codec
+    pos = 0
+
+    def recv_exactly(size: int) -> bytes:
+        nonlocal pos
+        buf = b""
+        while size:
+            chunk = stream[pos:pos + min(size, chunk_size)]
+            pos += len(chunk)
+            buf += chunk
+            size -= len(chunk)
+        return buf
+
+    frames = []
+    while pos < len(stream):
+        op, length = struct.unpack("<II", recv_exactly(8))
+        frames.append(json.loads(recv_exactly(length).decode('utf-8')))
+    return frames
+
+
+def decoder_decode(stream: bytes, chunk_size: int) -> List[dict]:
+    decoder = FrameDecoder()
+    frames = []
+    for pos in range(0, len(stream), chunk_size):
+        decoder.feed(stream[pos:pos + chunk_size])
+        frames.extend(data for op, data in decoder)
+    return frames
+
+
+def report(name: str, func: Callable[[], object], num_bytes: int, number: int) -> None:
+    seconds = min(timeit.repeat(func, number=number, repeat=3)) / number
+    print(f"{name:<40} {seconds * 1e6:>10.1f} µs {num_bytes / seconds / 2**20:>10.1f} MiB/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=200, help="iterations per measurement")
+    args = parser.parse_args()
+
+    small = encode_frame(ACTIVITY)
+    large = encode_frame(LARGE)
+
+    print("Encoding")
+    report("activity frame", lambda: encode_frame(ACTIVITY), len(small), args.number * 10)
+    report("1 MiB frame", lambda: encode_frame(LARGE), len(large), args.number // 10 or 1)
+
+    print("Decoding")
+    stream = small * 100
+    for chunk_size in (64, 4096):
+        report(f"100 activity frames, {chunk_size} B chunks (legacy)",
+               lambda: legacy_decode(stream, chunk_size), len(stream), args.number)
+        report(f"100 activity frames, {chunk_size} B chunks",
+               lambda: decoder_decode(stream, chunk_size), len(stream), args.number)
+    for chunk_size in (4096, 65536):
+        report(f"1 MiB frame, {chunk_size} B chunks (legacy)",
+               lambda: legacy_decode(large, chunk_size), len(large), args.number // 20 or 1)
+        report(f"1 MiB frame, {chunk_size} B chunks",
+               lambda: decoder_decode(large, chunk_size), len(large), args.number // 20 or 1)
+
+
+if __name__ == '__main__':
+    main()
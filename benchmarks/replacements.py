@@ -0,0 +1,95 @@
+"""Measure building the template fields and rendering the default templates.
+
+Compares the lazy `Replacements` mapping
+with the previous approach of copying the metadata into a new dict
+and computing all derived fields up front.
+Reports time and allocated memory per tick
+for small metadata and for metadata with embedded lyrics.
+"""
+
+import argparse
+import timeit
+import tracemalloc
+from typing import Any, Callable, Dict
+
+from ampris2 import PlaybackStatus, PlayerInterfaces
+from discordrp_mpris.__main__ import DETAILS_MAX_CHARS, DiscordMpris
+from discordrp_mpris.config import PlayerOptions
+
+PLAYER = PlayerInterfaces("org.mpris.MediaPlayer2.mpv", "mpv", None, None)  # type: ignore
+SMALL = {
+    'mpris:trackid': "/org/mpv/Track/1",
+    'mpris:length': 245_000_000,
+    'xesam:title': "Some Title",
+    'xesam:artist': ["Some Artist", "Another Artist"],
+    'xesam:album': "Some Album",
+    'xesam:url': "file:///home/user/Music/some%20title.flac",
+}
+LARGE = dict(
+    SMALL,
+    **{f'xesam:tag{i}': f"value {i}" for i in range(50)},
+    **{'xesam:asText': "la la la\n" * 2000, 'xesam:comment': ["x" * 5000]},
+)
+
+
+def legacy_build_replacements(player, metadata, position, length, state) -> Dict[str, Any]:
+    replacements = metadata.copy()
+    for key in ('artist', 'albumArtist'):
+        source = metadata.get(f'xesam:{key}', ())
+        if isinstance(source, str):
+            replacements[key] = source
+        else:
+            replacements[key] = " & ".join(source)
+    replacements['title'] = metadata.get('xesam:title', "")
+    replacements['album'] = metadata.get('xesam:album', "")
+    replacements['position'] = \
+        DiscordMpris.format_timestamp(int(position)) if position is not None else ''
+    replacements['length'] = DiscordMpris.format_timestamp(length)
+    replacements['player'] = player.name
+    replacements['state'] = state.value
+    return {key.replace(':', '_'): val for key, val in replacements.items()}
+
+
+def make_tick(build: Callable[..., Any], metadata: Dict[str, Any]) -> Callable[[], None]:
+    options = PlayerOptions()
+
+    def tick() -> None:
+        replacements = build(PLAYER, metadata, 12_345_678, metadata['mpris:length'],
+                             PlaybackStatus.PLAYING)
+        template = options.details if replacements['artist'] else options.details_no_artist
+        template.render(replacements, DETAILS_MAX_CHARS)
+        options.state_playing.render(replacements, DETAILS_MAX_CHARS)
+
+    return tick
+
+
+def measure_allocations(func: Callable[[], None], number: int) -> int:
+    """Return the peak of memory allocated while calling `func` repeatedly."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(number):
+            func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak - before
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=10000, help="ticks per measurement")
+    args = parser.parse_args()
+
+    print(f"{'metadata':<8} {'implementation':<14} {'time':>12} {'peak alloc':>12}")
+    for md_name, metadata in (("small", SMALL), ("large", LARGE)):
+        for name, build in (("legacy", legacy_build_replacements),
+                            ("lazy", DiscordMpris.build_replacements)):
+            tick = make_tick(build, metadata)
+            seconds = min(timeit.repeat(tick, number=args.number, repeat=3)) / args.number
+            peak = measure_allocations(tick, 100)
+            print(f"{md_name:<8} {name:<14} {seconds * 1e6:>9.2f} µs {peak:>10} B")
+
+
+if __name__ == '__main__':
+    main()
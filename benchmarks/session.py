@@ -0,0 +1,117 @@
+"""Helpers for running benchmarks against a private D-Bus session bus."""
+
+import contextlib
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import dbussy
+
+
+@contextlib.contextmanager
+def private_session_bus() -> Iterator[str]:
+    """Start a private `dbus-daemon --session` and point the environment to it."""
+    proc = subprocess.Popen(
+        ["dbus-daemon", "--session", "--nofork", "--print-address"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        universal_newlines=True,
+    )
+    assert proc.stdout
+    address = proc.stdout.readline().strip()
+    old_address = os.environ.get('DBUS_SESSION_BUS_ADDRESS')
+    os.environ['DBUS_SESSION_BUS_ADDRESS'] = address
+    try:
+        yield address
+    finally:
+        if old_address is None:
+            del os.environ['DBUS_SESSION_BUS_ADDRESS']
+        else:
+            os.environ['DBUS_SESSION_BUS_ADDRESS'] = old_address
+        proc.terminate()
+        proc.wait()
+
+
+@contextlib.contextmanager
+def fake_players(count: int, *, extra_args: Optional[List[str]] = None,
+                 ) -> Iterator[subprocess.Popen]:
+    """Spawn a process serving `count` fake players and wait until they are ready."""
+    args = [sys.executable, "-m", "benchmarks.fake_player", "--count", str(count)]
+    proc = subprocess.Popen(args + (extra_args or []),
+                            stdout=subprocess.PIPE, universal_newlines=True)
+    assert proc.stdout
+    try:
+        line = proc.stdout.readline()
+        if line.strip() != "ready":
+            raise RuntimeError("Fake players failed to start")
+        yield proc
+    finally:
+        proc.terminate()
+        proc.wait()
+        # give the bus a moment to process the NameOwnerChanged signals
+        time.sleep(0.1)
+
+
+class CallCounter:
+
+    """Counts D-Bus method calls made from this process.
+
+    Wraps `dbussy.Connection.send_with_reply`, which `ampris2` uses to make calls,
+    and `send_await_reply`, which the ravel proxies use.
+    """
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self._originals: Dict[str, Any] = {}
+
+    def __enter__(self) -> 'CallCounter':
+        self._originals = {
+            'send_with_reply': dbussy.Connection.send_with_reply,
+            'send_await_reply': dbussy.Connection.send_await_reply,
+        }
+        send_with_reply = self._originals['send_with_reply']
+        send_await_reply = self._originals['send_await_reply']
+
+        def counting_send_with_reply(connection, message, *args, **kwargs):
+            self.calls += 1
+            return send_with_reply(connection, message, *args, **kwargs)
+
+        async def counting_send_await_reply(connection, message, *args, **kwargs):
+            self.calls += 1
+            return await send_await_reply(connection, message, *args, **kwargs)
+
+        dbussy.Connection.send_with_reply = counting_send_with_reply
+        dbussy.Connection.send_await_reply = counting_send_await_reply
+        return self
+
+    def __exit__(self, *_) -> None:
+        for name, original in self._originals.items():
+            setattr(dbussy.Connection, name, original)
+
+
+class NullDiscord:
+
+    """Accepts activity updates in place of a Discord client."""
+
+    connected = True
+
+    def __init__(self) -> None:
+        self.updates = 0
+
+    async def set_activity(self, activity: Any) -> Tuple[int, Any]:
+        self.updates += 1
+        return 1, {'evt': None}
+
+    async def clear_activity(self) -> Tuple[int, Any]:
+        self.updates += 1
+        return 1, {'evt': None}
+
+
+def percentiles(samples: Sequence[float], points: Sequence[float] = (50, 90, 99),
+                ) -> List[float]:
+    """Return the given percentiles of `samples` (nearest-rank method)."""
+    ordered = sorted(samples)
+    return [ordered[max(0, min(len(ordered) - 1, int(round(p / 100 * len(ordered))) - 1))]
+            for p in points]
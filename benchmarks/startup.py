@@ -0,0 +1,90 @@
+"""Measure the cold start of the daemon.
+
+Reports the time to import `discordrp_mpris.__main__` in a fresh interpreter
+and the time from spawning `python -m discordrp_mpris`
+until the fake Discord server receives the first presence,
+with fake players on a private session bus.
+"""
+
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+from discord_rpc.testing import FakeDiscordServer, Faults
+
+from .session import fake_players, percentiles, private_session_bus
+
+IMPORT_SNIPPET = """\
+import time
+start = time.perf_counter()
+import discordrp_mpris.__main__
+print(time.perf_counter() - start)
+"""
+
+
+def measure_import(runs: int) -> List[float]:
+    return [
+        float(subprocess.check_output([sys.executable, "-c", IMPORT_SNIPPET],
+                                      universal_newlines=True))
+        for _ in range(runs)
+    ]
+
+
+async def measure_first_presence(server: FakeDiscordServer, env: dict) -> float:
+    activities = len(server.activities)
+    start = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "discordrp_mpris", env=env)
+    try:
+        while len(server.activities) == activities:
+            if proc.returncode is not None:
+                raise RuntimeError(f"discordrp-mpris exited with {proc.returncode}")
+            await asyncio.sleep(0.001)
+        return time.perf_counter() - start
+    finally:
+        proc.terminate()
+        await proc.wait()
+
+
+async def measure_startups(args: argparse.Namespace, directory: str) -> List[float]:
+    env = dict(os.environ, XDG_RUNTIME_DIR=directory, XDG_CONFIG_HOME=directory)
+    faults = Faults(latency=args.discord_latency)
+    results = []
+    async with FakeDiscordServer(directory, faults=faults) as server:
+        for _ in range(args.runs):
+            results.append(await measure_first_presence(server, env))
+    return results
+
+
+def report(name: str, samples: List[float]) -> None:
+    p50, p90 = (value * 1e3 for value in percentiles(samples, (50, 90)))
+    print(f"{name:<16} p50 {p50:>7.1f} ms   p90 {p90:>7.1f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10, help="measured runs")
+    parser.add_argument("--players", type=int, default=5, help="number of fake players")
+    parser.add_argument("--latency", type=float, default=0.005,
+                        help="seconds each fake player takes to answer a property request")
+    parser.add_argument("--discord-latency", type=float, default=0.05,
+                        help="seconds the fake Discord client takes to answer a request")
+    args = parser.parse_args()
+
+    print(f"{args.players} players with {args.latency * 1e3:g} ms latency,"
+          f" Discord with {args.discord_latency * 1e3:g} ms latency")
+    report("import", measure_import(args.runs))
+    player_args = ["--latency", str(args.latency)]
+    with private_session_bus(), fake_players(args.players, extra_args=player_args), \
+            tempfile.TemporaryDirectory() as directory:
+        loop = asyncio.new_event_loop()
+        report("first presence", loop.run_until_complete(measure_startups(args, directory)))
+
+
+if __name__ == '__main__':
+    main()
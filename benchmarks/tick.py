@@ -0,0 +1,188 @@
+"""Measure the update path against fake players on a private session bus.
+
+Reports latency percentiles and D-Bus calls
+for `Mpris2Dbussy.get_players`, `DiscordMpris.find_active_player`
+and `DiscordMpris.tick`,
+with and without listening to signals,
+and the CPU time the main loop consumes per hour
+(extrapolated from running it for `--duration` seconds).
+
+Use `--metrics` to measure with metrics being collected,
+`--art` to let the players provide album art files to be published,
+`--hung` to add players that never answer
+and `--max-tick-p99` and `--max-calls-per-tick`
+to fail with a non-zero exit status on regressions, e.g. in CI.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import tempfile
+import time
+from typing import Awaitable, Callable, Iterator, List, Optional, Tuple
+
+from ampris2 import Mpris2Dbussy
+from discordrp_mpris.__main__ import DiscordMpris
+from discordrp_mpris.artwork import ArtCache, ArtResolver, LocalArtUploader
+from discordrp_mpris.config import Config
+from discordrp_mpris.metrics import Metrics
+
+from .fake_player import FAILURE_MODES
+from .session import CallCounter, NullDiscord, fake_players, percentiles, private_session_bus
+
+Result = Tuple[List[float], float]  # latencies in seconds, calls per run
+
+
+async def measure(func: Callable[[], Awaitable[object]], runs: int) -> Result:
+    latencies = []
+    with CallCounter() as counter:
+        for _ in range(runs):
+            start = time.perf_counter()
+            await func()
+            latencies.append(time.perf_counter() - start)
+    return latencies, counter.calls / runs
+
+
+async def create_instance(listen: bool, metrics: bool, art_dir: Optional[str]
+                          ) -> DiscordMpris:
+    # Only use the default config to get reproducible results
+    config = Config._load_file(None)
+    mpris = await Mpris2Dbussy.create(
+        max_concurrency=config.raw_get('global.max_concurrency'),
+        max_state_age=config.raw_get('global.signal_poll_interval'),
+        response_budget=config.raw_get('global.player_budget'),
+    )
+    if listen:
+        mpris.start_listening()
+    instance = DiscordMpris(mpris, NullDiscord(), config)  # type: ignore
+    if metrics:
+        instance.metrics = Metrics()
+        mpris.call_observer = instance.metrics.observe_dbus_call
+        instance.scheduler.update_observer = instance.metrics.observe_activity_update
+    if art_dir:
+        uploader = LocalArtUploader(os.path.join(art_dir, "published"), "https://example.invalid/")
+        instance.art = ArtResolver(uploader, ArtCache(None, 100 * 1024 * 1024))
+    return instance
+
+
+async def measure_cpu(listen: bool, metrics: bool, art_dir: Optional[str], duration: float,
+                      ) -> Tuple[float, int]:
+    instance = await create_instance(listen, metrics, art_dir)
+    instance.config.raw_config['global']['listen_signals'] = listen
+    start = time.process_time()
+    task = asyncio.ensure_future(instance.run())
+    await asyncio.sleep(duration)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    cpu_time = time.process_time() - start
+    instance.mpris.stop_listening()
+    if instance.art:
+        await instance.art.close()
+    return cpu_time / duration * 3600, instance.discord.updates  # type: ignore
+
+
+async def run(args: argparse.Namespace) -> bool:
+    ok = True
+    print(f"{args.players} players, {args.latency * 1e3:.1f} ms latency,"
+          f" {args.metadata_size} B extra metadata, failing: {args.fail},"
+          f" error rate: {args.error_rate:.0%}, track changes every {args.churn:g} s,"
+          f" metrics {'enabled' if args.metrics else 'disabled'},"
+          f" art {'enabled' if args.art_dir else 'disabled'}, {args.hung} hung players")
+    print(f"{'mode':<7} {'operation':<18} {'p50':>9} {'p90':>9} {'p99':>9} {'calls':>7}")
+    for listen in (False, True):
+        mode = "signals" if listen else "polling"
+        instance = await create_instance(listen, args.metrics, args.art_dir)
+        for _ in range(args.warmup):
+            await instance.tick()
+
+        operations = (
+            ("get_players", instance.mpris.get_players),
+            ("find_active_player", instance.find_active_player),
+            ("tick", instance.tick),
+        )
+        for name, func in operations:
+            latencies, calls = await measure(func, args.runs)
+            p50, p90, p99 = (value * 1e3 for value in percentiles(latencies))
+            print(f"{mode:<7} {name:<18} {p50:>6.2f} ms {p90:>6.2f} ms {p99:>6.2f} ms"
+                  f" {calls:>7.1f}")
+            if name == 'tick':
+                if args.max_tick_p99 is not None and p99 > args.max_tick_p99:
+                    print(f"  tick p99 exceeds {args.max_tick_p99} ms")
+                    ok = False
+                if args.max_calls_per_tick is not None and calls > args.max_calls_per_tick:
+                    print(f"  calls per tick exceed {args.max_calls_per_tick}")
+                    ok = False
+        instance.mpris.stop_listening()
+        if instance.art:
+            await instance.art.close()
+
+    if args.duration:
+        print(f"Running the main loop for {args.duration:g} s each")
+        for listen in (False, True):
+            mode = "signals" if listen else "polling"
+            cpu_per_hour, updates = await measure_cpu(listen, args.metrics, args.art_dir,
+                                                     args.duration)
+            print(f"{mode:<7} {cpu_per_hour:>7.2f} s CPU per hour, {updates} activity updates")
+    return ok
+
+
+@contextlib.contextmanager
+def hung_players(count: int) -> Iterator[None]:
+    if not count:
+        yield
+        return
+    with fake_players(count, extra_args=["--prefix", "hung", "--freeze"]):
+        yield
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--players", type=int, default=10, help="number of fake players")
+    parser.add_argument("--latency", type=float, default=0.001,
+                        help="seconds each fake player takes to answer a property request")
+    parser.add_argument("--metadata-size", type=int, default=0,
+                        help="size of an additional metadata field in bytes")
+    parser.add_argument("--fail", choices=FAILURE_MODES, default='none',
+                        help="let all GetAll calls fail or leave out the Position property")
+    parser.add_argument("--error-rate", type=float, default=0,
+                        help="probability of a GetAll call failing")
+    parser.add_argument("--churn", type=float, default=10,
+                        help="interval in seconds in which every player changes its track")
+    parser.add_argument("--runs", type=int, default=200, help="measured runs per operation")
+    parser.add_argument("--warmup", type=int, default=5, help="ticks before measuring")
+    parser.add_argument("--duration", type=float, default=20,
+                        help="seconds to run the main loop for measuring CPU time (0 to skip)")
+    parser.add_argument("--metrics", action='store_true', help="collect metrics")
+    parser.add_argument("--art", action='store_true', help="publish album art")
+    parser.add_argument("--hung", type=int, default=0,
+                        help="number of additional players that never answer")
+    parser.add_argument("--max-tick-p99", type=float, help="fail if tick p99 exceeds this (ms)")
+    parser.add_argument("--max-calls-per-tick", type=float,
+                        help="fail if ticks make more D-Bus calls than this on average")
+    args = parser.parse_args()
+
+    player_args = [
+        "--latency", str(args.latency),
+        "--metadata-size", str(args.metadata_size),
+        "--fail", args.fail,
+        "--error-rate", str(args.error_rate),
+        "--churn", str(args.churn),
+    ]
+    with private_session_bus(), tempfile.TemporaryDirectory() as art_dir:
+        args.art_dir = None
+        if args.art:
+            args.art_dir = art_dir
+            player_args += ["--art-dir", art_dir]
+        with fake_players(args.players, extra_args=player_args), hung_players(args.hung):
+            loop = asyncio.new_event_loop()
+            ok = loop.run_until_complete(run(args))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Count how often the main loop wakes up under different workloads.
+
+Runs `DiscordMpris.run` against fake players
+(none, paused, or playing and skipping tracks every `--churn` seconds)
+and reports the ticks per hour
+with a fixed poll interval (the previous behavior),
+with the adaptive poll interval
+and while listening to signals.
+
+All intervals are divided by `--speedup`,
+so that a short run covers a longer period of time.
+"""
+
+import argparse
+import asyncio
+import contextlib
+from typing import Iterator, List
+
+from ampris2 import Mpris2Dbussy
+from discordrp_mpris.__main__ import DiscordMpris
+from discordrp_mpris.config import Config
+
+from .session import NullDiscord, fake_players, private_session_bus
+
+INTERVAL_KEYS = ('poll_interval_min', 'poll_interval', 'poll_interval_idle',
+                 'signal_poll_interval')
+MODES = ('fixed', 'adaptive', 'signals')
+
+
+async def count_ticks(mode: str, duration: float, speedup: float) -> float:
+    """Return the number of ticks per (simulated) hour."""
+    config = Config._load_file(None)
+    settings = config.raw_config['global']
+    for key in INTERVAL_KEYS:
+        settings[key] /= speedup
+    if mode == 'fixed':
+        settings['poll_interval_min'] = settings['poll_interval_idle'] = settings['poll_interval']
+    settings['listen_signals'] = mode == 'signals'
+
+    mpris = await Mpris2Dbussy.create(max_state_age=settings['signal_poll_interval'])
+    instance = DiscordMpris(mpris, NullDiscord(), config)  # type: ignore
+    ticks = 0
+    tick = instance.tick
+
+    async def counting_tick() -> None:
+        nonlocal ticks
+        ticks += 1
+        await tick()
+
+    instance.tick = counting_tick  # type: ignore
+    task = asyncio.ensure_future(instance.run())
+    await asyncio.sleep(duration)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    mpris.stop_listening()
+    return ticks / (duration * speedup) * 3600
+
+
+@contextlib.contextmanager
+def workload(name: str, players: int, churn: float) -> Iterator[None]:
+    if name == 'idle':
+        yield
+        return
+    args: List[str] = []
+    if name == 'paused':
+        args += ["--status", "Paused"]
+    else:
+        args += ["--churn", str(churn)]
+    with fake_players(players, extra_args=args):
+        yield
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--players", type=int, default=2, help="number of fake players")
+    parser.add_argument("--duration", type=float, default=10,
+                        help="seconds to run each combination for")
+    parser.add_argument("--speedup", type=float, default=30,
+                        help="factor to shorten all intervals by")
+    parser.add_argument("--churn", type=float, default=180,
+                        help="simulated seconds between track changes while playing")
+    parser.add_argument("--mode", choices=MODES, help="only measure this mode")
+    args = parser.parse_args()
+
+    modes = [args.mode] if args.mode else list(MODES)
+    print(f"Ticks per hour ({args.duration * args.speedup / 60:g} simulated minutes each)")
+    print(f"{'workload':<10}" + "".join(f"{mode:>10}" for mode in modes))
+    with private_session_bus():
+        loop = asyncio.new_event_loop()
+        for name in ('idle', 'paused', 'skipping'):
+            results: List[float] = []
+            with workload(name, args.players, args.churn / args.speedup):
+                for mode in modes:
+                    results.append(loop.run_until_complete(
+                        count_ticks(mode, args.duration, args.speedup)))
+            print(f"{name:<10}" + "".join(f"{result:>10.0f}" for result in results))
+
+
+if __name__ == '__main__':
+    main()
@@ -6,20 +6,20 @@
 # * https://github.com/devsnek/discord-rpc/tree/master/example/main.js
 
 from abc import ABCMeta, abstractmethod
-import json
 import logging
 import os
 import socket
 import sys
-import struct
-import uuid
+import time
 
+from .protocol import (
+    OP_HANDSHAKE, OP_FRAME, OP_CLOSE, OP_PING, OP_PONG,
+    FrameDecoder, encode_frame, make_nonce,
+)
 
-OP_HANDSHAKE = 0
-OP_FRAME = 1
-OP_CLOSE = 2
-OP_PING = 3
-OP_PONG = 4
+READ_CHUNK_SIZE = 2**16
+# Seconds to wait for the reply to a request (including the handshake)
+DEFAULT_TIMEOUT = 10
 
 logger = logging.getLogger(__name__)
 
@@ -28,6 +28,10 @@ class DiscordRpcError(Exception):
     pass
 
 
+class DiscordRpcTimeoutError(DiscordRpcError, TimeoutError):
+    """Discord didn't reply in time. The connection has been closed."""
+
+
 class DiscordRpc(metaclass=ABCMeta):
 
     """Work with an open Discord instance via its JSON IPC for its rich presence.
@@ -37,20 +41,30 @@ class DiscordRpc(metaclass=ABCMeta):
     will resolve to one of WinDiscordIpcClient or UnixDiscordIpcClient,
     depending on the current platform.
     Supports context handler protocol.
+
+    Requests that aren't answered within `timeout` seconds
+    raise `DiscordRpcTimeoutError` after closing the connection;
+    call `connect` to start over.
+    Windows pipes can't time out.
     """
 
-    def __init__(self, client_id):
+    def __init__(self, client_id, *, timeout=DEFAULT_TIMEOUT):
         self.client_id = client_id
+        self.timeout = timeout
+        self.connect()
+
+    def connect(self):
+        self._decoder = FrameDecoder()
         self._connect()
         self._do_handshake()
-        # logger.debug("connected via ID %s", client_id)
+        # logger.debug("connected via ID %s", self.client_id)
 
     @classmethod
-    def for_platform(cls, client_id, platform=sys.platform):
+    def for_platform(cls, client_id, platform=sys.platform, *, timeout=DEFAULT_TIMEOUT):
         if platform == 'win32':
-            return WinDiscordRpc(client_id)
+            return WinDiscordRpc(client_id, timeout=timeout)
         else:
-            return UnixDiscordRpc(client_id)
+            return UnixDiscordRpc(client_id, timeout=timeout)
 
     @abstractmethod
     def _connect(self):
@@ -71,21 +85,14 @@ class DiscordRpc(metaclass=ABCMeta):
         pass
 
     @abstractmethod
-    def _recv(self, size: int) -> bytes:
-        pass
+    def _recv(self, size: int, deadline: float = None) -> bytes:
+        """Receive at most `size` bytes, or at least some if the transport is buffered.
 
-    def _recv_header(self) -> (int, int):
-        header = self._recv_exactly(8)
-        return struct.unpack("<II", header)
-
-    def _recv_exactly(self, size) -> bytes:
-        buf = b""
-        size_remaining = size
-        while size_remaining:
-            chunk = self._recv(size_remaining)
-            buf += chunk
-            size_remaining -= len(chunk)
-        return buf
+        Returns an empty result at EOF.
+        Raises `socket.timeout` if nothing was received
+        before the `time.monotonic` value `deadline`.
+        """
+        pass
 
     def close(self):
         logger.warning("closing connection")
@@ -104,43 +111,57 @@ class DiscordRpc(metaclass=ABCMeta):
     def __exit__(self, *_):
         self.close()
 
-    def send_recv(self, data, *, op=OP_FRAME):
+    def send_recv(self, data, *, op=OP_FRAME, timeout=None):
+        """Send a request and return its reply.
+
+        Waits for at most `timeout` seconds (default: `self.timeout`).
+        """
+        if timeout is None:
+            timeout = self.timeout
+        deadline = None if timeout is None else time.monotonic() + timeout
         nonce = data.get('nonce')
         self.send(data, op=op)
-        while True:
-            # TODO timeout
-            reply = self.recv()
-            if reply[1].get('nonce') == nonce:
-                return reply
-            else:
-                logger.warning("received unexpected reply; %s", reply)
-        return
+        try:
+            while True:
+                reply = self.recv(deadline)
+                if reply[1].get('nonce') == nonce:
+                    return reply
+                else:
+                    logger.warning("received unexpected reply; %s", reply)
+        except socket.timeout:
+            logger.warning("No reply from Discord within %g seconds; closing connection",
+                           timeout)
+            self._close()
+            raise DiscordRpcTimeoutError(
+                "No reply to {} within {:g} seconds".format(data.get('cmd'), timeout)
+            ) from None
 
     def send(self, data, *, op=OP_FRAME):
         logger.debug("sending %s", data)
-        data_str = json.dumps(data, separators=(',', ':'))
-        data_bytes = data_str.encode('utf-8')
-        header = struct.pack("<II", op, len(data_bytes))
-        self._write(header)
-        self._write(data_bytes)
+        self._write(encode_frame(data, op))
 
-    def recv(self) -> (int, "JSON"):
+    def recv(self, deadline: float = None) -> (int, "JSON"):
         """Receives a packet from discord.
 
         Returns op code and payload.
         """
-        op, length = self._recv_header()
-        payload = self._recv_exactly(length)
-        data = json.loads(payload.decode('utf-8'))
-        logger.debug("received %s", data)
-        return op, data
+        decoder = self._decoder
+        while True:
+            frame = decoder.next_frame()
+            if frame is not None:
+                logger.debug("received %s", frame[1])
+                return frame
+            chunk = self._recv(decoder.bytes_needed(), deadline)
+            if not chunk:
+                raise EOFError("Connection closed while receiving a frame")
+            decoder.feed(chunk)
 
     def set_activity(self, act):
         data = {
             'cmd': 'SET_ACTIVITY',
             'args': {'pid': os.getpid(),
                      'activity': act},
-            'nonce': str(uuid.uuid4())
+            'nonce': make_nonce()
         }
         return self.send_recv(data)
 
@@ -148,7 +169,7 @@ class DiscordRpc(metaclass=ABCMeta):
         data = {
             'cmd': 'SET_ACTIVITY',
             'args': {'pid': os.getpid()},
-            'nonce': str(uuid.uuid4())
+            'nonce': make_nonce()
         }
         return self.send_recv(data)
 
@@ -175,7 +196,7 @@ class WinDiscordRpc(DiscordRpc):
         self._f.write(data)
         self._f.flush()
 
-    def _recv(self, size: int) -> bytes:
+    def _recv(self, size: int, deadline: float = None) -> bytes:
         return self._f.read(size)
 
     def _close(self):
@@ -215,8 +236,19 @@ class UnixDiscordRpc(DiscordRpc):
     def _write(self, data: bytes):
         self._sock.sendall(data)
 
-    def _recv(self, size: int) -> bytes:
-        return self._sock.recv(size)
+    def _recv(self, size: int, deadline: float = None) -> bytes:
+        if deadline is None:
+            return self._sock.recv(max(size, READ_CHUNK_SIZE))
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout("timed out")
+        self._sock.settimeout(remaining)
+        try:
+            # Read whatever is available; the decoder buffers the rest
+            return self._sock.recv(max(size, READ_CHUNK_SIZE))
+        finally:
+            # Writes stay blocking
+            self._sock.settimeout(None)
 
     def _close(self):
         self._sock.close()
@@ -8,40 +8,59 @@
 from abc import ABCMeta, abstractmethod
 import asyncio
 from functools import wraps
-import json
 import logging
 import os
 import sys
-import struct
-from typing import cast, Any, Dict, Generator, Tuple
-import uuid
+import time
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
 
-
-OP_HANDSHAKE = 0
-OP_FRAME = 1
-OP_CLOSE = 2
-OP_PING = 3
-OP_PONG = 4
+from .protocol import (
+    OP_HANDSHAKE, OP_FRAME, OP_CLOSE, OP_PING, OP_PONG,
+    FrameDecoder, encode_frame, make_nonce,
+)
+from .watch import SocketWatcher
 
 JSON = Dict[str, Any]
 Reply = Tuple[int, JSON]
+EventListener = Callable[[JSON], Any]
+RequestObserver = Callable[[str, float, Optional[str]], None]
 
-logger = logging.getLogger(__name__)
+READ_CHUNK_SIZE = 2**16
+# Seconds to wait for the reply to a request (including the handshake)
+DEFAULT_TIMEOUT = 10
 
-# Commonly thrown exceptions when connection is lost.
-# Must be a tuple to be used in `except`.
-exceptions = (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError)
+logger = logging.getLogger(__name__)
 
 
 class DiscordRpcError(Exception):
     pass
 
 
+class DiscordRpcTimeoutError(DiscordRpcError, TimeoutError):
+    """Discord didn't reply in time. The connection has been closed."""
+
+
+# Commonly thrown exceptions when connection is lost.
+# Must be a tuple to be used in `except`.
+exceptions = (ConnectionResetError, BrokenPipeError, asyncio.IncompleteReadError,
+              DiscordRpcTimeoutError)
+
+
 class AsyncDiscordRpc(metaclass=ABCMeta):
 
     """Work with an open Discord instance via its JSON IPC for its rich presence.
 
-    In a blocking way.
+    After the handshake,
+    a background task reads all incoming frames
+    and resolves the pending request with the matching nonce,
+    so multiple requests may be in flight at the same time.
+    DISPATCH events are passed to the listeners
+    registered with `add_event_listener`.
+
+    Requests that aren't answered within `timeout` seconds
+    raise `DiscordRpcTimeoutError` after closing the connection,
+    since a client that stopped answering can't be relied on anymore.
+
     Classmethod `for_platform`
     will resolve to UnixAsyncDiscordIpc.
     Windows hasn't been implemented.
@@ -50,9 +69,20 @@ class AsyncDiscordRpc(metaclass=ABCMeta):
     """
 
     def __init__(self, client_id: str, *,
-                 loop: asyncio.AbstractEventLoop = None) -> None:
+                 loop: asyncio.AbstractEventLoop = None,
+                 timeout: Optional[float] = DEFAULT_TIMEOUT) -> None:
         self.client_id = client_id
         self.loop = loop
+        self.timeout = timeout
+        self._reader_task: Optional[asyncio.Future] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._event_listeners: Dict[str, List[EventListener]] = {}
+        self._send_lock = asyncio.Lock()
+        self._decoder = FrameDecoder()
+        # Called with the command, the round-trip time in seconds
+        # and the error (exception name or Discord error code), if any,
+        # after every request following the handshake
+        self.request_observer: Optional[RequestObserver] = None
 
     @property
     @abstractmethod
@@ -60,29 +90,53 @@ class AsyncDiscordRpc(metaclass=ABCMeta):
         pass
 
     async def connect(self):
+        await self._stop_reader()
+        self._decoder = FrameDecoder()
         await self._connect()
-        await self._do_handshake()
+        try:
+            await asyncio.wait_for(self._do_handshake(), self.timeout)
+        except asyncio.TimeoutError:
+            await self._abort()
+            raise DiscordRpcTimeoutError(
+                f"No handshake reply within {self.timeout:g} seconds") from None
+        self._reader_task = asyncio.ensure_future(self._read_loop())
         # logger.debug("connected via ID %s", self.client_id)
 
     @classmethod
     def for_platform(cls, client_id: str, platform=sys.platform, *,
                      loop: asyncio.AbstractEventLoop = None,
+                     timeout: Optional[float] = DEFAULT_TIMEOUT,
                      ) -> 'AsyncDiscordRpc':
         if platform == 'win32':
             return NotImplemented  # async is a pain for windows pipes
         else:
-            return UnixAsyncDiscordRpc(client_id)
+            return UnixAsyncDiscordRpc(client_id, timeout=timeout)
 
     @abstractmethod
     async def _connect(self) -> None:
         pass
 
+    async def wait_for_server(self, delay: float) -> bool:
+        """Wait before attempting to connect again after connecting failed.
+
+        Waits for `delay` seconds by default.
+        Implementations that can detect the Discord client starting
+        may return earlier or wait longer.
+        Returns whether the client is likely available now.
+        """
+        await asyncio.sleep(delay)
+        return False
+
     async def _do_handshake(self) -> None:
         while True:
             ret_op, ret_data = await self.send_recv({'v': 1, 'client_id': self.client_id},
                                                     op=OP_HANDSHAKE)
             # {'cmd': 'DISPATCH', 'data': {'v': 1, 'config': {...}}, 'evt': 'READY', 'nonce': None}
-            if ret_op == OP_FRAME and ret_data['cmd'] == 'DISPATCH' and ret_data['evt'] == 'READY':
+            if (
+                ret_op == OP_FRAME
+                and ret_data.get('cmd') == 'DISPATCH'
+                and ret_data.get('evt') == 'READY'
+            ):
                 return
             else:
                 # No idea when or why this occurs; just try again.
@@ -99,25 +153,14 @@ class AsyncDiscordRpc(metaclass=ABCMeta):
 
     @abstractmethod
     async def _recv(self, size: int) -> bytes:
-        pass
+        """Receive at most `size` bytes, or at least some if the transport is buffered.
 
-    async def _recv_header(self) -> Tuple[int, int]:
-        header = await self._recv_exactly(8)
-        return cast(Tuple[int, int], struct.unpack("<II", header))
-
-    async def _recv_exactly(self, size: int) -> bytes:
-        buf = b""
-        size_remaining = size
-        while size_remaining:
-            chunk = await self._recv(size_remaining)
-            chunk_size = len(chunk)
-            if chunk_size == 0:
-                raise EOFError()
-            buf += chunk
-            size_remaining -= chunk_size
-        return buf
+        Returns an empty result at EOF.
+        """
+        pass
 
     async def close(self) -> None:
+        await self._stop_reader()
         if not self.connected:
             return
         logger.warning("closing connection")
@@ -130,6 +173,15 @@ class AsyncDiscordRpc(metaclass=ABCMeta):
     async def _close(self) -> None:
         pass
 
+    async def _abort(self) -> None:
+        """Close the connection without waiting for Discord."""
+        await self._stop_reader()
+        self._abort_transport()
+
+    @abstractmethod
+    def _abort_transport(self) -> None:
+        pass
+
     async def __aenter__(self) -> 'AsyncDiscordRpc':
         return self
 
@@ -137,41 +189,159 @@ class AsyncDiscordRpc(metaclass=ABCMeta):
         if self.connected:
             await self.close()
 
-    async def send_recv(self, data: JSON, *, op=OP_FRAME) -> Reply:
+    async def send_recv(self, data: JSON, *, op=OP_FRAME,
+                        timeout: Optional[float] = None) -> Reply:
+        """Send a request and return its reply.
+
+        Waits for at most `timeout` seconds (default: `self.timeout`)
+        once connected.
+        """
         nonce = data.get('nonce')
-        await self.send(data, op=op)
-        while True:
-            reply = await self.recv()
-            if reply[1].get('nonce') == nonce:
-                return reply
-            else:
-                logger.warning("received unexpected reply; %s", reply)
+        if self._reader_task is None:
+            # Still handshaking, so nobody else is reading
+            await self.send(data, op=op)
+            while True:
+                reply = await self.recv()
+                if reply[1].get('nonce') == nonce:
+                    return reply
+                else:
+                    logger.warning("received unexpected reply; %s", reply)
+
+        if self._reader_task.done():
+            # Raises the exception that terminated the reader, if any
+            self._reader_task.result()
+            raise ConnectionResetError("Connection to Discord has been closed")
+        if not nonce:
+            raise ValueError("Requests need a nonce to be matched with their reply")
+
+        if timeout is None:
+            timeout = self.timeout
+        observer = self.request_observer
+        if observer is None:
+            return await self._request(nonce, data, op, timeout)
+        start = time.perf_counter()
+        error = None
+        try:
+            reply = await self._request(nonce, data, op, timeout)
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        else:
+            if reply[1].get('evt') == 'ERROR':
+                error = str((reply[1].get('data') or {}).get('code', 'ERROR'))
+            return reply
+        finally:
+            observer(data.get('cmd', ""), time.perf_counter() - start, error)
+
+    async def _request(self, nonce: str, data: JSON, op: int, timeout: Optional[float],
+                       ) -> Reply:
+        future = asyncio.get_event_loop().create_future()
+        self._pending[nonce] = future
+        try:
+            await self.send(data, op=op)
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("No reply from Discord within %g seconds; closing connection",
+                           timeout)
+            # Also fails the other pending requests
+            await self._abort()
+            raise DiscordRpcTimeoutError(
+                f"No reply to {data.get('cmd')} within {timeout:g} seconds") from None
+        finally:
+            self._pending.pop(nonce, None)
 
     async def send(self, data: JSON, *, op=OP_FRAME) -> None:
         logger.debug("sending %s", data)
-        data_str = json.dumps(data, separators=(',', ':'))
-        data_bytes = data_str.encode('utf-8')
-        header = struct.pack("<II", op, len(data_bytes))
-        await self._write(header)
-        await self._write(data_bytes)
+        frame = encode_frame(data, op)
+        async with self._send_lock:
+            await self._write(frame)
+
+    def add_event_listener(self, event: str, listener: EventListener) -> None:
+        """Call `listener` with the payload of each DISPATCH frame for `event`.
+
+        Coroutine functions are scheduled as tasks.
+        """
+        self._event_listeners.setdefault(event, []).append(listener)
+
+    def remove_event_listener(self, event: str, listener: EventListener) -> None:
+        self._event_listeners.get(event, []).remove(listener)
+
+    async def _read_loop(self) -> None:
+        try:
+            while True:
+                op, data = await self.recv()
+                if op == OP_PING:
+                    await self.send(data, op=OP_PONG)
+                elif op == OP_CLOSE:
+                    logger.warning("Discord closed the connection; %s", data)
+                    raise ConnectionResetError(data.get('message', "Closed by Discord"))
+                elif data.get('nonce') in self._pending:
+                    future = self._pending.pop(data['nonce'])
+                    if not future.done():
+                        future.set_result((op, data))
+                elif data.get('cmd') == 'DISPATCH':
+                    self._dispatch_event(data)
+                else:
+                    logger.warning("received unexpected reply; %s", data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self._fail_pending(e)
+            raise
+        finally:
+            self._fail_pending(ConnectionResetError("Connection to Discord has been closed"))
+
+    def _dispatch_event(self, data: JSON) -> None:
+        for listener in list(self._event_listeners.get(data.get('evt'), ())):
+            try:
+                result = listener(data)
+                if asyncio.iscoroutine(result):
+                    asyncio.ensure_future(result)
+            except Exception:
+                logger.exception("Error in listener for event %r", data.get('evt'))
+
+    def _fail_pending(self, exc: BaseException) -> None:
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(exc)
+        self._pending.clear()
+
+    async def _stop_reader(self) -> None:
+        task, self._reader_task = self._reader_task, None
+        if not task:
+            return
+        if not task.done():
+            task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            pass  # already passed to the pending requests
 
     async def recv(self) -> Reply:
         """Receives a packet from discord.
 
         Returns op code and payload.
         """
-        op, length = await self._recv_header()
-        payload = await self._recv_exactly(length)
-        data = json.loads(payload.decode('utf-8'))
-        logger.debug("received %s", data)
-        return op, data
+        decoder = self._decoder
+        while True:
+            frame = decoder.next_frame()
+            if frame is not None:
+                logger.debug("received %s", frame[1])
+                return frame
+            needed = decoder.bytes_needed()
+            chunk = await self._recv(needed)
+            if not chunk:
+                raise asyncio.IncompleteReadError(b"", decoder.buffered + needed)
+            decoder.feed(chunk)
 
     async def set_activity(self, act: JSON) -> Reply:
         data = {
             'cmd': 'SET_ACTIVITY',
             'args': {'pid': os.getpid(),
                      'activity': act},
-            'nonce': str(uuid.uuid4())
+            'nonce': make_nonce()
         }
         return await self.send_recv(data)
 
@@ -179,7 +349,7 @@ class AsyncDiscordRpc(metaclass=ABCMeta):
         data = {
             'cmd': 'SET_ACTIVITY',
             'args': {'pid': os.getpid()},
-            'nonce': str(uuid.uuid4())
+            'nonce': make_nonce()
         }
         return await self.send_recv(data)
 
@@ -200,13 +370,23 @@ class UnixAsyncDiscordRpc(AsyncDiscordRpc):
     reader = None
     writer = None
 
+    def __init__(self, client_id: str, *, loop: asyncio.AbstractEventLoop = None,
+                 timeout: Optional[float] = DEFAULT_TIMEOUT,
+                 path: Optional[str] = None) -> None:
+        super().__init__(client_id, loop=loop, timeout=timeout)
+        # Only connect to this socket instead of the first one found
+        self.path = path
+
     @property
     def connected(self):
-        return self.reader and not self.reader.at_eof()
+        return (
+            self.reader and not self.reader.at_eof()
+            and (self._reader_task is None or not self._reader_task.done())
+        )
 
     async def _connect(self) -> None:
-
-        for path in self._iter_path_candidates():
+        paths = [self.path] if self.path else self._iter_path_candidates()
+        for path in paths:
             if not os.path.exists(path):
                 logger.debug("%r not found", path)
                 continue
@@ -221,37 +401,68 @@ class UnixAsyncDiscordRpc(AsyncDiscordRpc):
             raise DiscordRpcError("Failed to connect to a Discord pipe")
 
     @staticmethod
-    def _iter_path_candidates() -> Generator[str, None, None]:
+    def _get_base_path() -> str:
         env_keys = ('XDG_RUNTIME_DIR', 'TMPDIR', 'TMP', 'TEMP')
         for env_key in env_keys:
             base_path = os.environ.get(env_key)
             if base_path and base_path.endswith('snap.sublime-text'):
                 base_path = base_path[:-17]
             if base_path:
-                break
-        else:
-            base_path = "/tmp"
+                return base_path
+        return "/tmp"
+
+    @classmethod
+    def _iter_dir_candidates(cls) -> Generator[str, None, None]:
+        base_path = cls._get_base_path()
         sub_path_candidates = ("snap.discord", "app/com.discordapp.Discord", "")
         for sub_path in sub_path_candidates:
-            dir_path = os.path.join(base_path, sub_path)
+            yield os.path.join(base_path, sub_path)
+
+    @classmethod
+    def _iter_path_candidates(cls) -> Generator[str, None, None]:
+        for dir_path in cls._iter_dir_candidates():
             if os.path.exists(dir_path):
                 for i in range(10):
                     yield os.path.join(dir_path, "discord-ipc-{}".format(i))
 
+    @classmethod
+    def create_watcher(cls) -> Optional[SocketWatcher]:
+        """Return a watcher for the creation of Discord sockets, if supported."""
+        base_path = cls._get_base_path()
+        # Also watch the parents of the candidate directories
+        # to notice when they are created
+        directories = {base_path, os.path.join(base_path, "app")}
+        directories.update(cls._iter_dir_candidates())
+        return SocketWatcher.create(sorted(directories), "discord-ipc-*")
+
+    async def wait_for_server(self, delay: float) -> bool:
+        if any(map(os.path.exists, self._iter_path_candidates())):
+            # The socket exists, but the client didn't accept (yet)
+            return await super().wait_for_server(delay)
+
+        watcher = self.create_watcher()
+        if watcher is None:
+            return await super().wait_for_server(delay)
+        with watcher:
+            logger.debug("Waiting for a Discord socket to be created")
+            return await watcher.wait()
+
     @_disconnect_on_error
     async def _write(self, data: bytes) -> None:
         self.writer.write(data)
-        # await self.writer.drain()  # exception will be caught in _recv_exactly
+        # await self.writer.drain()  # exception will be caught in recv
 
     @_disconnect_on_error
     async def _recv(self, size: int) -> bytes:
-        return await self.reader.read(size)
-
-    @_disconnect_on_error
-    async def _recv_exactly(self, size: int) -> bytes:
-        return await self.reader.readexactly(size)
+        # Read whatever is available to save on wakeups; the decoder buffers the rest
+        return await self.reader.read(max(size, READ_CHUNK_SIZE))
 
     async def _close(self) -> None:
         self.reader.feed_eof()
         self.writer.write_eof()
         await self.writer.drain()
+
+    def _abort_transport(self) -> None:
+        if self.writer:
+            self.reader.feed_eof()
+            self.writer.transport.abort()
@@ -0,0 +1,227 @@
+"""Keep sessions with all running Discord clients.
+
+Users may run several clients side by side
+(like stable, PTB and Canary, or a native and a Flatpak client),
+each listening on its own `discord-ipc-N` socket.
+`AsyncDiscordRpcPool` connects to every socket it finds
+and sends each request to all of them concurrently.
+
+Sessions fail independently:
+a session that fails (or doesn't answer in time) is reconnected in the background
+(and shown the last activity again)
+while the others keep being served.
+Only when no session is left do requests fail with a connection error.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from .async_ import (DEFAULT_TIMEOUT, AsyncDiscordRpc, DiscordRpcError, JSON, Reply,
+                     RequestObserver, UnixAsyncDiscordRpc, exceptions)
+from .watch import SocketWatcher
+
+logger = logging.getLogger(__name__)
+
+Request = Callable[[UnixAsyncDiscordRpc], Awaitable[Reply]]
+
+# Keeps a client that drops connections right away from keeping us busy
+MIN_RECONNECT_INTERVAL = 1
+
+
+class AsyncDiscordRpcPool:
+
+    """Sends requests to all Discord clients.
+
+    Provides the parts of the `AsyncDiscordRpc` interface
+    for showing an activity.
+    Requests return the reply of the first session.
+
+    Sockets that can't be connected to are retried
+    after `rescan_interval` seconds
+    or as soon as they are replaced (where supported).
+    Each session waits for at most `timeout` seconds for a reply,
+    so a stalled client delays the others by no more than that.
+
+    Supports asynchronous context handler protocol.
+    """
+
+    def __init__(self, client_id: str, *, rescan_interval: float = 60,
+                 timeout: Optional[float] = DEFAULT_TIMEOUT) -> None:
+        self.client_id = client_id
+        self.rescan_interval = rescan_interval
+        self.timeout = timeout
+        self.request_observer: Optional[RequestObserver] = None
+        # Maps the resolved socket paths to their sessions.
+        # Symlinked sockets (e.g. to a Flatpak client's) resolve to the same session.
+        self.sessions: Dict[str, UnixAsyncDiscordRpc] = {}
+        # Maps socket paths that failed to connect since the last rescan
+        # to the identity of the socket file, to notice when it is replaced
+        self._failed: Dict[str, Optional[Tuple[int, int]]] = {}
+        self._last_request: Optional[Request] = None
+        self._connect_lock = asyncio.Lock()
+        self._dropped = asyncio.Event()
+        self._maintainer: Optional[asyncio.Future] = None
+
+    @property
+    def connected(self) -> bool:
+        return any(session.connected for session in self.sessions.values())
+
+    async def connect(self) -> None:
+        """Connect to all clients. Raises `DiscordRpcError` if there are none."""
+        self._failed.clear()
+        await self._connect_new()
+        if not self.connected:
+            raise DiscordRpcError("Failed to connect to a Discord pipe")
+        if not self._maintainer:
+            self._maintainer = asyncio.ensure_future(self._maintain())
+
+    async def wait_for_server(self, delay: float) -> bool:
+        return await UnixAsyncDiscordRpc(self.client_id).wait_for_server(delay)
+
+    async def close(self) -> None:
+        maintainer, self._maintainer = self._maintainer, None
+        if maintainer:
+            maintainer.cancel()
+            try:
+                await maintainer
+            except asyncio.CancelledError:
+                pass
+        sessions = list(self.sessions.values())
+        self.sessions.clear()
+        # Also stops the readers of lost sessions
+        await asyncio.gather(*(session.close() for session in sessions),
+                             return_exceptions=True)
+
+    async def __aenter__(self) -> 'AsyncDiscordRpcPool':
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        await self.close()
+
+    async def set_activity(self, act: JSON) -> Reply:
+        return await self._broadcast(lambda session: session.set_activity(act))
+
+    async def clear_activity(self) -> Reply:
+        return await self._broadcast(lambda session: session.clear_activity())
+
+    async def _broadcast(self, request: Request) -> Reply:
+        # Remembered for sessions that connect later
+        self._last_request = request
+        sessions = [(path, session) for path, session in self.sessions.items()
+                    if session.connected]
+        if not sessions:
+            raise ConnectionResetError("Not connected to any Discord client")
+
+        results = await asyncio.gather(*(request(session) for _, session in sessions),
+                                       return_exceptions=True)
+        reply: Optional[Reply] = None
+        error: Optional[BaseException] = None
+        for (path, _), result in zip(sessions, results):
+            if isinstance(result, exceptions):
+                logger.info(f"Connection to Discord client at {path!r} lost")
+                error = result
+                self._dropped.set()
+            elif isinstance(result, BaseException):
+                raise result
+            elif reply is None:
+                reply = result
+        if reply is None:
+            raise error  # type: ignore
+        return reply
+
+    def _live_paths(self) -> List[str]:
+        paths: Dict[str, None] = {}  # ordered set
+        for path in UnixAsyncDiscordRpc._iter_path_candidates():
+            if os.path.exists(path):
+                paths[os.path.realpath(path)] = None
+        return list(paths)
+
+    @staticmethod
+    def _file_id(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_ctime_ns
+
+    def _is_known(self, path: str) -> bool:
+        path = os.path.realpath(path)
+        session = self.sessions.get(path)
+        if session and session.connected:
+            return True
+        return path in self._failed and self._failed[path] == self._file_id(path)
+
+    async def _connect_new(self, *, replay: bool = False) -> None:
+        """Connect to the sockets without a session.
+
+        Shows the last activity in the new sessions if `replay` is set.
+        """
+        async with self._connect_lock:
+            live_paths = self._live_paths()
+            # Forget the sessions of clients that quit
+            for path, session in list(self.sessions.items()):
+                if path not in live_paths and not session.connected:
+                    del self.sessions[path]
+                    await session.close()
+
+            paths = [path for path in live_paths if not self._is_known(path)]
+            if paths:
+                await asyncio.gather(*(self._connect_session(path, replay) for path in paths))
+
+    async def _connect_session(self, path: str, replay: bool) -> None:
+        session = self.sessions.get(path)
+        if not session:
+            session = self.sessions[path] = UnixAsyncDiscordRpc(
+                self.client_id, timeout=self.timeout, path=path)
+        session.request_observer = self.request_observer
+        try:
+            await session.connect()
+            # Notice when the client closes the connection
+            session._reader_task.add_done_callback(  # type: ignore
+                lambda _: self._dropped.set())
+            if replay and self._last_request:
+                await self._last_request(session)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.debug(f"Failed to connect to Discord client at {path!r}: {e!r}")
+            self._failed[path] = self._file_id(path)
+            return
+        self._failed.pop(path, None)
+        logger.info(f"Connected to Discord client at {path!r}")
+
+    async def _maintain(self) -> None:
+        """Connect to clients that start later and reconnect lost sessions."""
+        watcher = UnixAsyncDiscordRpc.create_watcher()
+        loop = asyncio.get_event_loop()
+        try:
+            while True:
+                await self._wait_for_change(watcher)
+                started = loop.time()
+                await self._connect_new(replay=True)
+                await asyncio.sleep(MIN_RECONNECT_INTERVAL - (loop.time() - started))
+        finally:
+            if watcher:
+                watcher.close()
+
+    async def _wait_for_change(self, watcher: Optional[SocketWatcher]) -> None:
+        waiters = [asyncio.ensure_future(self._dropped.wait())]
+        if watcher:
+            waiters.append(asyncio.ensure_future(watcher.wait(ignore=self._is_known)))
+        try:
+            done, _ = await asyncio.wait(waiters, timeout=self.rescan_interval,
+                                         return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+            await asyncio.wait(waiters)
+        self._dropped.clear()
+        if not done:
+            # Retry the sockets that failed before
+            self._failed.clear()
+
+
+# Either a single client or the pool
+AnyAsyncDiscordRpc = Union[AsyncDiscordRpc, AsyncDiscordRpcPool]
@@ -0,0 +1,110 @@
+"""Sans-IO implementation of Discord's IPC framing.
+
+Each frame consists of a header with the op code and the payload length
+(two little-endian unsigned 32-bit integers)
+followed by the JSON-encoded payload.
+Used by both the blocking and the asynchronous client.
+"""
+
+import json
+import os
+import struct
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+OP_HANDSHAKE = 0
+OP_FRAME = 1
+OP_CLOSE = 2
+OP_PING = 3
+OP_PONG = 4
+
+HEADER = struct.Struct("<II")
+
+JSON = Dict[str, Any]
+Frame = Tuple[int, JSON]
+
+
+def make_nonce() -> str:
+    """Return a random nonce for matching a request with its reply.
+
+    As unique as a UUID4, but without importing `uuid` (and `platform`).
+    """
+    return os.urandom(16).hex()
+
+
+def encode_frame(data: JSON, op: int = OP_FRAME) -> bytes:
+    """Encode a frame into a single buffer so it can be sent with a single write."""
+    payload = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    return HEADER.pack(op, len(payload)) + payload
+
+
+class FrameDecoder:
+
+    """Incrementally decodes frames from a stream of bytes.
+
+    Feed received data with `feed`
+    and retrieve complete frames with `next_frame` or by iterating.
+    `bytes_needed` tells how many more bytes are required for the next frame.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = bytearray()
+        self._offset = 0  # start of unconsumed data
+        self._header: Optional[Tuple[int, int]] = None
+
+    def feed(self, data: bytes) -> None:
+        self._compact()
+        self._buffer += data
+
+    def bytes_needed(self) -> int:
+        """Number of bytes missing to complete the next frame (as far as known)."""
+        available = self.buffered
+        if self._header is not None:
+            return max(self._header[1] - available, 0)
+        elif available < HEADER.size:
+            return HEADER.size - available
+        else:
+            _op, length = HEADER.unpack_from(self._buffer, self._offset)
+            return max(HEADER.size + length - available, 0)
+
+    @property
+    def buffered(self) -> int:
+        """Number of bytes received but not yet decoded."""
+        return len(self._buffer) - self._offset
+
+    def next_frame(self) -> Optional[Frame]:
+        """Return the next complete frame or None if more data is needed."""
+        buffer = self._buffer
+        if self._header is None:
+            if len(buffer) - self._offset < HEADER.size:
+                return None
+            self._header = HEADER.unpack_from(buffer, self._offset)
+            self._offset += HEADER.size
+
+        op, length = self._header
+        start = self._offset
+        if len(buffer) - start < length:
+            return None
+
+        with memoryview(buffer) as view:
+            payload = str(view[start:start + length], 'utf-8')
+        self._offset = start + length
+        self._header = None
+        return op, json.loads(payload)
+
+    def __iter__(self) -> Iterator[Frame]:
+        while True:
+            frame = self.next_frame()
+            if frame is None:
+                return
+            yield frame
+
+    def _compact(self) -> None:
+        # Drop consumed data before appending new data,
+        # but only once it makes up most of the buffer
+        # so that we don't move the remainder around all the time.
+        if self._offset == len(self._buffer):
+            self._buffer.clear()
+            self._offset = 0
+        elif self._offset > len(self._buffer) // 2:
+            del self._buffer[:self._offset]
+            self._offset = 0
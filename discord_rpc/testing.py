@@ -0,0 +1,260 @@
+"""A fake Discord client for exercising the RPC clients without Discord.
+
+`FakeDiscordServer` listens on a `discord-ipc-N` socket
+and speaks enough of the IPC protocol
+(handshake, ping, SET_ACTIVITY and close)
+for the clients in this package.
+Faults like latency, disconnects, fragmented frames, rate limit errors
+and the sporadic handshake error of the real client
+can be injected through `Faults`, also while running.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Coroutine, Dict, List, Optional, Set
+
+from .protocol import (
+    OP_HANDSHAKE, OP_FRAME, OP_CLOSE, OP_PING, OP_PONG, JSON,
+    FrameDecoder, encode_frame,
+)
+
+logger = logging.getLogger(__name__)
+
+# The error the real client sometimes responds to handshakes with
+HANDSHAKE_ERROR = {'message': "Cannot read property 'id' of undefined"}
+RATE_LIMIT_ERROR_CODE = 4000
+
+
+class Faults:
+
+    """Faults to inject. Changes take effect for the next frames."""
+
+    def __init__(
+        self,
+        *,
+        latency: float = 0,
+        handshake_errors: int = 0,
+        reject_handshake: bool = False,
+        disconnect_after: Optional[int] = None,
+        stall_after: Optional[int] = None,
+        fragment_size: Optional[int] = None,
+        rate_limit: Optional[int] = None,
+        rate_limit_period: float = 20,
+    ) -> None:
+        # Seconds to wait before answering a request
+        self.latency = latency
+        # Number of handshakes to answer with `HANDSHAKE_ERROR`
+        self.handshake_errors = handshake_errors
+        # Answer handshakes by closing the connection
+        self.reject_handshake = reject_handshake
+        # Drop connections after receiving this many frames following the handshake
+        self.disconnect_after = disconnect_after
+        # Keep reading but stop answering after this many frames following the handshake
+        # (0 to not even answer the handshake)
+        self.stall_after = stall_after
+        # Send frames in chunks of this size, yielding to the event loop in between
+        self.fragment_size = fragment_size
+        # Answer SET_ACTIVITY with an error when exceeding this many per period
+        self.rate_limit = rate_limit
+        self.rate_limit_period = rate_limit_period
+
+
+class FakeDiscordServer:
+
+    """Serves the Discord IPC protocol on `<directory>/discord-ipc-<index>`.
+
+    Records the received activities in `activities`
+    (`None` for cleared activities)
+    and counts connections and received frames.
+    """
+
+    def __init__(self, directory: str, index: int = 0, *,
+                 faults: Optional[Faults] = None) -> None:
+        self.path = os.path.join(directory, f"discord-ipc-{index}")
+        self.faults = faults or Faults()
+        self.activities: List[Optional[JSON]] = []
+        self.connections = 0
+        self.frames_received = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        # Maps connections to locks that keep fragmented frames from interleaving
+        self._writers: Dict[asyncio.StreamWriter, asyncio.Lock] = {}
+        self._activity_times: List[float] = []
+        self._tasks: Set[asyncio.Future] = set()
+        self._connected = asyncio.Event()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_unix_server(
+            lambda reader, writer: self._spawn(self._handle(reader, writer)),
+            self.path,
+        )
+
+    async def close(self) -> None:
+        """Stop listening, remove the socket and drop all connections."""
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+        self.disconnect_all()
+        # Let the connection handlers and pending replies finish
+        if self._tasks:
+            await asyncio.wait(self._tasks)
+
+    def disconnect_all(self) -> None:
+        """Drop all connections without a close frame, like a crashing client."""
+        for writer in list(self._writers):
+            writer.transport.abort()
+        self._writers.clear()
+
+    async def wait_for_connection(self) -> None:
+        """Wait until a client completed the handshake."""
+        await self._connected.wait()
+        self._connected.clear()
+
+    async def __aenter__(self) -> 'FakeDiscordServer':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        await self.close()
+
+    def _spawn(self, coro: Coroutine) -> None:
+        task = asyncio.ensure_future(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, writer: asyncio.StreamWriter, data: Any, op: int = OP_FRAME) -> None:
+        frame = encode_frame(data, op)
+        size = self.faults.fragment_size
+        if not size:
+            writer.write(frame)
+            return
+        async with self._writers[writer]:
+            for start in range(0, len(frame), size):
+                writer.write(frame[start:start + size])
+                await writer.drain()
+                await asyncio.sleep(0)
+
+    async def _recv(self, reader: asyncio.StreamReader, decoder: FrameDecoder) -> Any:
+        while True:
+            frame = decoder.next_frame()
+            if frame is not None:
+                return frame
+            chunk = await reader.read(2**16)
+            if not chunk:
+                return None
+            decoder.feed(chunk)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self._writers[writer] = asyncio.Lock()
+        decoder = FrameDecoder()
+        try:
+            if await self._handshake(reader, writer, decoder):
+                self.connections += 1
+                self._connected.set()
+                await self._serve(reader, writer, decoder)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.pop(writer, None)
+            writer.close()
+
+    async def _handshake(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                         decoder: FrameDecoder) -> bool:
+        while True:
+            frame = await self._recv(reader, decoder)
+            if frame is None:
+                return False
+            op, data = frame
+            if op != OP_HANDSHAKE:
+                await self._send(writer, {'code': 4000, 'message': "Expected handshake"}, OP_CLOSE)
+                return False
+            if self.faults.reject_handshake:
+                await self._send(writer, {'code': 4000, 'message': "Invalid client ID"}, OP_CLOSE)
+                return False
+            if self.faults.handshake_errors > 0:
+                self.faults.handshake_errors -= 1
+                await self._send(writer, HANDSHAKE_ERROR)
+                continue
+            if self.faults.stall_after == 0:
+                await self._drain(reader, decoder)
+                return False
+            if self.faults.latency:
+                await asyncio.sleep(self.faults.latency)
+            await self._send(writer, {
+                'cmd': 'DISPATCH',
+                'data': {'v': 1, 'config': {'cdn_host': "cdn.discordapp.com"},
+                         'user': {'id': "0", 'username': "fake"}},
+                'evt': 'READY',
+                'nonce': None,
+            })
+            return True
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                     decoder: FrameDecoder) -> None:
+        frames = 0
+        while True:
+            frame = await self._recv(reader, decoder)
+            if frame is None:
+                return
+            op, data = frame
+            self.frames_received += 1
+            frames += 1
+            if self.faults.disconnect_after is not None and frames > self.faults.disconnect_after:
+                writer.transport.abort()
+                return
+            if self.faults.stall_after is not None and frames > self.faults.stall_after:
+                await self._drain(reader, decoder)
+                return
+
+            if op == OP_PING:
+                await self._send(writer, data, OP_PONG)
+            elif op == OP_CLOSE:
+                return
+            elif op == OP_FRAME:
+                # Answer concurrently so that latency doesn't serialize requests
+                self._spawn(self._reply(writer, data))
+
+    async def _drain(self, reader: asyncio.StreamReader, decoder: FrameDecoder) -> None:
+        """Read frames without answering them until the connection is closed."""
+        while await self._recv(reader, decoder) is not None:
+            self.frames_received += 1
+
+    async def _reply(self, writer: asyncio.StreamWriter, data: JSON) -> None:
+        if self.faults.latency:
+            await asyncio.sleep(self.faults.latency)
+        if writer not in self._writers:
+            return
+        reply = {'cmd': data.get('cmd'), 'evt': None, 'nonce': data.get('nonce')}
+        if data.get('cmd') == 'SET_ACTIVITY':
+            if self._rate_limited():
+                reply['evt'] = 'ERROR'
+                reply['data'] = {'code': RATE_LIMIT_ERROR_CODE,
+                                 'message': "You are being rate limited."}
+            else:
+                activity = data.get('args', {}).get('activity')
+                self.activities.append(activity)
+                reply['data'] = activity
+        else:
+            reply['evt'] = 'ERROR'
+            reply['data'] = {'code': 4000, 'message': f"Unknown command {data.get('cmd')!r}"}
+        try:
+            await self._send(writer, reply)
+        except ConnectionError:
+            pass
+
+    def _rate_limited(self) -> bool:
+        if self.faults.rate_limit is None:
+            return False
+        now = time.monotonic()
+        cutoff = now - self.faults.rate_limit_period
+        self._activity_times = [t for t in self._activity_times if t > cutoff]
+        if len(self._activity_times) >= self.faults.rate_limit:
+            return True
+        self._activity_times.append(now)
+        return False
@@ -0,0 +1,193 @@
+"""Waiting for the Discord client to become available.
+
+On Linux, the directories that may contain Discord's IPC socket
+are watched with inotify,
+so that we can connect as soon as the socket is created
+without waking up periodically while Discord is not running.
+Elsewhere, or when inotify is not usable,
+the caller falls back to exponential backoff.
+"""
+
+import asyncio
+import ctypes
+import fnmatch
+import logging
+import os
+import random
+import struct
+import sys
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+IN_ATTRIB = 0x00000004
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+
+EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+READ_SIZE = 4096
+
+_libc = None
+
+
+class Backoff:
+
+    """Exponentially growing delays with random jitter.
+
+    Jitter keeps multiple clients from retrying in lockstep.
+    """
+
+    def __init__(self, initial: float, maximum: float, *,
+                 factor: float = 2, jitter: float = 0.25) -> None:
+        self.initial = initial
+        self.maximum = max(initial, maximum)
+        self.factor = factor
+        self.jitter = jitter
+        self.attempts = 0
+
+    def next_delay(self) -> float:
+        delay = min(self.initial * self.factor ** self.attempts, self.maximum)
+        if delay < self.maximum:
+            self.attempts += 1
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def reset(self) -> None:
+        self.attempts = 0
+
+
+def _get_libc() -> ctypes.CDLL:
+    global _libc
+    if _libc is None:
+        # Only needed while Discord isn't running (it imports `subprocess`)
+        import ctypes.util
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        _libc = libc
+    return _libc
+
+
+class SocketWatcher:
+
+    """Waits for a file matching `pattern` to appear in any of `directories`.
+
+    Directories that don't exist yet are picked up
+    when they are created inside one of the other watched directories.
+    Use `create` to get an instance,
+    which returns `None` if inotify is not available.
+    """
+
+    def __init__(self, fd: int, directories: Iterable[str], pattern: str) -> None:
+        self._fd = fd
+        self.directories = list(directories)
+        self.pattern = pattern
+        self._event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._ignore: Optional[Callable[[str], bool]] = None
+
+    @classmethod
+    def create(cls, directories: Iterable[str], pattern: str) -> Optional['SocketWatcher']:
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            libc = _get_libc()
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            logger.debug("inotify not available: %s", e)
+            return None
+        if fd < 0:
+            logger.debug("inotify_init1 failed: %s", os.strerror(ctypes.get_errno()))
+            return None
+        return cls(fd, directories, pattern)
+
+    def _add_watches(self) -> None:
+        # Adding a watch for an already watched directory is a no-op
+        mask = IN_CREATE | IN_MOVED_TO | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+        for directory in self.directories:
+            # Fails for directories that don't exist (yet), which is fine
+            _get_libc().inotify_add_watch(self._fd, os.fsencode(directory), mask)
+
+    def _matches(self) -> bool:
+        for directory in self.directories:
+            try:
+                names = os.listdir(directory)
+            except OSError:
+                continue
+            for name in fnmatch.filter(names, self.pattern):
+                if not (self._ignore and self._ignore(os.path.join(directory, name))):
+                    return True
+        return False
+
+    def _on_readable(self) -> None:
+        rearm = False
+        found = False
+        while True:
+            try:
+                data = os.read(self._fd, READ_SIZE)
+            except BlockingIOError:
+                break
+            if not data:
+                break
+            offset = 0
+            while offset < len(data):
+                _wd, mask, _cookie, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+                if mask & (IN_Q_OVERFLOW | IN_IGNORED):
+                    rearm = True
+                elif mask & IN_ISDIR:
+                    # A candidate directory may just have been created
+                    rearm = True
+                elif fnmatch.fnmatch(os.fsdecode(name), self.pattern):
+                    found = True
+
+        if rearm:
+            self._add_watches()
+        if rearm or (found and self._ignore):
+            # Look for files in new directories or files that aren't ignored
+            # (events only carry the file name)
+            found = (found and not self._ignore) or self._matches()
+        if found and self._event:
+            self._event.set()
+
+    async def wait(self, timeout: Optional[float] = None, *,
+                   ignore: Optional[Callable[[str], bool]] = None) -> bool:
+        """Wait until a matching file exists.
+
+        Files whose path `ignore` returns True for are not considered.
+        Returns immediately if one already exists
+        and `False` if `timeout` expired.
+        """
+        self._loop = asyncio.get_event_loop()
+        self._event = asyncio.Event()
+        self._ignore = ignore
+        self._add_watches()
+        # Check only after watching to not miss files created in between
+        if self._matches():
+            return True
+        self._loop.add_reader(self._fd, self._on_readable)
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._loop.remove_reader(self._fd)
+        return True
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __enter__(self) -> 'SocketWatcher':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
@@ -1,17 +1,27 @@
 import asyncio
+import itertools
 import logging
-import re
 import sys
 import time
-from textwrap import shorten
-from typing import Any, DefaultDict, Dict, Iterable, List, Optional, Union
+from typing import (TYPE_CHECKING, Any, Awaitable, Callable, Dict, Iterator, List, Mapping,
+                    Optional, Sequence, Tuple, Union)
 
-from ampris2 import Mpris2Dbussy, PlaybackStatus, PlayerInterfaces as Player, unwrap_metadata
+from ampris2 import (CircuitState, Mpris2Dbussy, PlaybackStatus, PlayerInterfaces as Player,
+                     PlayerSnapshot)
 import dbussy
 from discord_rpc.async_ import (AsyncDiscordRpc, DiscordRpcError, JSON,
                                 exceptions as async_exceptions)
+from discord_rpc.pool import AnyAsyncDiscordRpc, AsyncDiscordRpcPool
+from discord_rpc.watch import Backoff
 
-from .config import Config
+from .artwork import ArtResolver
+from .config import Config, ConfigError, ConfigWatcher, PlayerOptions
+from .profiling import SignalProfiler
+from .scheduler import ActivityScheduler, AdaptiveInterval
+from .template import Template
+
+if TYPE_CHECKING:
+    from .metrics import Metrics
 
 CLIENT_ID = '435587535150907392'
 PLAYER_ICONS = {
@@ -45,56 +55,118 @@ STATE_PRIORITY = [
 # Maximum allowed characters of Rich Presence's "details" field
 DETAILS_MAX_CHARS = 128
 
-# Relative weight for shortening when details exceeds max length
-weigth_map: Dict[str, int] = DefaultDict(
-    lambda: 1,
-    title=4,
-    xesam_title=4,
-    artist=2,
-    album=2,
-    xesam_album=2,
-)
+
+class _NullTimer:
+
+    def __enter__(self) -> '_NullTimer':
+        return self
+
+    def __exit__(self, *_) -> None:
+        pass
+
+
+# Used in place of a `metrics.Timer` when metrics are disabled
+NULL_TIMER: Any = _NullTimer()
 
 
 class DiscordMpris:
 
     active_player: Optional[Player] = None
+    active_state: Optional[PlaybackStatus] = None
+    # The snapshot the current activity was built from
+    active_snapshot: Optional[PlayerSnapshot] = None
     last_activity: Optional[JSON] = None
+    last_activity_key: Optional[Tuple[Any, ...]] = None
+    config_watcher: Optional[ConfigWatcher] = None
+    metrics: Optional['Metrics'] = None
+    art: Optional[ArtResolver] = None
 
-    def __init__(self, mpris: Mpris2Dbussy, discord: AsyncDiscordRpc, config: Config,
+    def __init__(self, mpris: Mpris2Dbussy, discord: AnyAsyncDiscordRpc, config: Config,
                  ) -> None:
         self.mpris = mpris
         self.discord = discord
         self.config = config
+        # Set to tick early, e.g. when art was resolved
+        # or sending a held back activity update failed
+        self.wakeup = asyncio.Event()
+        self.scheduler = ActivityScheduler(
+            discord,
+            rate=config.raw_get('global.rate_limit_updates', 5),
+            period=config.raw_get('global.rate_limit_period', 20),
+            on_error=self.wakeup.set,
+        )
+        self.poll_interval = self._make_poll_interval(config)
+
+    @staticmethod
+    def _make_poll_interval(config: Config) -> AdaptiveInterval:
+        return AdaptiveInterval(
+            config.raw_get('global.poll_interval_min', 1),
+            config.raw_get('global.poll_interval', 5),
+            config.raw_get('global.poll_interval_idle', 30),
+        )
 
     async def connect_discord(self) -> None:
         if self.discord.connected:
             return
         logger.debug("Trying to connect to Discord client...")
+        backoff = Backoff(self.config.raw_get('global.reconnect_wait', 1),
+                          self.config.raw_get('global.reconnect_wait_max', 60))
         while True:
             try:
                 await self.discord.connect()
             except DiscordRpcError:
                 logger.debug("Failed to connect to Discord client")
+                self._count_connection('failed')
             except async_exceptions:
                 logger.debug("Connection to Discord lost")
+                self._count_connection('failed')
             else:
                 logger.info("Connected to Discord client")
+                self._count_connection('established')
+                # The new connection doesn't show anything yet
+                self.scheduler.reset()
+                self.last_activity = None
                 return
-            await asyncio.sleep(self.config.raw_get('global.reconnect_wait', 1))
+            if await self.discord.wait_for_server(backoff.next_delay()):
+                backoff.reset()
+
+    def _count_connection(self, result: str) -> None:
+        if self.metrics:
+            self.metrics.discord_connections.inc(result)
+
+    def _timer(self, phase: str) -> Any:
+        """Return a context manager that measures the duration of a tick phase."""
+        if self.metrics is None:
+            return NULL_TIMER
+        return self.metrics.tick_seconds.time(phase)
 
     async def run(self) -> int:
-        await self.connect_discord()
+        if self.config.raw_get('global.listen_signals', True):
+            self.mpris.start_listening()
+        # Discover the players while waiting for Discord
+        await asyncio.gather(self.connect_discord(), self.discover_players())
 
         while True:
+            if self.config_watcher:
+                await self.reload_config()
+
+            previous = self._change_key()
             try:
-                await self.tick()
+                with self._timer('total'):
+                    await self.tick()
 
             except async_exceptions as e:
                 if logger.isEnabledFor(logging.DEBUG):
                     logger.debug("Connection error during tick", exc_info=e)
                 logger.info("Connection to Discord client lost. Reconnecting...")
+                # Whatever we sent last may not have arrived
+                self.scheduler.reset()
+                self.last_activity = None
                 await self.connect_discord()
+                # Show the activity again soon,
+                # without spinning if the new connection fails right away
+                await asyncio.sleep(self.config.raw_get('global.reconnect_wait', 1))
+                continue
 
             except dbussy.DBusError as e:
                 if e.name == "org.freedesktop.DBus.Error.ServiceUnknown":
@@ -103,136 +175,274 @@ class DiscordMpris:
                 logger.exception("Unknown DBusError encountered during tick", exc_info=e)
                 return 1  # TODO for now, this is unrecoverable
 
-            await asyncio.sleep(self.config.raw_get('global.poll_interval', 5))
+            if self.mpris.listening:
+                # Still poll occasionally, in case a player doesn't emit signals properly
+                await self._wait(self.mpris.wait_for_change(
+                    self.config.raw_get('global.signal_poll_interval', 30)))
+            else:
+                changed = self._change_key() != previous
+                idle = self.active_state != PlaybackStatus.PLAYING
+                await self._wait(asyncio.sleep(self.poll_interval.next_interval(changed, idle)))
+
+    async def _wait(self, aw: Awaitable[Any]) -> None:
+        """Wait for `aw` or until woken up."""
+        waiter = asyncio.ensure_future(aw)
+        wakeup = asyncio.ensure_future(self.wakeup.wait())
+        try:
+            await asyncio.wait([waiter, wakeup], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+            wakeup.cancel()
+        self.wakeup.clear()
+
+    def _change_key(self) -> Tuple[Any, ...]:
+        # The position advances while playing without anything happening,
+        # so it doesn't count as a change for the poll interval
+        activity_key = self.last_activity_key and self.last_activity_key[:-1]
+        return self.active_player, activity_key
+
+    async def discover_players(self) -> None:
+        """Introspect the players ahead of the first tick.
+
+        When listening to signals,
+        their state is fetched as well, so the first tick needs no calls.
+        """
+        try:
+            players = await self.mpris.get_players()
+            if self.mpris.listening:
+                await self.group_players(players)
+        except dbussy.DBusError as e:
+            # Retried by the first tick
+            logger.debug("Failed to discover players", exc_info=e)
+
+    async def reload_config(self) -> None:
+        new_config = await self.config_watcher.check()
+        if new_config:
+            # Connections and caches are kept;
+            # only settings that are read when needed take effect.
+            configure_logging(new_config)
+            self.config = new_config
+            self.poll_interval = self._make_poll_interval(new_config)
+            self.mpris.max_state_age = new_config.raw_get('global.signal_poll_interval', 30)
+            self.mpris.response_budget = new_config.raw_get('global.player_budget', 0.5) or None
+            if new_config.raw_get('global.listen_signals', True):
+                self.mpris.start_listening()
+            else:
+                self.mpris.stop_listening()
 
     async def tick(self) -> None:
-        player = await self.find_active_player()
-        if not player:
+        # The activity we last sent may not have made it
+        # and would otherwise only be retried once it changes
+        self.scheduler.check()
+        snapshot = await self.find_active_player()
+        if not snapshot:
             if self.active_player:
                 logger.info(f"Player {self.active_player.bus_name!r} unselected")
             if self.last_activity:
-                await self.discord.clear_activity()
+                with self._timer('update'):
+                    await self.scheduler.update(None)
                 self.last_activity = None
             self.active_player = None
+            self.active_state = None
+            self.active_snapshot = None
+            return
+        if snapshot is self.active_snapshot:
+            # The active player is late; keep showing what it reported last
             return
+        self.active_snapshot = snapshot
+        player = snapshot.player
         # store for future prioritization
         if not self.active_player or self.active_player.bus_name != player.bus_name:
             logger.info(f"Selected player bus {player.bus_name!r}")
         self.active_player = player
 
-        activity: JSON = {}
-        metadata, state = \
-            await asyncio.gather(
-                player.player.Metadata,  # type: ignore
-                player.player.PlaybackStatus,  # type: ignore
-            )
+        metadata = snapshot.metadata
+        state = self.active_state = snapshot.playback_status
         # Some players (like Firefox) don't support the required Position property
-        position: Optional[Union[int, float]]
-        try:
-            position = await player.player.Position  # type: ignore
-        except dbussy.DBusError as e:
-            position = None
-            logger.debug("Failed to retrieve position", exc_info=e)
-        metadata = unwrap_metadata(metadata)
+        position = snapshot.position
+        options = self.config.player_options(player)
+        start_time = None
+        if state == PlaybackStatus.PLAYING and position is not None:
+            start_time = int(time.time() - position / 1e6)
+            # The position is a little old when we get it,
+            # so keep the previous start time if it only moved across a second boundary
+            last_start_time = self.last_activity_key and self.last_activity_key[4]
+            if last_start_time and abs(start_time - last_start_time) <= 1:
+                start_time = last_start_time
+
+        art_url = self.art.lookup(metadata) if self.art and options.show_art else None
+
+        # Only rebuild the activity if anything it is built from changed.
+        # The metadata object is reused while the player's metadata doesn't change,
+        # so comparing it is usually an identity check.
+        activity_key = (player.name, state, options, metadata, start_time, art_url,
+                        self._position_key(player, metadata, state, position, options))
+        if self.last_activity and activity_key == self.last_activity_key:
+            logger.debug("Not sending activity because it didn't change")
+            return
+        self.last_activity_key = activity_key
+
         logger.debug(f"Metadata: {metadata}")
-        length = metadata.get('mpris:length', 0)
+        with self._timer('build_activity'):
+            activity = self.build_activity(player, metadata, state, position, start_time,
+                                           options, art_url)
+        if activity != self.last_activity:
+            with self._timer('update'):
+                await self.scheduler.update(activity)
+            self.last_activity = activity
+        else:
+            logger.debug("Not sending activity because it didn't change")
 
-        # position should already be an int, but some players (smplayer) return a float
-        replacements = self.build_replacements(player, metadata, position, length, state)
+    @classmethod
+    def _position_key(cls, player: Player, metadata: Dict[str, Any], state: PlaybackStatus,
+                      position: Optional[Union[int, float]], options: PlayerOptions,
+                      ) -> Optional[int]:
+        # The position only matters (with second precision) if a rendered template shows it
+        if position is None:
+            return None
+        replacements = cls.build_replacements(player, metadata, position, None, state)
+        templates = [cls._details_template(options, replacements)]
+        if metadata.get('mpris:length', 0):
+            templates.append(cls._state_template(options, state))
+        if any('position' in template.keys for template in templates):
+            return int(position // 1e6)
+        return None
+
+    @staticmethod
+    def _details_template(options: PlayerOptions, replacements: 'Replacements') -> Template:
+        return options.details if replacements['artist'] else options.details_no_artist
 
-        # TODO make format configurable
-        if replacements['artist']:
-            # details_fmt = "{artist} - {title}"
-            details_fmt = "{title}\nby {artist}"
+    @staticmethod
+    def _state_template(options: PlayerOptions, state: PlaybackStatus) -> Template:
+        if state == PlaybackStatus.PLAYING:
+            return options.state_playing
+        elif state == PlaybackStatus.PAUSED:
+            return options.state_paused
         else:
-            details_fmt = "{title}"
-        details = self.format_details(details_fmt, replacements)
+            return options.state_stopped
 
-        activity['details'] = details
+    def build_activity(
+        self,
+        player: Player,
+        metadata: Dict[str, Any],
+        state: PlaybackStatus,
+        position: Optional[Union[int, float]],
+        start_time: Optional[int],
+        options: PlayerOptions,
+        art_url: Optional[str] = None,
+    ) -> JSON:
+        activity: JSON = {}
+        length = metadata.get('mpris:length', 0)
+        replacements = self.build_replacements(player, metadata, position, length, state)
+
+        details_template = self._details_template(options, replacements)
+        activity['details'] = details_template.render(replacements, DETAILS_MAX_CHARS)
 
         # set state and timestamps
         activity['timestamps'] = {}
         if length and position is not None:
             if state == PlaybackStatus.PLAYING:
-                show_time = self.config.player_get(player, 'show_time', 'elapsed')
-                start_time = int(time.time() - position / 1e6)
-                if show_time == 'elapsed':
+                if options.show_time == 'elapsed':
                     activity['timestamps']['start'] = start_time
-                elif show_time == 'remaining':
+                elif options.show_time == 'remaining':
                     end_time = start_time + (length / 1e6)
                     activity['timestamps']['end'] = end_time
-                activity['state'] = self.format_details("{state} [{length}]", replacements)
-            elif state == PlaybackStatus.PAUSED:
-                activity['state'] = self.format_details("{state} [{position}/{length}]",
-                                                        replacements)
-            else:
-                activity['state'] = self.format_details("{state}", replacements)
+            state_template = self._state_template(options, state)
+            activity['state'] = state_template.render(replacements, DETAILS_MAX_CHARS)
 
         # set icons and hover texts
-        if player.name in PLAYER_ICONS:
+        if art_url:
+            activity['assets'] = {'large_text': replacements['album'] or player.name,
+                                  'large_image': art_url,
+                                  'small_image': PLAYER_ICONS.get(player.name,
+                                                                  state.value.lower()),
+                                  'small_text': f"{player.name} ({state.value})"}
+        elif player.name in PLAYER_ICONS:
             activity['assets'] = {'large_text': player.name,
                                   'large_image': PLAYER_ICONS[player.name],
-                                  'small_image': state.lower(),
-                                  'small_text': state}
+                                  'small_image': state.value.lower(),
+                                  'small_text': state.value}
         else:
-            activity['assets'] = {'large_text': f"{player.name} ({state})",
-                                  'large_image': state.lower()}
+            activity['assets'] = {'large_text': f"{player.name} ({state.value})",
+                                  'large_image': state.value.lower()}
 
-        if activity != self.last_activity:
-            op_recv, result = await self.discord.set_activity(activity)
-            if result['evt'] == 'ERROR':
-                logger.error(f"Error setting activity: {result['data']['message']}")
-            self.last_activity = activity
-        else:
-            logger.debug("Not sending activity because it didn't change")
+        return activity
 
-    async def find_active_player(self) -> Optional[Player]:
+    async def find_active_player(self) -> Optional[PlayerSnapshot]:
         active_player = self.active_player
-        players = await self.mpris.get_players()
+        with self._timer('get_players'):
+            players = await self.mpris.get_players()
 
         # refresh active player (in case it restarted or sth)
         if active_player:
             for p in players:
                 if p.bus_name == active_player.bus_name:
+                    if p.unique_name != active_player.unique_name:
+                        logger.info(f"Player {p.bus_name!r} restarted")
                     active_player = p
                     break
             else:
-                logger.info(f"Player {active_player.bus_name!r} lost")
-                self.active_player = active_player = None
-
-        groups = await self.group_players(players)
+                if not self._is_late(active_player):
+                    logger.info(f"Player {active_player.bus_name!r} lost")
+                    self.active_player = active_player = None
+
+        with self._timer('get_snapshots'):
+            groups = await self.group_players(players)
+        # Keep the active player while it is only late,
+        # instead of clearing the presence until it answers again
+        last_snapshot = self.active_snapshot
+        if (
+            active_player and last_snapshot
+            and last_snapshot.player.bus_name == active_player.bus_name
+            and self._is_late(active_player)
+        ):
+            logger.debug(f"Player {active_player.bus_name!r} is late, keeping its last state")
+            last_snapshot = last_snapshot._replace(player=active_player)
+            self.active_snapshot = last_snapshot
+            groups[last_snapshot.playback_status].insert(0, last_snapshot)
         if logger.isEnabledFor(logging.DEBUG):
-            debug_list = [(state, ", ".join(p.bus_name for p in groups[state]))
+            debug_list = [(state, ", ".join(s.player.bus_name for s in groups[state]))
                           for state in STATE_PRIORITY]
             logger.debug(f"found players: {debug_list}")
+            health = [(name, state.value) for name, state in self.mpris.player_health.items()]
+            if health:
+                logger.debug(f"unhealthy players: {health}")
+            if self.mpris.late_players:
+                logger.debug(f"late players: {self.mpris.late_players}")
 
         # Prioritize last active player per group,
         # but only check playing or paused.
         for state in STATE_PRIORITY[:2]:
             group = groups[state]
-            candidates: List[Player] = []
-            for p in group:
-                if p is active_player:
-                    candidates.insert(0, p)
+            candidates: List[PlayerSnapshot] = []
+            for s in group:
+                if s.player is active_player:
+                    candidates.insert(0, s)
                 else:
-                    candidates.append(p)
+                    candidates.append(s)
 
-            for player in group:
+            for snapshot in group:
+                options = self.config.player_options(snapshot.player)
                 if (
-                    not self.config.player_get(player, "ignore", False)
-                    and (state == PlaybackStatus.PLAYING
-                         or self.config.player_get(player, 'show_paused', True))
+                    not options.ignore
+                    and (state == PlaybackStatus.PLAYING or options.show_paused)
                 ):
-                    return player
+                    return snapshot
 
         # no playing or paused player found
-        if active_player and self.config.player_get(active_player, 'show_stopped', False):
-            return active_player
-        else:
-            return None
+        if active_player and self.config.player_options(active_player).show_stopped:
+            for snapshot in itertools.chain.from_iterable(groups.values()):
+                if snapshot.player is active_player:
+                    return snapshot
+        return None
+
+    def _is_late(self, player: Player) -> bool:
+        # Players whose circuit opened or whose name vanished aren't late anymore
+        return (player.bus_name in self.mpris.late_players
+                and self.mpris.player_health.get(player.bus_name) != CircuitState.OPEN)
 
     def _player_not_ignored(self, player: Player) -> bool:
-        return (not self.config.player_get(player, "ignore", False))
+        return not self.config.player_options(player).ignore
 
     @classmethod
     def build_replacements(
@@ -242,42 +452,26 @@ class DiscordMpris:
         position: Optional[Union[int, float]],
         length: Optional[int],
         state: PlaybackStatus,
-    ) -> Dict[str, Any]:
-        replacements = metadata.copy()
-
-        # aggregate artist and albumArtist fields
-        for key in ('artist', 'albumArtist'):
-            source = metadata.get(f'xesam:{key}', ())
-            if isinstance(source, str):  # In case the server doesn't follow mpris specs
-                replacements[key] = source
+    ) -> 'Replacements':
+        return Replacements(player, metadata, position, length, state)
+
+    async def group_players(self, players: Sequence[Player]
+                            ) -> Dict[PlaybackStatus, List[PlayerSnapshot]]:
+        groups: Dict[PlaybackStatus, List[PlayerSnapshot]] = \
+            {state: [] for state in PlaybackStatus}
+        # Players that don't answer in time are left out, so they don't hold back the others
+        results = await self.mpris.gather_players(
+            {player.bus_name: self.mpris.get_snapshot(player) for player in players},
+            self.mpris.response_budget,
+        )
+        for bus_name, result in results.items():
+            if isinstance(result, dbussy.DBusError):
+                # Vanished or unhealthy
+                logger.debug(f"Failed to get the state of {bus_name!r} - {result!s}")
+            elif isinstance(result, BaseException):
+                raise result
             else:
-                replacements[key] = " & ".join(source)
-        # shorthands
-        replacements['title'] = metadata.get('xesam:title', "")
-        replacements['album'] = metadata.get('xesam:album', "")
-
-        # other data
-        replacements['position'] = \
-            cls.format_timestamp(int(position)) if position is not None else ''
-        replacements['length'] = cls.format_timestamp(length)
-        replacements['player'] = player.name
-        replacements['state'] = state
-
-        # replace invalid ident char
-        replacements = {key.replace(':', '_'): val for key, val in replacements.items()}
-
-        return replacements
-
-    @staticmethod
-    async def group_players(players: Iterable[Player]
-                            ) -> Dict[PlaybackStatus, List[Player]]:
-        groups: Dict[PlaybackStatus, List[Player]] = {state: [] for state in PlaybackStatus}
-        for p in players:
-            try:
-                state = PlaybackStatus(await p.player.PlaybackStatus)  # type: ignore
-            except ValueError:
-                state = PlaybackStatus.UNKNOWN
-            groups[state].append(p)
+                groups[result.playback_status].append(result)
 
         return groups
 
@@ -293,40 +487,138 @@ class DiscordMpris:
             string = f"{hours:d}:{mins:02d}:{secs:02d}"
         return string
 
-    @staticmethod
-    def format_details(template: str, replacements: Dict[str, Any]) -> str:
-        # Assumes that there are no numeric characters in the template.
-        details = template.format_map(replacements)
-
-        if len(details) > DETAILS_MAX_CHARS:
-            # Insert null character between replacements
-            # so that consecutive replacements don't result in a big number.
-            details_with_weigths = template.replace("}{", "}\0{").format_map(weigth_map)
-            print(f"{details_with_weigths=}")
-            total_weight = sum(map(float, re.findall(r"[\d.]+", details_with_weigths)))
-            print(f"{total_weight=}")
-            num_fixed_chars = len(re.sub(r"[\d.\0]+", '', details_with_weigths))
-            print(f"{num_fixed_chars=}")
-            factor = (DETAILS_MAX_CHARS - num_fixed_chars) / total_weight
-            print(f"{factor=}")
-            weighted_replacements = {
-                key: shorten(str(value), int(weigth_map[key] * factor), placeholder='…')
-                for key, value in replacements.items()
-            }
-            details = template.format_map(weighted_replacements)
-
-        return details
+
+class Replacements(Mapping[str, Any]):
+
+    """Fields available to the templates, computed on first access.
+
+    Provides the metadata with `:` in keys replaced by `_`
+    (without copying it)
+    and some derived fields, like `artist` or `position`.
+    """
+
+    def __init__(
+        self,
+        player: Player,
+        metadata: Dict[str, Any],
+        position: Optional[Union[int, float]],
+        length: Optional[int],
+        state: PlaybackStatus,
+    ) -> None:
+        self.player = player
+        self.metadata = metadata
+        self.position = position
+        self.length = length
+        self.state = state
+        self._cache: Dict[str, Any] = {}
+        self._raw_keys: Optional[Dict[str, str]] = None
+
+    def _join_artists(self, key: str) -> str:
+        source = self.metadata.get(key, ())
+        if isinstance(source, str):  # In case the server doesn't follow mpris specs
+            return source
+        return " & ".join(source)
+
+    _derived: Dict[str, Callable[['Replacements'], Any]] = {
+        # aggregate artist and albumArtist fields
+        'artist': lambda self: self._join_artists('xesam:artist'),
+        'albumArtist': lambda self: self._join_artists('xesam:albumArtist'),
+        # shorthands
+        'title': lambda self: self.metadata.get('xesam:title', ""),
+        'album': lambda self: self.metadata.get('xesam:album', ""),
+        # other data
+        'position': lambda self: (DiscordMpris.format_timestamp(int(self.position))
+                                  if self.position is not None else ''),
+        'length': lambda self: DiscordMpris.format_timestamp(self.length),
+        'player': lambda self: self.player.name,
+        'state': lambda self: self.state.value,
+    }
+
+    def _raw_key(self, key: str) -> str:
+        # Usually, only the namespace separator needs to be restored
+        guess = key.replace('_', ':', 1)
+        if guess in self.metadata:
+            return guess
+        if self._raw_keys is None:
+            self._raw_keys = {raw_key.replace(':', '_'): raw_key for raw_key in self.metadata}
+        return self._raw_keys[key]
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+        compute = self._derived.get(key)
+        if compute:
+            value = compute(self)
+        else:
+            value = self.metadata[self._raw_key(key)]
+        self._cache[key] = value
+        return value
+
+    def __iter__(self) -> Iterator[str]:
+        yield from self._derived
+        for raw_key in self.metadata:
+            key = raw_key.replace(':', '_')
+            if key not in self._derived:
+                yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
 
 
 async def main_async(loop: asyncio.AbstractEventLoop):
-    config = Config.load()
-    # TODO validate?
+    try:
+        config = Config.load()
+    except ConfigError as e:
+        logger.error(f"Invalid config: {e}")
+        return 1
     configure_logging(config)
-
-    mpris = await Mpris2Dbussy.create(loop=loop)
-    async with AsyncDiscordRpc.for_platform(CLIENT_ID) as discord:
+    profiler = SignalProfiler.from_config(config)
+    profiler.install(loop)
+    try:
+        return await run_instance(loop, config)
+    finally:
+        await profiler.close()
+
+
+async def run_instance(loop: asyncio.AbstractEventLoop, config: Config) -> int:
+    mpris = await Mpris2Dbussy.create(
+        loop=loop,
+        max_concurrency=config.raw_get('global.max_concurrency', 32),
+        max_state_age=config.raw_get('global.signal_poll_interval', 30),
+        call_timeout=config.raw_get('global.player_timeout', 2) or None,
+        response_budget=config.raw_get('global.player_budget', 0.5) or None,
+    )
+    discord: AnyAsyncDiscordRpc
+    timeout = config.raw_get('global.request_timeout', 10) or None
+    if config.raw_get('global.all_clients', True) and sys.platform != 'win32':
+        discord = AsyncDiscordRpcPool(
+            CLIENT_ID, rescan_interval=config.raw_get('global.reconnect_wait_max', 60),
+            timeout=timeout)
+    else:
+        discord = AsyncDiscordRpc.for_platform(CLIENT_ID, timeout=timeout)
+    async with discord:
         instance = DiscordMpris(mpris, discord, config)
-        return await instance.run()
+        instance.config_watcher = ConfigWatcher()
+        instance.art = ArtResolver.from_config(config)
+        instance.art.on_resolved = instance.wakeup.set
+        try:
+            exporter = None
+            if config.raw_get('global.metrics_file') or config.raw_get('global.metrics_socket'):
+                # Only imported when an export is configured
+                from .metrics import MetricsExporter
+                exporter = MetricsExporter.from_config(config)
+            if not exporter:
+                return await instance.run()
+            async with exporter:
+                instance.metrics = exporter.metrics
+                mpris.call_observer = exporter.metrics.observe_dbus_call
+                discord.request_observer = exporter.metrics.observe_discord_request
+                instance.scheduler.update_observer = exporter.metrics.observe_activity_update
+                return await instance.run()
+        finally:
+            await instance.art.close()
 
 
 def main() -> int:
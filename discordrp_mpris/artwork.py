@@ -0,0 +1,353 @@
+"""Show the album art of the playing track.
+
+Discord only displays images from `http(s)` URLs,
+which players provide for streamed tracks.
+Local art (`file://` URLs) has to be published somewhere first,
+which is done by an `ArtUploader`.
+
+Publishing is content-addressed:
+a file is hashed once per track
+and only uploaded if no file with the same content was published before.
+The published URLs are kept in a least recently used cache
+that is limited by the size of the published files
+and persisted in `$XDG_CACHE_HOME/discordrp-mpris/art.json`.
+The cache only applies to the uploader it was filled by
+and is discarded when the uploader or its configuration changes.
+
+Lookups never block.
+Art that isn't known yet is resolved in the background
+and reported through the `on_resolved` callback.
+"""
+
+import asyncio
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import quote, unquote, urlsplit
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# Art files bigger than this are not published
+MAX_FILE_SIZE = 8 * 1024 * 1024
+# Number of tracks to remember the resolved art of
+MAX_TRACKS = 64
+# Seconds until publishing the art of a track is retried after it failed
+RETRY_INTERVAL = 60
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def _cache_home() -> str:
+    return os.environ.get('XDG_CACHE_HOME') or os.path.expanduser("~/.cache")
+
+
+def _temp_path(path: str) -> str:
+    # Files are written from the executor's threads, possibly at the same time
+    return f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _hash_file(path: str) -> Tuple[str, int]:
+    """Return the SHA-256 digest and the size of a file."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            size += len(chunk)
+            if size > MAX_FILE_SIZE:
+                raise ValueError(f"File is larger than {MAX_FILE_SIZE} bytes")
+            digest.update(chunk)
+    return digest.hexdigest(), size
+
+
+class ArtUploader:
+
+    """Publishes art files under a URL that Discord can fetch.
+
+    Subclasses are registered in `UPLOADERS`
+    and chosen with the `art_uploader` option.
+    """
+
+    @property
+    def cache_key(self) -> str:
+        """Identifies where files are published, to only reuse URLs published the same way."""
+        return type(self).__name__
+
+    async def upload(self, path: str, digest: str) -> str:
+        """Publish the file at `path` with content hash `digest` and return its URL."""
+        raise NotImplementedError
+
+    async def delete(self, digest: str, url: str) -> None:
+        """Remove a file that was evicted from the cache, if possible."""
+
+
+class LocalArtUploader(ArtUploader):
+
+    """Copies the art into `directory`, which is served at `base_url`.
+
+    A stand-in for an actual upload
+    that works with any web server or file sync service sharing the directory.
+    """
+
+    def __init__(self, directory: str, base_url: str) -> None:
+        self.directory = directory
+        self.base_url = base_url.rstrip('/') + '/'
+
+    @classmethod
+    def from_config(cls, config: Config) -> Optional['LocalArtUploader']:
+        base_url = config.raw_get('global.art_base_url')
+        if not base_url:
+            return None
+        directory = (config.raw_get('global.art_directory')
+                     or os.path.join(_cache_home(), "discordrp-mpris", "art"))
+        return cls(os.path.expanduser(os.path.expandvars(directory)), base_url)
+
+    @property
+    def cache_key(self) -> str:
+        return f"local {self.directory} {self.base_url}"
+
+    def _file_name(self, path: str, digest: str) -> str:
+        extension = os.path.splitext(path)[1].lower()
+        return f"{digest}{extension}"
+
+    def _copy(self, path: str, name: str) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        target = os.path.join(self.directory, name)
+        tmp_target = _temp_path(target)
+        shutil.copyfile(path, tmp_target)
+        os.replace(tmp_target, target)
+
+    def _remove(self, name: str) -> None:
+        try:
+            os.unlink(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            pass
+
+    async def upload(self, path: str, digest: str) -> str:
+        name = self._file_name(path, digest)
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._copy, path, name)
+        return self.base_url + quote(name)
+
+    async def delete(self, digest: str, url: str) -> None:
+        if not url.startswith(self.base_url):
+            return
+        name = unquote(url[len(self.base_url):])
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._remove, name)
+
+
+# Maps the values of the `art_uploader` option to functions creating the uploader.
+# They return None if the uploader isn't configured.
+UPLOADERS: Dict[str, Callable[[Config], Optional[ArtUploader]]] = {
+    'local': LocalArtUploader.from_config,
+}
+
+
+class CacheEntry(NamedTuple):
+    url: str
+    size: int
+
+
+class ArtCache:
+
+    """Maps content hashes to published URLs, evicting the least recently used.
+
+    The total size of the published files is kept below `max_size` bytes.
+    A persisted cache is only loaded if it was saved with the same `namespace`.
+    """
+
+    def __init__(self, path: Optional[str], max_size: int, namespace: str = "") -> None:
+        self.path = path
+        self.max_size = max_size
+        self.namespace = namespace
+        self.entries: 'OrderedDict[str, CacheEntry]' = OrderedDict()
+        self.size = 0
+
+    def get(self, digest: str) -> Optional[str]:
+        entry = self.entries.get(digest)
+        if entry is None:
+            return None
+        self.entries.move_to_end(digest)
+        return entry.url
+
+    def add(self, digest: str, url: str, size: int) -> List[Tuple[str, CacheEntry]]:
+        """Add a published file and return the evicted entries."""
+        old_entry = self.entries.pop(digest, None)
+        if old_entry:
+            self.size -= old_entry.size
+        self.entries[digest] = CacheEntry(url, size)
+        self.size += size
+        evicted = []
+        while self.size > self.max_size and len(self.entries) > 1:
+            evicted_digest, entry = self.entries.popitem(last=False)
+            self.size -= entry.size
+            evicted.append((evicted_digest, entry))
+        return evicted
+
+    def load(self) -> None:
+        if not self.path:
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            if not isinstance(data, dict) or data.get('namespace') != self.namespace:
+                # The URLs may not be served anymore.
+                # The files they point to are left alone.
+                logger.info(f"Discarding art cache {self.path!r} of another art uploader")
+                return
+            entries = [(digest, CacheEntry(url, size))
+                       for digest, url, size in data['entries']]
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError, TypeError, KeyError) as e:
+            logger.warning(f"Ignoring invalid art cache {self.path!r}: {e}")
+            return
+        self.entries = OrderedDict(entries)
+        self.size = sum(entry.size for entry in self.entries.values())
+
+    def dump(self) -> str:
+        return json.dumps({
+            'namespace': self.namespace,
+            'entries': [[digest, entry.url, entry.size]
+                        for digest, entry in self.entries.items()],
+        })
+
+    def save(self, data: str) -> None:
+        """Write the result of `dump` (which must be called in the event loop thread)."""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = _temp_path(self.path)
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+
+class ArtResolver:
+
+    """Resolves art URLs of tracks to URLs that Discord can show."""
+
+    def __init__(self, uploader: Optional[ArtUploader], cache: ArtCache, *,
+                 on_resolved: Optional[Callable[[], None]] = None,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.uploader = uploader
+        self.cache = cache
+        self.on_resolved = on_resolved
+        self.clock = clock
+        # Maps tracks to their resolved art
+        self._tracks: 'OrderedDict[Hashable, str]' = OrderedDict()
+        # Maps tracks whose art failed to publish to the time it may be retried at
+        self._retry_at: 'OrderedDict[Hashable, float]' = OrderedDict()
+        self._pending: Set[Hashable] = set()
+        self._tasks: Set[asyncio.Future] = set()
+        self._loaded: Optional[asyncio.Future] = None
+
+    @classmethod
+    def from_config(cls, config: Config) -> 'ArtResolver':
+        name = config.raw_get('global.art_uploader', 'local')
+        factory = UPLOADERS.get(name)
+        if factory is None:
+            logger.error(f"Unknown art uploader {name!r}")
+            uploader = None
+        else:
+            uploader = factory(config)
+        cache = ArtCache(os.path.join(_cache_home(), "discordrp-mpris", "art.json"),
+                         int(config.raw_get('global.art_cache_size', 100) * 1024 * 1024),
+                         uploader.cache_key if uploader else "")
+        return cls(uploader, cache)
+
+    @staticmethod
+    def track_key(metadata: Dict[str, Any]) -> Hashable:
+        """Identify a track, to only resolve its art again when the track changes.
+
+        The art URL is part of the key,
+        since some players reuse the same file for every track.
+        """
+        return (metadata.get('mpris:artUrl'), metadata.get('mpris:trackid'),
+                metadata.get('xesam:url'), metadata.get('xesam:title'))
+
+    def lookup(self, metadata: Dict[str, Any]) -> Optional[str]:
+        """Return the URL to show the art of a track with, if it is known yet."""
+        art_url = metadata.get('mpris:artUrl')
+        if not art_url or not isinstance(art_url, str):
+            return None
+        if art_url.startswith(('https://', 'http://')):
+            return art_url
+        if not art_url.startswith('file://') or self.uploader is None:
+            return None
+
+        key = self.track_key(metadata)
+        try:
+            url = self._tracks[key]
+        except KeyError:
+            pass
+        else:
+            self._tracks.move_to_end(key)
+            return url
+        retry_at = self._retry_at.get(key)
+        if retry_at is not None:
+            if self.clock() < retry_at:
+                return None
+            del self._retry_at[key]
+        if key not in self._pending:
+            self._pending.add(key)
+            task = asyncio.ensure_future(self._resolve(key, unquote(urlsplit(art_url).path)))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return None
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.wait(self._tasks)
+
+    async def _resolve(self, key: Hashable, path: str) -> None:
+        try:
+            url = await self._publish(path)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"Failed to publish art {path!r}: {e}")
+            # The file may appear or become readable later
+            self._retry_at[key] = self.clock() + RETRY_INTERVAL
+            while len(self._retry_at) > MAX_TRACKS:
+                self._retry_at.popitem(last=False)
+            return
+        finally:
+            self._pending.discard(key)
+        self._tracks[key] = url
+        while len(self._tracks) > MAX_TRACKS:
+            self._tracks.popitem(last=False)
+        if self.on_resolved:
+            self.on_resolved()
+
+    async def _publish(self, path: str) -> str:
+        assert self.uploader
+        loop = asyncio.get_event_loop()
+        if self._loaded is None:
+            self._loaded = loop.run_in_executor(None, self.cache.load)
+        await asyncio.shield(self._loaded)
+        digest, size = await loop.run_in_executor(None, _hash_file, path)
+        url = self.cache.get(digest)
+        if url:
+            logger.debug(f"Art {path!r} was published as {url!r} before")
+            return url
+
+        url = await self.uploader.upload(path, digest)
+        logger.debug(f"Published art {path!r} as {url!r}")
+        evicted = self.cache.add(digest, url, size)
+        await loop.run_in_executor(None, self.cache.save, self.cache.dump())
+        for evicted_digest, entry in evicted:
+            try:
+                await self.uploader.delete(evicted_digest, entry.url)
+            except Exception as e:
+                logger.warning(f"Failed to delete evicted art {entry.url!r}: {e}")
+        return url
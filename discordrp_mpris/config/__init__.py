@@ -1,33 +1,70 @@
+import asyncio
 import logging
 import os
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Dict, NamedTuple, Optional, Tuple
 
 import pytoml
 
 from ampris2 import PlayerInterfaces as Player
 
+from ..template import Template, TemplateError
+
 logger = logging.getLogger(__name__)
 
 default_file = Path(__file__).parent / "config.toml"
 
 
-# TODO automatic reloading
+class ConfigError(Exception):
+    pass
+
+
+class PlayerOptions(NamedTuple):
+    """Options of the `[options]` table, resolved for a specific player."""
+    show_paused: bool = True
+    show_stopped: bool = False
+    show_time: str = "elapsed"
+    ignore: bool = False
+    max_title_len: int = 64
+    show_art: bool = True
+    details: Template = Template.compile("{title}\nby {artist}")
+    details_no_artist: Template = Template.compile("{title}")
+    state_playing: Template = Template.compile("{state} [{length}]")
+    state_paused: Template = Template.compile("{state} [{position}/{length}]")
+    state_stopped: Template = Template.compile("{state}")
+
+    @classmethod
+    def convert(cls, key: str, value: Any) -> Any:
+        """Check the type of an option value and compile templates."""
+        default = cls._field_defaults[key]
+        expected_type = str if isinstance(default, Template) else type(default)
+        if not isinstance(value, expected_type):
+            raise ConfigError(f"must be of type {expected_type.__name__},"
+                              f" not {type(value).__name__}")
+        if isinstance(default, Template):
+            try:
+                return Template.compile(value)
+            except TemplateError as e:
+                raise ConfigError(str(e)) from None
+        return value
+
+
 class Config:
     _obj = object()
 
     def __init__(self, raw_config: Dict[str, Any]) -> None:
         self.raw_config = raw_config
+        self._player_options: Dict[str, PlayerOptions] = {}
 
     def raw_get(self, key: str, default: Any = None) -> Any:
         segments = key.split('.')
         base: Any = self.raw_config
         for seg in segments:
             if seg not in base:  # this assumes a valid "mapping path"
-                logger.debug(f"No value for key {key!r}")
+                logger.debug("No value for key %r", key)
                 return default
             base = base[seg]
-        logger.debug(f"Value for {key!r}: {base!r}")
+        logger.debug("Value for %r: %r", key, base)
         return base
 
     def get(self, key: str, default: Any = None) -> Any:
@@ -37,27 +74,128 @@ class Config:
         base = self.get(key, default)
         return self.raw_get(f"player.{player.name}.{key}", base)
 
+    def player_options(self, player: Player) -> PlayerOptions:
+        """Return the options for `player`, compiled on first use."""
+        try:
+            return self._player_options[player.name]
+        except KeyError:
+            options = self._compile_player_options(player.name)
+            self._player_options[player.name] = options
+            return options
+
+    def _compile_player_options(self, name: str) -> PlayerOptions:
+        values: Dict[str, Any] = {}
+        for table in (self.raw_get('options'), self.raw_get(f"player.{name}")):
+            for key, value in (table or {}).items():
+                if key not in PlayerOptions._fields:
+                    logger.warning(f"Unknown option {key!r} for player {name!r}")
+                    continue
+                try:
+                    values[key] = PlayerOptions.convert(key, value)
+                except ConfigError as e:
+                    logger.warning(f"Option {key!r} for player {name!r} {e}")
+        options = PlayerOptions(**values)
+        logger.debug(f"Options for player {name!r}: {options}")
+        return options
+
     @classmethod
     def load(cls) -> 'Config':
+        return cls._load_file(cls._find_user_file())
+
+    @classmethod
+    def _load_file(cls, user_file: Optional[Path]) -> 'Config':
         with default_file.open() as f:
             config = pytoml.load(f)
-        user_config = cls._load_user_config()
-        if user_config:
+        if user_file:
+            logging.debug(f"Loading user config: {user_file!s}")
+            with user_file.open() as f:
+                user_config = pytoml.load(f)
+            cls._validate(config, user_config)
             config.update(user_config)
         return Config(config)
 
     @staticmethod
-    def _load_user_config() -> Optional[Dict[str, Any]]:
+    def _validate(default_config: Dict[str, Any], user_config: Dict[str, Any]) -> None:
+        # Use the types of the default values as the schema
+        for table_name in ('global', 'options', 'player'):
+            if not isinstance(user_config.get(table_name, {}), dict):
+                raise ConfigError(f"{table_name!r} must be a table")
+        tables = {'options': user_config.get('options', {})}
+        for player_name, table in user_config.get('player', {}).items():
+            if not isinstance(table, dict):
+                raise ConfigError(f"'player.{player_name}' must be a table")
+            tables[f'player.{player_name}'] = table
+        for table_name, table in tables.items():
+            for key, value in table.items():
+                if key in PlayerOptions._fields:
+                    try:
+                        PlayerOptions.convert(key, value)
+                    except ConfigError as e:
+                        raise ConfigError(f"'{table_name}.{key}' {e}") from None
+        for key, value in user_config.get('global', {}).items():
+            if key not in default_config['global']:
+                continue
+            default = default_config['global'][key]
+            if isinstance(default, bool) or not isinstance(default, (int, float)):
+                valid = isinstance(value, type(default))
+            else:
+                # Accept floats for integer durations and vice versa
+                valid = isinstance(value, (int, float)) and not isinstance(value, bool)
+            if not valid:
+                raise ConfigError(f"'global.{key}' must be of type {type(default).__name__},"
+                                  f" not {type(value).__name__}")
+
+    @staticmethod
+    def _find_user_file() -> Optional[Path]:
         user_patterns = ("$XDG_CONFIG_HOME", "$HOME/.config")
-        user_file = None
 
         for pattern in user_patterns:
             parent = Path(os.path.expandvars(pattern))
             if parent.is_dir():
                 user_file = parent / "discordrp-mpris" / "config.toml"
                 if user_file.is_file():
-                    logging.debug(f"Loading user config: {user_file!s}")
-                    with user_file.open() as f:
-                        return pytoml.load(f)
+                    return user_file
 
         return None
+
+
+class ConfigWatcher:
+
+    """Reloads the configuration when the user config file changes.
+
+    Changes are detected by comparing the file's metadata on every `check`,
+    which only costs a few `stat` calls.
+    The file is parsed in an executor to not block the event loop.
+    If the new file is invalid, the last good configuration is kept.
+    """
+
+    def __init__(self) -> None:
+        self._signature = self._get_signature()
+
+    @staticmethod
+    def _get_signature() -> Optional[Tuple[str, int, int, int]]:
+        user_file = Config._find_user_file()
+        if not user_file:
+            return None
+        try:
+            stat = user_file.stat()
+        except OSError:
+            return None
+        return str(user_file), stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+    async def check(self) -> Optional[Config]:
+        """Return a new `Config` if the user config file changed and is valid."""
+        signature = self._get_signature()
+        if signature == self._signature:
+            return None
+        self._signature = signature
+
+        user_file = Path(signature[0]) if signature else None
+        loop = asyncio.get_event_loop()
+        try:
+            config = await loop.run_in_executor(None, Config._load_file, user_file)
+        except (OSError, pytoml.TomlError, ConfigError) as e:
+            logger.error(f"Failed to reload config, keeping the previous one: {e}")
+            return None
+        logger.info("Reloaded config")
+        return config
@@ -0,0 +1,292 @@
+"""Counters and latency histograms, exported in the Prometheus text format.
+
+Metrics are only collected if an export is configured;
+otherwise, no observers are installed
+and the instrumented code only checks for their absence.
+"""
+
+import asyncio
+from bisect import bisect_left
+import logging
+import os
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'discordrp_mpris_'
+# In seconds; covers fast D-Bus calls as well as players that time out
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30)
+# Blocking the event loop for less than this may go unnoticed
+LAG_PROBE_INTERVAL = 0.25
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}"
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        if not self.labels:
+            self._values[()] = 0
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def get(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {_format_value(value)}"
+
+
+class Histogram:
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # Maps label values to the (non-cumulative) bucket counts,
+        # with a last bucket for values exceeding all bounds,
+        # and the sum of all values
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        if not self.labels:
+            self._series(())
+
+    def _series(self, label_values: LabelValues) -> Tuple[List[int], List[float]]:
+        series = self._values.get(label_values)
+        if series is None:
+            series = self._values[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+        return series
+
+    def observe(self, value: float, *label_values: str) -> None:
+        counts, total = self._series(label_values)
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    def time(self, *label_values: str) -> 'Timer':
+        return Timer(self, label_values)
+
+    def count(self, *label_values: str) -> int:
+        series = self._values.get(label_values)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        bucket_labels = (*self.labels, 'le')
+        for label_values, (counts, total) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), counts):
+                cumulative += count
+                labels = _format_labels(bucket_labels, (*label_values, _format_value(bound)))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {_format_value(total[0])}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Timer:
+
+    """Context manager that observes the time spent in its block."""
+
+    def __init__(self, histogram: Histogram, label_values: LabelValues) -> None:
+        self.histogram = histogram
+        self.label_values = label_values
+        self._start = 0.0
+
+    def __enter__(self) -> 'Timer':
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.histogram.observe(time.perf_counter() - self._start, *self.label_values)
+
+
+class Metrics:
+
+    """The metrics of this application.
+
+    `observe_dbus_call`, `observe_discord_request` and `observe_activity_update`
+    can be installed as the observers of `Mpris2Dbussy`, `AsyncDiscordRpc`
+    and `ActivityScheduler`.
+    """
+
+    def __init__(self) -> None:
+        self.tick_seconds = Histogram(
+            'tick_seconds', "Time spent in phases of updating the presence.", ['phase'])
+        self.dbus_call_seconds = Histogram(
+            'dbus_call_seconds', "Duration of D-Bus calls to players.", ['method'])
+        self.dbus_errors = Counter(
+            'dbus_errors_total', "Failed D-Bus calls to players.", ['method', 'error'])
+        self.discord_request_seconds = Histogram(
+            'discord_request_seconds', "Round-trip time of requests to Discord.", ['cmd'])
+        self.discord_errors = Counter(
+            'discord_errors_total', "Failed requests to Discord.", ['cmd', 'error'])
+        self.activity_updates = Counter(
+            'activity_updates_total',
+            "Activity updates by whether they were sent, coalesced or dropped.", ['result'])
+        self.discord_connections = Counter(
+            'discord_connections_total', "Attempts to connect to Discord.", ['result'])
+        self.loop_lag_seconds = Histogram(
+            'event_loop_lag_seconds',
+            "Delay of scheduled event loop callbacks, e.g. due to blocking calls.",
+            buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+
+    def observe_dbus_call(self, method: str, seconds: float, error: Optional[str]) -> None:
+        self.dbus_call_seconds.observe(seconds, method)
+        if error:
+            self.dbus_errors.inc(method, error)
+
+    def observe_discord_request(self, cmd: str, seconds: float, error: Optional[str]) -> None:
+        self.discord_request_seconds.observe(seconds, cmd)
+        if error:
+            self.discord_errors.inc(cmd, error)
+
+    def observe_activity_update(self, result: str) -> None:
+        self.activity_updates.inc(result)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in vars(self).values():
+            lines.extend(metric.render())
+        lines.append("")
+        return "\n".join(lines)
+
+    async def probe_loop_lag(self, interval: float = LAG_PROBE_INTERVAL) -> None:
+        """Measure how late the event loop wakes up from sleeping, until cancelled."""
+        loop = asyncio.get_event_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(interval)
+            self.loop_lag_seconds.observe(max(0, loop.time() - start - interval))
+
+
+class MetricsExporter:
+
+    """Exports `metrics` to a file periodically and/or to clients of a Unix socket.
+
+    The file is replaced atomically,
+    as required by node_exporter's textfile collector.
+    The socket sends the current metrics to every client that connects
+    (e.g. `socat - UNIX-CONNECT:<path>`).
+    """
+
+    def __init__(self, metrics: Metrics, *, file: Optional[str] = None,
+                 socket: Optional[str] = None, interval: float = 15) -> None:
+        self.metrics = metrics
+        self.file = file
+        self.socket = socket
+        self.interval = interval
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._tasks: List[asyncio.Future] = []
+
+    @classmethod
+    def from_config(cls, config: Config) -> Optional['MetricsExporter']:
+        """Return an exporter for the configured paths, or None if neither is set."""
+        file = config.raw_get('global.metrics_file')
+        socket = config.raw_get('global.metrics_socket')
+        if not file and not socket:
+            return None
+        return cls(
+            Metrics(),
+            file=file and os.path.expanduser(os.path.expandvars(file)),
+            socket=socket and os.path.expanduser(os.path.expandvars(socket)),
+            interval=config.raw_get('global.metrics_interval', 15),
+        )
+
+    async def start(self) -> None:
+        self._tasks.append(asyncio.ensure_future(self.metrics.probe_loop_lag()))
+        if self.file:
+            self._tasks.append(asyncio.ensure_future(self._write_periodically()))
+        if self.socket:
+            try:
+                self._server = await asyncio.start_unix_server(self._serve, self.socket)
+            except OSError as e:
+                logger.error(f"Unable to serve metrics on {self.socket!r}: {e}")
+            else:
+                logger.info(f"Serving metrics on {self.socket!r}")
+
+    async def close(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        if self._tasks:
+            await asyncio.wait(self._tasks)
+        self._tasks.clear()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+            try:
+                os.unlink(self.socket)  # type: ignore
+            except FileNotFoundError:
+                pass
+        if self.file:
+            # Leave the final state behind
+            await self._write_file()
+
+    async def __aenter__(self) -> 'MetricsExporter':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *_) -> None:
+        await self.close()
+
+    async def _serve(self, _reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                     ) -> None:
+        try:
+            writer.write(self.metrics.render().encode())
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _write_periodically(self) -> None:
+        while True:
+            await self._write_file()
+            await asyncio.sleep(self.interval)
+
+    async def _write_file(self) -> None:
+        text = self.metrics.render()
+        loop = asyncio.get_event_loop()
+        try:
+            # Don't block the event loop (and show up as lag) on slow file systems
+            await loop.run_in_executor(None, self._replace_file, self.file, text)
+        except OSError as e:
+            logger.error(f"Unable to write metrics to {self.file!r}: {e}")
+
+    @staticmethod
+    def _replace_file(path: str, text: str) -> None:
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(text)
+        os.replace(tmp_path, path)
@@ -0,0 +1,191 @@
+"""Profile the running daemon on request.
+
+Sending SIGUSR1 samples the stack of the event loop thread
+and traces allocations for `profile_duration` seconds,
+without interrupting the daemon.
+The results are written to `$XDG_RUNTIME_DIR`:
+
+* `discordrp-mpris-<pid>-<time>.stacks`:
+  CPU samples in the collapsed stack format
+  (for flamegraph.pl, speedscope and the like).
+  Samples of the idle event loop waiting in `select` are collapsed into `[idle]`.
+* `discordrp-mpris-<pid>-<time>.malloc.txt`:
+  the memory allocated and not freed during the profile, by line.
+
+Nothing is traced or sampled while not profiling.
+"""
+
+import asyncio
+from collections import Counter
+import logging
+import os
+import signal
+import sys
+import tempfile
+import threading
+import time
+from types import FrameType
+from typing import Any, List, Optional, Tuple
+
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 0.005
+TOP_ALLOCATIONS = 50
+# Frames per traceback kept by tracemalloc
+TRACEMALLOC_FRAMES = 5
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def _is_idle(frame: FrameType) -> bool:
+    code = frame.f_code
+    return code.co_name == 'select' and code.co_filename.endswith('selectors.py')
+
+
+class StackSampler:
+
+    """Samples the stack of a thread from a background thread."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL) -> None:
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="StackSampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            if _is_idle(frame):
+                self.stacks["[idle]"] += 1
+                continue
+            stack: List[str] = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def format(self) -> str:
+        lines = [f"{stack} {count}" for stack, count in self.stacks.most_common()]
+        lines.append("")
+        return "\n".join(lines)
+
+
+class SignalProfiler:
+
+    """Profiles for `duration` seconds whenever the process receives `signum`."""
+
+    def __init__(self, directory: str, duration: float, *,
+                 signum: int = signal.SIGUSR1) -> None:
+        self.directory = directory
+        self.duration = duration
+        self.signum = signum
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Future] = None
+
+    @classmethod
+    def from_config(cls, config: Config) -> 'SignalProfiler':
+        directory = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+        return cls(directory, config.raw_get('global.profile_duration', 30))
+
+    def install(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        loop.add_signal_handler(self.signum, self.trigger)
+
+    async def close(self) -> None:
+        if self._loop:
+            self._loop.remove_signal_handler(self.signum)
+            self._loop = None
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def trigger(self) -> None:
+        if self._task and not self._task.done():
+            logger.warning("Already profiling")
+            return
+        self._task = asyncio.ensure_future(self._profile_and_log())
+
+    async def _profile_and_log(self) -> None:
+        try:
+            paths = await self.profile()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Profiling failed")
+        else:
+            logger.warning(f"Wrote profile to {', '.join(paths)}")
+
+    async def profile(self) -> Tuple[str, str]:
+        """Profile for `duration` seconds and return the paths of the written files."""
+        logger.warning(f"Profiling for {self.duration:g} seconds")
+        # Imported here to not slow down the start (it imports `pickle`)
+        import tracemalloc
+        # Leave tracing running if somebody else started it (e.g. PYTHONTRACEMALLOC)
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        sampler = StackSampler(threading.get_ident())
+        try:
+            before = tracemalloc.take_snapshot()
+            sampler.start()
+            await asyncio.sleep(self.duration)
+        finally:
+            sampler.stop()
+            after = tracemalloc.take_snapshot()
+            if started_tracing:
+                tracemalloc.stop()
+
+        name = f"discordrp-mpris-{os.getpid()}-{int(time.time())}"
+        prefix = os.path.join(self.directory, name)
+        stacks_path = f"{prefix}.stacks"
+        malloc_path = f"{prefix}.malloc.txt"
+        files = [
+            (stacks_path, sampler.format()),
+            (malloc_path, self._format_allocations(before, after)),
+        ]
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self._write_files, files)
+        return stacks_path, malloc_path
+
+    def _format_allocations(self, before: Any, after: Any) -> str:
+        import tracemalloc
+        # Leave out the allocations of the profiler itself
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__),
+                   tracemalloc.Filter(False, __file__)]
+        stats = after.filter_traces(filters).compare_to(before.filter_traces(filters), 'lineno')
+        total = sum(stat.size_diff for stat in stats)
+        lines = [
+            f"Allocation diff over {self.duration:g} seconds: {total / 1024:+.1f} KiB",
+            "",
+        ]
+        lines.extend(str(stat) for stat in stats[:TOP_ALLOCATIONS])
+        lines.append("")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _write_files(files: List[Tuple[str, str]]) -> None:
+        for path, text in files:
+            with open(path, 'w') as f:
+                f.write(text)
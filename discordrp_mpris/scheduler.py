@@ -0,0 +1,171 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Optional
+
+from discord_rpc.async_ import JSON, exceptions as async_exceptions
+from discord_rpc.pool import AnyAsyncDiscordRpc
+
+logger = logging.getLogger(__name__)
+
+_nothing: Any = object()
+
+
+class TokenBucket:
+
+    """Allows up to `capacity` actions per `period` seconds.
+
+    Tokens are refilled continuously.
+    """
+
+    def __init__(self, capacity: int, period: float, *,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.capacity = capacity
+        self.refill_rate = capacity / period  # tokens per second
+        self.clock = clock
+        self.tokens = float(capacity)
+        self._updated_at = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.refill_rate)
+        self._updated_at = now
+
+    def time_until_available(self) -> float:
+        self._refill()
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.refill_rate
+
+    def try_acquire(self) -> bool:
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class AdaptiveInterval:
+
+    """An interval between polls that adapts to how often things change.
+
+    Drops to `minimum` after a change
+    and grows by `factor` with every poll that found none,
+    up to `maximum`, or up to `idle_maximum` while idle
+    (when nothing is playing).
+    """
+
+    def __init__(self, minimum: float, maximum: float, idle_maximum: float, *,
+                 factor: float = 2) -> None:
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.idle_maximum = max(minimum, idle_maximum)
+        self.factor = factor
+        self.current = minimum
+
+    def next_interval(self, changed: bool, idle: bool) -> float:
+        if changed:
+            self.current = self.minimum
+        else:
+            self.current *= self.factor
+        self.current = min(self.current, self.idle_maximum if idle else self.maximum)
+        return self.current
+
+
+class ActivityScheduler:
+
+    """Sends activity updates to Discord without exceeding its rate limit.
+
+    Discord only accepts about 5 updates per 20 seconds.
+    Updates that exceed the budget are held back
+    and replaced by newer updates in the meantime,
+    so that the most recent activity is sent as soon as the budget allows.
+
+    Reports whether each update was sent, coalesced (replaced while waiting)
+    or dropped (matching what Discord already shows) to `update_observer`.
+    """
+
+    def __init__(self, discord: AnyAsyncDiscordRpc, *, rate: int = 5, period: float = 20,
+                 on_error: Optional[Callable[[], None]] = None) -> None:
+        self.discord = discord
+        # Called when sending a held back update failed
+        self.on_error = on_error
+        self.bucket = TokenBucket(rate, period)
+        # Called with the result of every update: 'sent', 'coalesced' or 'dropped'
+        self.update_observer: Optional[Callable[[str], None]] = None
+        self._pending: Optional[JSON] = _nothing
+        self._last_sent: Optional[JSON] = _nothing
+        self._flush_task: Optional[asyncio.Future] = None
+        self._error: Optional[BaseException] = None
+
+    async def update(self, activity: Optional[JSON]) -> None:
+        """Request `activity` to be shown. `None` clears the activity.
+
+        Sends immediately if the budget allows.
+        Raises connection errors that happened while sending a held back update.
+        """
+        self.check()
+
+        if self._flush_task and not self._flush_task.done():
+            if self._pending is not _nothing:
+                self._observe('coalesced')
+                logger.debug("Replacing pending activity update")
+            self._pending = activity
+        elif activity == self._last_sent:
+            self._observe('dropped')
+        elif self.bucket.try_acquire():
+            await self._send(activity)
+        else:
+            logger.debug("Holding back activity update due to rate limit")
+            self._pending = activity
+            self._flush_task = asyncio.ensure_future(self._flush())
+
+    def check(self) -> None:
+        """Raise the connection error that happened while sending a held back update, if any."""
+        if self._error:
+            error, self._error = self._error, None
+            raise error
+
+    def reset(self) -> None:
+        """Forget about pending and sent updates, e.g. after reconnecting."""
+        if self._flush_task:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._pending is not _nothing:
+            self._observe('dropped')
+        self._pending = _nothing
+        self._last_sent = _nothing
+        self._error = None
+
+    async def _flush(self) -> None:
+        try:
+            while self._pending is not _nothing:
+                delay = self.bucket.time_until_available()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+                activity, self._pending = self._pending, _nothing
+                if activity == self._last_sent:
+                    self._observe('dropped')
+                    continue
+                self.bucket.try_acquire()
+                await self._send(activity)
+        except async_exceptions as e:
+            # Raise on the next check, so that the caller can reconnect
+            self._error = e
+            if self.on_error:
+                self.on_error()
+
+    async def _send(self, activity: Optional[JSON]) -> None:
+        if activity is None:
+            op_recv, result = await self.discord.clear_activity()
+        else:
+            op_recv, result = await self.discord.set_activity(activity)
+        self._last_sent = activity
+        self._observe('sent')
+        if result['evt'] == 'ERROR':
+            logger.error(f"Error setting activity: {result['data']['message']}")
+
+    def _observe(self, result: str) -> None:
+        if self.update_observer:
+            self.update_observer(result)
@@ -0,0 +1,121 @@
+import functools
+from string import Formatter
+from textwrap import shorten
+from typing import Any, DefaultDict, Dict, List, Mapping, NamedTuple, Optional, Tuple
+
+# Relative weight for shortening when the result exceeds the maximum length
+weight_map: Dict[str, int] = DefaultDict(
+    lambda: 1,
+    title=4,
+    xesam_title=4,
+    artist=2,
+    album=2,
+    xesam_album=2,
+)
+
+_formatter = Formatter()
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class _Field(NamedTuple):
+    literal: str  # text preceding the field
+    name: str
+    key: str  # first part of `name`, used for looking up the weight
+    conversion: Optional[str]
+    format_spec: str
+    weight: int
+
+
+class Template:
+
+    """A `str.format` template that was parsed into a render plan.
+
+    Rendering only looks up and formats the fields.
+    The number of fixed characters and the total weight of all fields
+    are precomputed for shortening the fields
+    when the result exceeds a maximum length.
+    Missing fields are replaced with an empty string.
+    """
+
+    def __init__(self, source: str, fields: List[_Field], tail: str) -> None:
+        self.source = source
+        self.fields = fields
+        self.tail = tail
+        self.keys = frozenset(field.key for field in fields)
+        self.fixed_chars = sum(len(field.literal) for field in fields) + len(tail)
+        self.total_weight = sum(field.weight for field in fields)
+
+    @classmethod
+    @functools.lru_cache(maxsize=128)
+    def compile(cls, source: str) -> 'Template':
+        fields = []
+        literals = []
+        try:
+            for literal, name, format_spec, conversion in _formatter.parse(source):
+                literals.append(literal)
+                if name is None:
+                    continue
+                key = name.partition('.')[0].partition('[')[0]
+                if not key or key.isdigit():
+                    raise TemplateError(f"Positional fields are not supported: {source!r}")
+                if format_spec and '{' in format_spec:
+                    raise TemplateError(f"Nested fields are not supported: {source!r}")
+                if conversion not in (None, 's', 'r', 'a'):
+                    raise TemplateError(f"Unknown conversion {conversion!r}: {source!r}")
+                fields.append(_Field("".join(literals), name, key, conversion,
+                                     format_spec, weight_map[key]))
+                literals = []
+        except TemplateError:
+            raise
+        except ValueError as e:
+            raise TemplateError(f"Invalid template {source!r}: {e}") from None
+        return cls(source, fields, "".join(literals))
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.source!r})"
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, Template) and self.source == other.source
+
+    def __hash__(self) -> int:
+        return hash(self.source)
+
+    def _values(self, replacements: Mapping[str, Any]) -> List[Tuple[_Field, Any]]:
+        values = []
+        for field in self.fields:
+            try:
+                value, _ = _formatter.get_field(field.name, (), replacements)
+            except (KeyError, IndexError, AttributeError, TypeError):
+                value = ""
+            values.append((field, value))
+        return values
+
+    def render(self, replacements: Mapping[str, Any], max_chars: Optional[int] = None) -> str:
+        values = self._values(replacements)
+        result = self._join(values)
+
+        if max_chars is not None and len(result) > max_chars and self.total_weight:
+            factor = (max_chars - self.fixed_chars) / self.total_weight
+            result = self._join([
+                (field, shorten(str(value), max(int(field.weight * factor), 1), placeholder='…'))
+                for field, value in values
+            ])
+
+        return result
+
+    def _join(self, values: List[Tuple[_Field, Any]]) -> str:
+        parts = []
+        for field, value in values:
+            parts.append(field.literal)
+            if field.conversion:
+                value = _formatter.convert_field(value, field.conversion)
+            try:
+                parts.append(format(value, field.format_spec))
+            except (ValueError, TypeError):
+                # The format spec doesn't fit this value (or its shortened form)
+                parts.append(str(value))
+        parts.append(self.tail)
+        return "".join(parts)
@@ -22,7 +22,7 @@ def find_version(*path_leaves):
 
 setup(
     name="discordrp-mpris",
-    packages=find_packages(exclude=["tests"]),
+    packages=find_packages(exclude=["tests", "benchmarks"]),
     version=find_version("discordrp_mpris", "__init__.py"),
     description="Discord Rich Presence based on mpris2 media players",
     long_description=read("README.md"),
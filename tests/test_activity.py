@@ -0,0 +1,57 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+import unittest
+from unittest import mock
+
+from ampris2 import PlaybackStatus, PlayerInterfaces, PlayerSnapshot
+from discordrp_mpris.__main__ import DiscordMpris
+from discordrp_mpris.config import Config
+
+from .test_scheduler import FakeDiscord
+
+
+class ActivityKeyTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.discord = FakeDiscord()
+        self.app = DiscordMpris(None, self.discord, Config._load_file(None))  # type: ignore
+        self.player = PlayerInterfaces('org.mpris.MediaPlayer2.fake', "fake", None, None,
+                                       unique_name=':1.42')
+        self.snapshots: List[PlayerSnapshot] = []
+
+        async def find_active_player() -> Optional[PlayerSnapshot]:
+            return self.snapshots.pop(0)
+
+        self.app.find_active_player = find_active_player  # type: ignore
+
+    def tearDown(self) -> None:
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def tick(self, state: PlaybackStatus, metadata: Dict[str, Any], position: int,
+             now: float = 1e9) -> Any:
+        self.snapshots.append(PlayerSnapshot(self.player, state, metadata, position))
+        with mock.patch('time.time', return_value=now):
+            self.loop.run_until_complete(self.app.tick())
+        return self.app.last_activity_key
+
+    def test_playing_track_keeps_key(self) -> None:
+        metadata = {'xesam:title': "One", 'xesam:artist': ["Someone"],
+                    'mpris:length': 300_000_000}
+        # The default template for playing tracks doesn't show the position
+        first_key = self.tick(PlaybackStatus.PLAYING, metadata, 10_000_000)
+        first_activity = self.app.last_activity
+        for seconds in range(1, 6):
+            key = self.tick(PlaybackStatus.PLAYING, metadata, 10_000_000 + seconds * 1_000_000,
+                            1e9 + seconds)
+            self.assertIs(key, first_key)
+        self.assertIs(self.app.last_activity, first_activity)
+        self.assertEqual(len(self.discord.sent), 1)
+
+    def test_paused_track_changes_key_with_position(self) -> None:
+        metadata = {'xesam:title': "One", 'mpris:length': 300_000_000}
+        first_key = self.tick(PlaybackStatus.PAUSED, metadata, 10_000_000)
+        self.assertEqual(self.tick(PlaybackStatus.PAUSED, metadata, 10_500_000), first_key)
+        self.assertNotEqual(self.tick(PlaybackStatus.PAUSED, metadata, 11_000_000), first_key)
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from discordrp_mpris.artwork import RETRY_INTERVAL, ArtCache, ArtResolver, LocalArtUploader
+
+from .test_playback_clock import FakeTime
+
+
+class ArtCacheTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "art.json")
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def save(self, cache: ArtCache) -> None:
+        cache.save(cache.dump())
+
+    def test_evicts_least_recently_used(self) -> None:
+        cache = ArtCache(None, 100)
+        self.assertEqual(cache.add("a", "url-a", 40), [])
+        self.assertEqual(cache.add("b", "url-b", 40), [])
+        self.assertEqual(cache.get("a"), "url-a")
+        evicted = cache.add("c", "url-c", 40)
+        self.assertEqual([digest for digest, _ in evicted], ["b"])
+        self.assertEqual(cache.size, 80)
+
+    def test_keeps_single_large_entry(self) -> None:
+        cache = ArtCache(None, 10)
+        self.assertEqual(cache.add("a", "url-a", 20), [])
+        self.assertEqual(cache.get("a"), "url-a")
+
+    def test_round_trip(self) -> None:
+        cache = ArtCache(self.path, 100, "uploader")
+        cache.add("a", "url-a", 10)
+        cache.add("b", "url-b", 20)
+        self.save(cache)
+
+        loaded = ArtCache(self.path, 100, "uploader")
+        loaded.load()
+        self.assertEqual(list(loaded.entries), ["a", "b"])
+        self.assertEqual(loaded.get("b"), "url-b")
+        self.assertEqual(loaded.size, 30)
+
+    def test_discards_cache_of_other_namespace(self) -> None:
+        cache = ArtCache(self.path, 100, "local /old https://old.example/")
+        cache.add("a", "https://old.example/a.jpg", 10)
+        self.save(cache)
+
+        loaded = ArtCache(self.path, 100, "local /new https://new.example/")
+        loaded.load()
+        self.assertIsNone(loaded.get("a"))
+        self.assertEqual(loaded.size, 0)
+
+    def test_discards_cache_without_namespace(self) -> None:
+        # The format used before namespaces
+        with open(self.path, 'w') as f:
+            json.dump([["a", "https://old.example/a.jpg", 10]], f)
+        loaded = ArtCache(self.path, 100, "uploader")
+        loaded.load()
+        self.assertEqual(len(loaded.entries), 0)
+
+    def test_ignores_invalid_cache(self) -> None:
+        for content in ("", "{", '{"namespace": ""}', '{"namespace": "", "entries": [1]}'):
+            with self.subTest(content=content):
+                with open(self.path, 'w') as f:
+                    f.write(content)
+                loaded = ArtCache(self.path, 100)
+                with self.assertLogs('discordrp_mpris.artwork', 'WARNING'):
+                    loaded.load()
+                self.assertEqual(len(loaded.entries), 0)
+
+
+class LocalArtUploaderTest(unittest.TestCase):
+
+    def test_cache_key_depends_on_configuration(self) -> None:
+        keys = {
+            LocalArtUploader("/srv/art", "https://example.com/art").cache_key,
+            LocalArtUploader("/srv/art", "https://example.com/art/").cache_key,
+        }
+        self.assertEqual(len(keys), 1)
+        self.assertNotEqual(LocalArtUploader("/srv/art", "https://example.org/").cache_key,
+                            LocalArtUploader("/srv/art", "https://example.com/").cache_key)
+        self.assertNotEqual(LocalArtUploader("/srv/art", "https://example.com/").cache_key,
+                            LocalArtUploader("/srv/other", "https://example.com/").cache_key)
+
+
+class ArtResolverTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self) -> None:
+        self.loop.close()
+        asyncio.set_event_loop(None)
+        self.tmp.cleanup()
+
+    def make_resolver(self, base_url: str, **kwargs: object) -> ArtResolver:
+        uploader = LocalArtUploader(os.path.join(self.tmp.name, "published"), base_url)
+        cache = ArtCache(os.path.join(self.tmp.name, "art.json"), 1024 * 1024,
+                         uploader.cache_key)
+        return ArtResolver(uploader, cache, **kwargs)  # type: ignore
+
+    def resolve(self, resolver: ArtResolver, metadata: dict) -> object:
+        async def resolve() -> object:
+            resolver.lookup(metadata)
+            await asyncio.wait(resolver._tasks)
+            return resolver.lookup(metadata)
+        return self.loop.run_until_complete(resolve())
+
+    def test_web_art_is_passed_through(self) -> None:
+        resolver = self.make_resolver("https://example.com/")
+        self.assertEqual(resolver.lookup({'mpris:artUrl': "https://cdn.example/cover.png"}),
+                         "https://cdn.example/cover.png")
+
+    def test_republishes_after_base_url_change(self) -> None:
+        art_path = os.path.join(self.tmp.name, "cover art.jpg")
+        with open(art_path, 'wb') as f:
+            f.write(b"cover")
+        metadata = {'mpris:artUrl': "file://" + art_path.replace(" ", "%20")}
+
+        url = self.resolve(self.make_resolver("https://old.example/"), metadata)
+        self.assertTrue(str(url).startswith("https://old.example/"))
+        url = self.resolve(self.make_resolver("https://new.example/"), metadata)
+        self.assertTrue(str(url).startswith("https://new.example/"))
+
+        # Only the published files and the cache are left behind
+        self.assertEqual(sorted(os.listdir(self.tmp.name)),
+                         ["art.json", "cover art.jpg", "published"])
+        self.assertEqual(len(os.listdir(os.path.join(self.tmp.name, "published"))), 1)
+
+    def test_retries_failed_publish(self) -> None:
+        time = FakeTime()
+        resolver = self.make_resolver("https://example.com/", clock=time)
+        art_path = os.path.join(self.tmp.name, "cover.jpg")
+        metadata = {'mpris:artUrl': "file://" + art_path}
+
+        self.assertIsNone(self.resolve(resolver, metadata))
+        with open(art_path, 'wb') as f:
+            f.write(b"cover")
+        self.assertIsNone(resolver.lookup(metadata))
+        self.assertEqual(resolver._tasks, set())
+        time.advance(RETRY_INTERVAL)
+        url = self.resolve(resolver, metadata)
+        self.assertTrue(str(url).startswith("https://example.com/"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,238 @@
+import asyncio
+from typing import Any, Dict, List
+import unittest
+
+from ampris2 import Mpris2Dbussy, PlaybackClock, PlaybackStatus, PlayerInterfaces
+
+
+class FakeTime:
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+class FakeBus:
+
+    """Stands in for a ravel bus that signals are delivered from by hand."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self.loop = loop
+
+    def listen_propchanged(self, *args: Any) -> None:
+        pass
+
+    def listen_signal(self, *args: Any) -> None:
+        pass
+
+
+class FakeMessage:
+
+    def __init__(self, sender: str) -> None:
+        self.sender = sender
+
+
+class FakePlayer:
+
+    """A player that announces its changes like an MPRIS player would."""
+
+    def __init__(self, mpris: Mpris2Dbussy, unique_name: str = ':1.42') -> None:
+        self.mpris = mpris
+        self.interfaces = PlayerInterfaces('fake', "Fake", None, None, unique_name=unique_name)
+        self.properties: Dict[str, Any] = {
+            'PlaybackStatus': 'Playing',
+            'Metadata': {'mpris:trackid': ('o', '/track/1'), 'xesam:title': ('s', "One")},
+            'Position': 0,
+            'Rate': 1.0,
+        }
+        self.fetches = 0
+
+    async def fetch_properties(self, player: PlayerInterfaces) -> Dict[str, Any]:
+        self.fetches += 1
+        return dict(self.properties)
+
+    def _message(self) -> FakeMessage:
+        return FakeMessage(self.interfaces.unique_name)  # type: ignore
+
+    def change(self, key: str, value: Any) -> None:
+        self.properties[key] = value
+        self.mpris._on_properties_changed(
+            self.mpris.PLAYER_IFACE_NAME, {key: ('v', value)}, [], message=self._message())
+
+    def invalidate(self, key: str) -> None:
+        self.mpris._on_properties_changed(
+            self.mpris.PLAYER_IFACE_NAME, {}, [key], message=self._message())
+
+    def seek(self, position: int) -> None:
+        self.properties['Position'] = position
+        self.mpris._on_seeked(position, message=self._message())
+
+
+class PlaybackClockTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.time = FakeTime()
+
+    def test_paused(self) -> None:
+        clock = PlaybackClock(5_000_000, playing=False, clock=self.time)
+        self.time.advance(10)
+        self.assertEqual(clock.position, 5_000_000)
+
+    def test_playing(self) -> None:
+        clock = PlaybackClock(5_000_000, playing=True, clock=self.time)
+        self.time.advance(2.5)
+        self.assertEqual(clock.position, 7_500_000)
+
+    def test_unknown_position(self) -> None:
+        clock = PlaybackClock(None, playing=True, clock=self.time)
+        self.time.advance(1)
+        self.assertIsNone(clock.position)
+
+    def test_seek(self) -> None:
+        clock = PlaybackClock(0, playing=True, clock=self.time)
+        self.time.advance(3)
+        clock.seek(60_000_000)
+        self.assertEqual(clock.position, 60_000_000)
+        self.time.advance(1)
+        self.assertEqual(clock.position, 61_000_000)
+
+    def test_rate_change(self) -> None:
+        clock = PlaybackClock(0, playing=True, clock=self.time)
+        self.time.advance(2)
+        clock.set_rate(1.5)
+        self.time.advance(2)
+        self.assertEqual(clock.position, 5_000_000)
+        self.assertEqual(clock.rate, 1.5)
+
+    def test_pause_and_resume(self) -> None:
+        clock = PlaybackClock(0, playing=True, clock=self.time)
+        self.time.advance(4)
+        clock.set_playing(False)
+        self.time.advance(100)
+        self.assertEqual(clock.position, 4_000_000)
+        clock.set_playing(True)
+        self.time.advance(1)
+        self.assertEqual(clock.position, 5_000_000)
+
+    def test_age(self) -> None:
+        clock = PlaybackClock(0, playing=True, clock=self.time)
+        self.time.advance(7)
+        clock.seek(0)
+        clock.set_rate(2.0)
+        # Only a full synchronization resets the age
+        self.assertEqual(clock.age, 7)
+
+
+class MirroredStateTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        self.time = FakeTime()
+        self.mpris = Mpris2Dbussy(FakeBus(self.loop), self.loop, max_state_age=30,
+                                  clock=self.time)
+        self.mpris.start_listening()
+        self.player = FakePlayer(self.mpris)
+        self.mpris._fetch_properties = self.player.fetch_properties  # type: ignore
+
+    def tearDown(self) -> None:
+        self.loop.close()
+
+    def snapshot(self):
+        return self.loop.run_until_complete(self.mpris.get_snapshot(self.player.interfaces))
+
+    def positions(self, *steps: float) -> List[Any]:
+        positions = []
+        for step in steps:
+            self.time.advance(step)
+            positions.append(self.snapshot().position)
+        return positions
+
+    def test_extrapolates_without_calls(self) -> None:
+        self.assertEqual(self.positions(0, 1, 2), [0, 1_000_000, 3_000_000])
+        self.assertEqual(self.player.fetches, 1)
+
+    def test_seek(self) -> None:
+        self.snapshot()
+        self.time.advance(5)
+        self.player.seek(90_000_000)
+        self.assertEqual(self.positions(0, 2), [90_000_000, 92_000_000])
+        self.assertEqual(self.player.fetches, 1)
+
+    def test_rate_change(self) -> None:
+        self.snapshot()
+        self.time.advance(2)
+        self.player.change('Rate', 2.0)
+        snapshot = self.snapshot()
+        self.assertEqual(snapshot.rate, 2.0)
+        self.assertEqual(self.positions(0, 3), [2_000_000, 8_000_000])
+        self.assertEqual(self.player.fetches, 1)
+
+    def test_pause(self) -> None:
+        self.snapshot()
+        self.time.advance(3)
+        self.player.change('PlaybackStatus', 'Paused')
+        snapshot = self.snapshot()
+        self.assertEqual(snapshot.playback_status, PlaybackStatus.PAUSED)
+        self.assertEqual(self.positions(0, 20), [3_000_000, 3_000_000])
+
+        self.player.change('PlaybackStatus', 'Playing')
+        self.assertEqual(self.positions(1), [4_000_000])
+        self.assertEqual(self.player.fetches, 1)
+
+    def test_track_change_resynchronizes(self) -> None:
+        self.snapshot()
+        self.time.advance(10)
+        self.player.properties['Position'] = 0
+        self.player.change('Metadata', {'mpris:trackid': ('o', '/track/2'),
+                                        'xesam:title': ('s', "Two")})
+        snapshot = self.snapshot()
+        self.assertEqual(snapshot.metadata['xesam:title'], "Two")
+        self.assertEqual(snapshot.position, 0)
+        self.assertEqual(self.player.fetches, 2)
+
+    def test_metadata_update_of_same_track(self) -> None:
+        self.snapshot()
+        self.time.advance(10)
+        self.player.change('Metadata', {'mpris:trackid': ('o', '/track/1'),
+                                        'xesam:title': ('s', "One"),
+                                        'xesam:artist': ('as', ["Someone"])})
+        snapshot = self.snapshot()
+        self.assertEqual(snapshot.metadata['xesam:artist'], ["Someone"])
+        self.assertEqual(snapshot.position, 10_000_000)
+        self.assertEqual(self.player.fetches, 1)
+
+    def test_invalidated_property_resynchronizes(self) -> None:
+        self.snapshot()
+        self.player.invalidate('Metadata')
+        self.snapshot()
+        self.assertEqual(self.player.fetches, 2)
+
+    def test_old_state_resynchronizes(self) -> None:
+        self.snapshot()
+        self.time.advance(29)
+        self.snapshot()
+        self.assertEqual(self.player.fetches, 1)
+        self.time.advance(1)
+        self.snapshot()
+        self.assertEqual(self.player.fetches, 2)
+
+    def test_other_interfaces_are_ignored(self) -> None:
+        self.snapshot()
+        self.mpris._on_properties_changed('org.example.Other', {'Rate': ('d', 2.0)}, [],
+                                          message=FakeMessage(':1.42'))
+        self.assertEqual(self.snapshot().rate, 1.0)
+
+    def test_signals_wake_up_waiters(self) -> None:
+        self.snapshot()
+        self.player.seek(1_000_000)
+        self.assertTrue(self.loop.run_until_complete(self.mpris.wait_for_change(0.01)))
+        self.assertFalse(self.loop.run_until_complete(self.mpris.wait_for_change(0.01)))
+
+
+if __name__ == '__main__':
+    unittest.main()
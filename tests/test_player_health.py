@@ -0,0 +1,179 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+import unittest
+
+import dbussy
+from dbussy import DBUS
+
+from ampris2 import CircuitState, Mpris2Dbussy, PlayerHealth, PlayerInterfaces
+
+from .test_playback_clock import FakeBus, FakeTime
+
+
+class PlayerHealthTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.time = FakeTime()
+        self.health = PlayerHealth(3, 5, 30, clock=self.time)
+
+    def test_opens_after_threshold(self) -> None:
+        self.assertFalse(self.health.record_failure())
+        self.assertFalse(self.health.record_failure())
+        self.assertEqual(self.health.state, CircuitState.CLOSED)
+        self.assertTrue(self.health.record_failure())
+        self.assertEqual(self.health.state, CircuitState.OPEN)
+
+    def test_cooldown_doubles_up_to_maximum(self) -> None:
+        for _ in range(3):
+            self.health.record_failure()
+        cooldowns = []
+        for _ in range(4):
+            cooldowns.append(self.health.cooldown)
+            self.time.advance(self.health.cooldown - 0.1)
+            self.assertEqual(self.health.state, CircuitState.OPEN)
+            self.time.advance(0.1)
+            self.assertEqual(self.health.state, CircuitState.HALF_OPEN)
+            # The probe failed
+            self.assertTrue(self.health.record_failure())
+        self.assertEqual(cooldowns, [5, 10, 20, 30])
+
+
+class GatherPlayersTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.mpris = Mpris2Dbussy(FakeBus(self.loop), self.loop)
+
+    def tearDown(self) -> None:
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    @staticmethod
+    async def answer(value: Any, delay: float = 0) -> Any:
+        await asyncio.sleep(delay)
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def test_leaves_out_late_players(self) -> None:
+        async def gather() -> Any:
+            results = await self.mpris.gather_players({
+                'fast': self.answer(1),
+                'failing': self.answer(ValueError("failed")),
+                'slow': self.answer(3, 0.2),
+            }, 0.05)
+            late = self.mpris.late_players
+            changed_early = self.mpris._changed.is_set()
+            await asyncio.sleep(0.3)
+            return results, late, changed_early
+
+        results, late, changed_early = self.loop.run_until_complete(gather())
+        self.assertEqual(list(results), ['fast', 'failing'])
+        self.assertEqual(results['fast'], 1)
+        self.assertIsInstance(results['failing'], ValueError)
+        self.assertEqual(late, ['slow'])
+        self.assertFalse(changed_early)
+        # Picked up by the next tick
+        self.assertEqual(self.mpris.late_players, [])
+        self.assertTrue(self.mpris._changed.is_set())
+
+    def test_budget_excludes_waiting_for_a_slot(self) -> None:
+        mpris = Mpris2Dbussy(FakeBus(self.loop), self.loop, max_concurrency=1)
+        results = self.loop.run_until_complete(mpris.gather_players({
+            'first': self.answer(1, 0.1),
+            'queued': self.answer(2, 0.1),
+        }, 0.15))
+        self.assertEqual(results, {'first': 1, 'queued': 2})
+        self.assertEqual(mpris.late_players, [])
+
+    def test_without_timeout(self) -> None:
+        results = self.loop.run_until_complete(self.mpris.gather_players(
+            {'slow': self.answer(3, 0.05)}, None))
+        self.assertEqual(results, {'slow': 3})
+
+
+class PlayerCircuitTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.time = FakeTime()
+        self.mpris = Mpris2Dbussy(FakeBus(self.loop), self.loop, response_budget=0.05,
+                                  clock=self.time)
+        self.mpris._player_owners = {}
+        for i, name in enumerate(('good', 'bad')):
+            unique_name = f':1.{i}'
+            self.mpris._player_owners[name] = unique_name
+            self.mpris._player_cache[(unique_name, name)] = PlayerInterfaces(
+                name, name.title(), None, None, unique_name=unique_name)
+        self.mpris._fetch_properties = self.fetch_properties  # type: ignore
+        self.fetches: List[str] = []
+
+    def tearDown(self) -> None:
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    async def fetch_properties(self, player: PlayerInterfaces) -> Dict[str, Any]:
+        self.fetches.append(player.bus_name)
+        return {}
+
+    def fail(self, bus_name: str, error: str = DBUS.ERROR_NO_REPLY) -> None:
+        async def call() -> None:
+            raise dbussy.DBusError(error, "failed")
+
+        with self.assertRaises(dbussy.DBusError):
+            self.loop.run_until_complete(self.mpris._checked(bus_name, call()))
+
+    def get_player_names(self) -> List[str]:
+        players = self.loop.run_until_complete(self.mpris.get_players())
+        return [player.bus_name for player in players]
+
+    def test_skips_player_with_open_circuit(self) -> None:
+        for _ in range(3):
+            self.fail('bad')
+        self.assertEqual(self.mpris.player_health, {'bad': CircuitState.OPEN})
+        self.assertEqual(self.get_player_names(), ['good'])
+        self.assertEqual(self.mpris._probes, {})
+
+    def test_successful_probe_brings_player_back(self) -> None:
+        for _ in range(3):
+            self.fail('bad')
+        self.time.advance(5)
+        self.assertEqual(self.mpris.player_health, {'bad': CircuitState.HALF_OPEN})
+        # The probe is made in the background
+        self.assertEqual(self.get_player_names(), ['good'])
+        self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertEqual(self.fetches, ['bad'])
+        self.assertEqual(self.mpris.player_health, {})
+        self.assertTrue(self.mpris._changed.is_set())
+        self.assertEqual(self.get_player_names(), ['good', 'bad'])
+
+    def test_vanished_player_is_not_unhealthy(self) -> None:
+        for error in (DBUS.ERROR_SERVICE_UNKNOWN, DBUS.ERROR_NAME_HAS_NO_OWNER):
+            with self.subTest(error=error):
+                self.fail('bad', error)
+                self.assertEqual(self.mpris.player_health, {})
+        self.fail('bad')
+        self.assertEqual(self.mpris.player_health, {'bad': CircuitState.CLOSED})
+
+    def test_late_answer_sets_changed(self) -> None:
+        slow = ['bad']
+
+        async def get_player_ifaces(bus_name: str) -> Optional[PlayerInterfaces]:
+            if bus_name in slow:
+                slow.remove(bus_name)
+                await asyncio.sleep(0.1)
+            return self.mpris._player_cache[(self.mpris._player_owners[bus_name], bus_name)]
+
+        self.mpris.get_player_ifaces = get_player_ifaces  # type: ignore
+        self.assertEqual(self.get_player_names(), ['good'])
+        self.assertEqual(self.mpris.late_players, ['bad'])
+        self.assertFalse(self.mpris._changed.is_set())
+        self.loop.run_until_complete(asyncio.sleep(0.15))
+        self.assertTrue(self.mpris._changed.is_set())
+        self.assertEqual(self.get_player_names(), ['good', 'bad'])
+
+
+if __name__ == '__main__':
+    unittest.main()
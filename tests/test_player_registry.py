@@ -0,0 +1,83 @@
+import asyncio
+from typing import Any, Dict, List
+import unittest
+
+import dbussy
+from dbussy import DBUS
+
+from ampris2 import Mpris2Dbussy
+
+from .test_playback_clock import FakeBus
+
+
+class FakeConnection:
+
+    def __init__(self) -> None:
+        self.actions: List[Any] = []
+
+    async def bus_add_match_action_async(self, rule: Any, func: Any, user_data: Any) -> None:
+        self.actions.append(func)
+
+    def bus_remove_match_action(self, rule: Any, func: Any, user_data: Any) -> None:
+        self.actions.remove(func)
+
+
+class NameOwnerChanged:
+
+    def __init__(self, name: str, old_owner: str, new_owner: str) -> None:
+        self.args = (f'{Mpris2Dbussy.BUS_BASE_NAME}.{name}', old_owner, new_owner)
+
+    def expect_objects(self, signature: str) -> Any:
+        return self.args
+
+
+class PlayerRegistryTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        bus = FakeBus(self.loop)
+        bus.connection = self.connection = FakeConnection()
+        self.mpris = Mpris2Dbussy(bus, self.loop)
+
+    def tearDown(self) -> None:
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def signal(self, name: str, old_owner: str, new_owner: str) -> None:
+        for action in self.connection.actions:
+            action(self.connection, NameOwnerChanged(name, old_owner, new_owner), None)
+
+    def test_signals_during_snapshot_take_precedence(self) -> None:
+        async def snapshot() -> Dict[str, str]:
+            self.signal('gone', ':1.1', '')
+            self.signal('new', '', ':1.3')
+            return {'gone': ':1.1', 'stays': ':1.2'}
+
+        self.mpris._take_owner_snapshot = snapshot  # type: ignore
+        owners = self.loop.run_until_complete(self.mpris.get_player_owners())
+        self.assertEqual(owners, {'stays': ':1.2', 'new': ':1.3'})
+        self.signal('stays', ':1.2', '')
+        self.assertEqual(owners, {'new': ':1.3'})
+
+    def test_retries_failed_snapshot(self) -> None:
+        async def failing_snapshot() -> Dict[str, str]:
+            self.signal('new', '', ':1.3')
+            raise dbussy.DBusError(DBUS.ERROR_NO_REPLY, "No reply")
+
+        async def snapshot() -> Dict[str, str]:
+            return {'stays': ':1.2'}
+
+        self.mpris._take_owner_snapshot = failing_snapshot  # type: ignore
+        with self.assertRaises(dbussy.DBusError):
+            self.loop.run_until_complete(self.mpris.get_player_owners())
+        self.assertIsNone(self.mpris._player_owners)
+        self.assertEqual(self.connection.actions, [])
+        # Late deliveries don't create a partial registry
+        self.mpris._on_name_owner_changed(None, NameOwnerChanged('other', '', ':1.4'), None)
+        self.assertIsNone(self.mpris._player_owners)
+
+        self.mpris._take_owner_snapshot = snapshot  # type: ignore
+        owners = self.loop.run_until_complete(self.mpris.get_player_owners())
+        self.assertEqual(owners, {'stays': ':1.2'})
+        self.assertEqual(len(self.connection.actions), 1)
@@ -0,0 +1,107 @@
+import unittest
+
+from discord_rpc.protocol import (HEADER, OP_CLOSE, OP_FRAME, OP_HANDSHAKE, FrameDecoder,
+                                  encode_frame)
+
+
+class EncodeFrameTest(unittest.TestCase):
+
+    def test_header_and_payload(self) -> None:
+        frame = encode_frame({'cmd': "SET_ACTIVITY", 'text': "ä"}, OP_HANDSHAKE)
+        op, length = HEADER.unpack_from(frame)
+        self.assertEqual(op, OP_HANDSHAKE)
+        self.assertEqual(length, len(frame) - HEADER.size)
+        self.assertEqual(frame[HEADER.size:].decode('utf-8'),
+                         '{"cmd":"SET_ACTIVITY","text":"\\u00e4"}')
+
+
+class FrameDecoderTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.decoder = FrameDecoder()
+
+    def test_single_frame(self) -> None:
+        self.decoder.feed(encode_frame({'a': 1}))
+        self.assertEqual(self.decoder.next_frame(), (OP_FRAME, {'a': 1}))
+        self.assertIsNone(self.decoder.next_frame())
+        self.assertEqual(self.decoder.buffered, 0)
+
+    def test_header_split_across_feeds(self) -> None:
+        frame = encode_frame({'a': 1})
+        self.decoder.feed(frame[:3])
+        self.assertIsNone(self.decoder.next_frame())
+        self.decoder.feed(frame[3:6])
+        self.assertIsNone(self.decoder.next_frame())
+        self.decoder.feed(frame[6:])
+        self.assertEqual(self.decoder.next_frame(), (OP_FRAME, {'a': 1}))
+
+    def test_byte_by_byte(self) -> None:
+        frames = [encode_frame({'n': n, 'text': "ü" * n}) for n in range(5)]
+        data = b"".join(frames)
+        decoded = []
+        for i in range(len(data)):
+            self.decoder.feed(data[i:i + 1])
+            decoded.extend(self.decoder)
+        self.assertEqual(decoded, [(OP_FRAME, {'n': n, 'text': "ü" * n}) for n in range(5)])
+        self.assertEqual(self.decoder.buffered, 0)
+
+    def test_several_frames_in_one_chunk(self) -> None:
+        self.decoder.feed(encode_frame({'n': 1}) + encode_frame({'n': 2}, OP_CLOSE)
+                          + encode_frame({'n': 3})[:5])
+        self.assertEqual(list(self.decoder), [(OP_FRAME, {'n': 1}), (OP_CLOSE, {'n': 2})])
+        self.assertEqual(self.decoder.buffered, 5)
+
+    def test_bytes_needed(self) -> None:
+        frame = encode_frame({'key': "value"})
+        payload_length = len(frame) - HEADER.size
+        self.assertEqual(self.decoder.bytes_needed(), HEADER.size)
+        self.decoder.feed(frame[:3])
+        self.assertEqual(self.decoder.bytes_needed(), HEADER.size - 3)
+
+        # Header received, but not yet consumed
+        self.decoder.feed(frame[3:HEADER.size + 2])
+        self.assertEqual(self.decoder.bytes_needed(), payload_length - 2)
+        # Header consumed by an attempt to decode the frame
+        self.assertIsNone(self.decoder.next_frame())
+        self.assertEqual(self.decoder.bytes_needed(), payload_length - 2)
+
+        self.decoder.feed(frame[HEADER.size + 2:])
+        self.assertEqual(self.decoder.bytes_needed(), 0)
+        self.assertEqual(self.decoder.next_frame(), (OP_FRAME, {'key': "value"}))
+        self.assertEqual(self.decoder.bytes_needed(), HEADER.size)
+
+    def test_compaction(self) -> None:
+        small = encode_frame({'n': 1})
+        large = encode_frame({'text': "x" * 100})
+        self.decoder.feed(small + large[:10])
+        self.assertEqual(self.decoder.next_frame(), (OP_FRAME, {'n': 1}))
+        self.assertIsNone(self.decoder.next_frame())
+        # The consumed frame makes up most of the buffer and is dropped with the next feed
+        self.assertGreater(self.decoder._offset, len(self.decoder._buffer) // 2)
+        self.decoder.feed(large[10:20])
+        self.assertEqual(self.decoder._offset, 0)
+        self.assertEqual(len(self.decoder._buffer), 20 - HEADER.size)
+        self.decoder.feed(large[20:])
+        self.assertEqual(self.decoder.next_frame(), (OP_FRAME, {'text': "x" * 100}))
+
+    def test_no_compaction_of_little_consumed_data(self) -> None:
+        small = encode_frame({'n': 1})
+        large = encode_frame({'text': "x" * 100})
+        self.decoder.feed(small + large)
+        self.assertEqual(self.decoder.next_frame(), (OP_FRAME, {'n': 1}))
+        offset = self.decoder._offset
+        self.assertLess(offset, len(self.decoder._buffer) // 2)
+        self.decoder.feed(b"")
+        self.assertEqual(self.decoder._offset, offset)
+        self.assertEqual(self.decoder.next_frame(), (OP_FRAME, {'text': "x" * 100}))
+
+    def test_fully_consumed_buffer_is_cleared(self) -> None:
+        self.decoder.feed(encode_frame({'n': 1}))
+        self.decoder.next_frame()
+        self.decoder.feed(b"")
+        self.assertEqual(self.decoder._offset, 0)
+        self.assertEqual(len(self.decoder._buffer), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import asyncio
+from typing import Any, List
+import unittest
+
+from discordrp_mpris.scheduler import ActivityScheduler
+
+
+class FakeDiscord:
+
+    def __init__(self, fail_on: int = 0) -> None:
+        self.sent: List[Any] = []
+        self.fail_on = fail_on
+        self.calls = 0
+
+    async def set_activity(self, activity: Any) -> Any:
+        self.calls += 1
+        if self.calls == self.fail_on:
+            raise ConnectionResetError("Connection lost")
+        self.sent.append(activity)
+        return 1, {'evt': None}
+
+    async def clear_activity(self) -> Any:
+        return await self.set_activity(None)
+
+
+class ActivitySchedulerTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self) -> None:
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run_until_complete(self, aw: Any) -> Any:
+        return self.loop.run_until_complete(aw)
+
+    def test_coalesces_held_back_updates(self) -> None:
+        discord = FakeDiscord()
+        scheduler = ActivityScheduler(discord, rate=1, period=0.05)  # type: ignore
+        results: List[str] = []
+        scheduler.update_observer = results.append
+
+        async def updates() -> None:
+            for activity in ("a", "b", "c", "d"):
+                await scheduler.update(activity)
+            await asyncio.sleep(0.1)
+
+        self.run_until_complete(updates())
+        self.assertEqual(discord.sent, ["a", "d"])
+        self.assertEqual(results, ['sent', 'coalesced', 'coalesced', 'sent'])
+
+    def test_drops_unchanged_updates(self) -> None:
+        discord = FakeDiscord()
+        scheduler = ActivityScheduler(discord)  # type: ignore
+        results: List[str] = []
+        scheduler.update_observer = results.append
+        self.run_until_complete(scheduler.update("a"))
+        self.run_until_complete(scheduler.update("a"))
+        self.assertEqual(discord.sent, ["a"])
+        self.assertEqual(results, ['sent', 'dropped'])
+
+    def test_reports_failed_flush(self) -> None:
+        discord = FakeDiscord(fail_on=2)
+        errors = []
+        scheduler = ActivityScheduler(discord, rate=1, period=0.05,  # type: ignore
+                                      on_error=lambda: errors.append(True))
+
+        async def updates() -> None:
+            await scheduler.update("a")
+            await scheduler.update("b")
+            await asyncio.sleep(0.1)
+
+        self.run_until_complete(updates())
+        self.assertEqual(errors, [True])
+        # Raised without waiting for another update
+        with self.assertRaises(ConnectionResetError):
+            scheduler.check()
+        scheduler.check()  # only once
+
+
+if __name__ == '__main__':
+    unittest.main()
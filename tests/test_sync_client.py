@@ -0,0 +1,27 @@
+import socket
+import time
+import unittest
+
+from discord_rpc import UnixDiscordRpc
+
+
+class UnixDiscordRpcTest(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.server, client_sock = socket.socketpair()
+        # Skip connecting to Discord
+        self.rpc = UnixDiscordRpc.__new__(UnixDiscordRpc)
+        self.rpc._sock = client_sock
+
+    def tearDown(self) -> None:
+        self.server.close()
+        self.rpc._close()
+
+    def test_receive_timeout_does_not_apply_to_writes(self) -> None:
+        with self.assertRaises(socket.timeout):
+            self.rpc._recv(8, time.monotonic() + 0.01)
+        self.assertIsNone(self.rpc._sock.gettimeout())
+
+        self.server.sendall(b"data")
+        self.assertEqual(self.rpc._recv(4, time.monotonic() + 1), b"data")
+        self.assertIsNone(self.rpc._sock.gettimeout())
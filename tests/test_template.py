@@ -0,0 +1,142 @@
+import random
+import re
+from textwrap import shorten
+from typing import Any, Dict, Optional
+import unittest
+
+from discordrp_mpris.__main__ import DETAILS_MAX_CHARS
+from discordrp_mpris.template import Template, TemplateError, weight_map
+
+KEYS = ('title', 'artist', 'album', 'xesam_title', 'xesam_album', 'player', 'state')
+LITERALS = ("", " ", "\nby ", " - ", " on ", "「", "」", " (", ")", " | ", "\n")
+WORDS = ("a", "Lorem", "ipsum", "dolor", "sit", "amet", "Ünïcödé", "日本語", "x" * 40, "-", "…")
+
+
+def format_details(template: str, replacements: Dict[str, Any]) -> str:
+    """The implementation that preceded templates (without its debug output)."""
+    # Assumes that there are no numeric characters in the template.
+    details = template.format_map(replacements)
+
+    if len(details) > DETAILS_MAX_CHARS:
+        # Insert null character between replacements
+        # so that consecutive replacements don't result in a big number.
+        details_with_weigths = template.replace("}{", "}\0{").format_map(weight_map)
+        total_weight = sum(map(float, re.findall(r"[\d.]+", details_with_weigths)))
+        num_fixed_chars = len(re.sub(r"[\d.\0]+", '', details_with_weigths))
+        factor = (DETAILS_MAX_CHARS - num_fixed_chars) / total_weight
+        weighted_replacements = {
+            key: shorten(str(value), int(weight_map[key] * factor), placeholder='…')
+            for key, value in replacements.items()
+        }
+        details = template.format_map(weighted_replacements)
+
+    return details
+
+
+def random_template(rng: random.Random) -> str:
+    parts = []
+    for _ in range(rng.randint(1, 5)):
+        parts.append(rng.choice(LITERALS))
+        parts.append(f"{{{rng.choice(KEYS)}}}")
+    parts.append(rng.choice(LITERALS))
+    return "".join(parts)
+
+
+def random_text(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.choice((0, 1, 3, 10, 40))))
+
+
+class LegacyComparisonTest(unittest.TestCase):
+
+    """Compares rendering with the previous implementation on random input."""
+
+    CASES = 5000
+
+    def test_matches_format_details(self) -> None:
+        rng = random.Random(1337)
+        compared = shortened = 0
+        for _ in range(self.CASES):
+            source = random_template(rng)
+            replacements = {key: random_text(rng) for key in KEYS}
+            try:
+                expected: Optional[str] = format_details(source, replacements)
+            except ValueError:
+                # The old implementation failed when a field had no room left at all
+                expected = None
+            result = Template.compile(source).render(replacements, DETAILS_MAX_CHARS)
+            if expected is None:
+                continue
+            self.assertEqual(result, expected, f"{source!r} with {replacements!r}")
+            compared += 1
+            shortened += len(source.format_map(replacements)) > DETAILS_MAX_CHARS
+        # Make sure that the interesting cases are covered
+        self.assertGreater(compared, self.CASES * 0.9)
+        self.assertGreater(shortened, self.CASES * 0.3)
+
+    def test_never_fails_on_over_length_input(self) -> None:
+        rng = random.Random(42)
+        for _ in range(self.CASES):
+            source = random_template(rng)
+            replacements = {key: "x" * rng.randint(0, 500) for key in KEYS}
+            Template.compile(source).render(replacements, DETAILS_MAX_CHARS)
+
+
+class TemplateTest(unittest.TestCase):
+
+    def render(self, source: str, max_chars: Optional[int] = None, **replacements: Any) -> str:
+        return Template.compile(source).render(replacements, max_chars)
+
+    def test_missing_fields_are_empty(self) -> None:
+        self.assertEqual(self.render("{title} by {artist}", title="Song"), "Song by ")
+        self.assertEqual(self.render("[{meta.attr}] [{items[0]}]", meta=None, items=[]), "[] []")
+
+    def test_attribute_and_index_access(self) -> None:
+        self.assertEqual(self.render("{artists[1]} {title.upper}", artists=["a", "b"], title=""),
+                         f"b {''.upper}")
+
+    def test_conversions(self) -> None:
+        self.assertEqual(self.render("{title!r}/{title!s}/{title!a}", title="ä"),
+                         "'ä'/ä/'\\xe4'")
+
+    def test_format_specs(self) -> None:
+        self.assertEqual(self.render("[{title:>6}] [{rate:.1f}]", title="abc", rate=1.25),
+                         "[   abc] [1.2]")
+
+    def test_format_spec_of_shortened_value(self) -> None:
+        # A numeric format spec doesn't apply to the shortened (string) value
+        result = self.render("{title} {rate:.1f}", 20, title="word " * 10, rate=1.0)
+        self.assertEqual(result, "word word word… 1.0")
+
+    def test_shortening_respects_weights(self) -> None:
+        result = self.render("{title}\nby {artist}", 40, title="t " * 50, artist="a " * 50)
+        title, artist = result.split("\nby ")
+        self.assertLessEqual(len(result), 40)
+        self.assertGreater(len(title), len(artist))
+
+    def test_no_shortening_below_limit(self) -> None:
+        text = "word " * 20
+        self.assertEqual(self.render("{title}", 200, title=text), text)
+        self.assertEqual(self.render("{title}", None, title=text * 100), text * 100)
+
+    def test_template_without_fields(self) -> None:
+        self.assertEqual(self.render("x" * 200, 10), "x" * 200)
+
+    def test_keys(self) -> None:
+        self.assertEqual(Template.compile("{title} {artist[0]} {meta.x} {title}").keys,
+                         {'title', 'artist', 'meta'})
+
+    def test_escaped_braces(self) -> None:
+        self.assertEqual(self.render("{{{title}}}", title="x"), "{x}")
+
+    def test_invalid_templates(self) -> None:
+        for source in ("{", "}", "{title", "{0}", "{}", "{title:{width}}", "{title!x}"):
+            with self.subTest(source=source):
+                with self.assertRaises(TemplateError):
+                    Template.compile(source).render({'title': "x"})
+
+    def test_compiled_once(self) -> None:
+        self.assertIs(Template.compile("{title}!"), Template.compile("{title}!"))
+
+
+if __name__ == '__main__':
+    unittest.main()